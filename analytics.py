@@ -0,0 +1,117 @@
+"""
+Аналитика прохождения заказов по статусам (журнал order_events)
+
+События читаются пачками в массивы NumPy по столбцам; интервалы между
+соседними событиями одного заказа и процентили считаются векторно:
+ожидание в очереди, время в каждом статусе, время в работе по материалам
+и полный срок выполнения (от создания до статуса ready).
+"""
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+import database
+
+
+# Процентили длительностей в отчете
+PERCENTILES = (50, 90, 95)
+
+# Период отчета по умолчанию (дни)
+DEFAULT_PERIOD_DAYS = 90
+
+# Столбцы массива событий: order_id, status_id, material_id, created_at, created (1 — создание заказа)
+_EVENT_COLUMNS = 5
+
+
+async def load_events(since: int, order_type: Optional[str] = None) -> np.ndarray:
+    """События не раньше since массивом (n, 5), строки по заказу и времени"""
+    chunks = [np.array(rows, dtype=np.int64) async for rows in database.db.iter_order_events(since, order_type)]
+    if not chunks:
+        return np.empty((0, _EVENT_COLUMNS), dtype=np.int64)
+    return np.concatenate(chunks)
+
+
+def duration_percentiles(durations: np.ndarray) -> Dict[str, float]:
+    """Количество и процентили длительностей в секундах"""
+    if len(durations) == 0:
+        return {"count": 0}
+    summary: Dict[str, float] = {"count": int(len(durations))}
+    for q, value in zip(PERCENTILES, np.percentile(durations, PERCENTILES)):
+        summary[f"p{q}"] = float(value)
+    return summary
+
+
+def _grouped_percentiles(keys: np.ndarray, durations: np.ndarray) -> Dict[int, Dict[str, float]]:
+    """Процентили длительностей по группам keys (одна сортировка на все группы)"""
+    order = np.argsort(keys, kind="stable")
+    keys, durations = keys[order], durations[order]
+    groups, starts = np.unique(keys, return_index=True)
+    return {
+        int(group): duration_percentiles(values)
+        for group, values in zip(groups, np.split(durations, starts[1:]))
+    }
+
+
+def compute_flow(events: np.ndarray, status_ids: Dict[str, int], journal_start: int = 0) -> Dict[str, Any]:
+    """Показатели прохождения заказов по массиву событий load_events
+
+    Раньше journal_start в журнале только создание заказов, записанное миграцией:
+    интервалы от этих событий не учитываются во времени в статусах, срок выполнения — учитывается.
+    """
+    order_ids, statuses, materials, times, creations = np.ascontiguousarray(events.T)
+    pending = status_ids.get("pending", -1)
+    in_progress = status_ids.get("in_progress", -1)
+    ready = status_ids.get("ready", -1)
+    rejected = status_ids.get("rejected", -1)
+
+    # Интервал i: заказ order_ids[i] находился в статусе statuses[i] от times[i] до times[i + 1]
+    same_order = order_ids[1:] == order_ids[:-1]
+    # Смены статусов до начала журнала неизвестны: такой интервал мог включать несколько статусов
+    logged = same_order & (times[:-1] >= journal_start)
+    interval_status = statuses[:-1][logged]
+    next_status = statuses[1:][logged]
+    interval_material = materials[:-1][logged]
+    durations = (times[1:] - times[:-1])[logged]
+
+    queue_wait = durations[(interval_status == pending) & (next_status == in_progress)]
+    in_work = interval_status == in_progress
+
+    # Срок выполнения: от создания (первое событие заказа в журнале) до первого ready.
+    # Заказы, созданные до начала периода, не учитываются, даже если их вернули в pending
+    created = np.flatnonzero(creations == 1)
+    created_orders = order_ids[created]
+    ready_events = np.flatnonzero(statuses == ready)
+    ready_orders, first_ready = np.unique(order_ids[ready_events], return_index=True)
+    ready_events = ready_events[first_ready]
+    found = np.isin(ready_orders, created_orders, assume_unique=True)
+    lead_times = times[ready_events[found]] - times[created[np.searchsorted(created_orders, ready_orders[found])]]
+
+    code_by_id = {status_id: code for code, status_id in status_ids.items()}
+    return {
+        "orders": {
+            "created": int(len(created)),
+            "completed": int(found.sum()),
+            "rejected": int(len(np.unique(order_ids[statuses == rejected]))),
+        },
+        "lead_time": duration_percentiles(lead_times),
+        "queue_wait": duration_percentiles(queue_wait),
+        "time_in_status": {
+            code_by_id.get(status_id, str(status_id)): summary
+            for status_id, summary in _grouped_percentiles(interval_status, durations).items()
+        },
+        # Ключ 0 — заказы без материала
+        "cycle_by_material": _grouped_percentiles(interval_material[in_work], durations[in_work]),
+    }
+
+
+async def build_report(days: int = DEFAULT_PERIOD_DAYS, order_type: Optional[str] = None) -> Dict[str, Any]:
+    """Отчет о прохождении заказов за последние days дней"""
+    since = int(time.time()) - days * 86400
+    events = await load_events(since, order_type)
+    journal_start = int(await database.db.get_setting("order_events_started_at", "0"))
+    report = compute_flow(events, await database.db.get_status_ids(), journal_start)
+    report["period_days"] = days
+    report["order_type"] = order_type
+    report["events"] = int(len(events))
+    return report
@@ -0,0 +1,102 @@
+"""
+Проверка доступа к админ-обработчикам при диспетчеризации callback по таблице
+
+Callback-запросы из пространств имен администратора подаются через
+dp.feed_update с фиктивным ботом: от обычного пользователя — запрос должен
+получить отказ AdminOnlyMiddleware и не дойти до обработчика, от
+администратора — дойти. Проверяется с таблицей диспетчеризации
+(CallbackDispatchMiddleware) и с таблицей, отключенной проверкой внутренних
+атрибутов aiogram (обычная обработка).
+
+Запуск из корня проекта:
+    python bench/admin_access_check.py
+"""
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Tuple
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram.types import Update  # noqa: E402
+
+import config  # noqa: E402
+import database  # noqa: E402
+import main  # noqa: E402
+import middlewares  # noqa: E402
+
+from fake_bot import create_fake_bot, make_callback  # noqa: E402
+
+
+ADMIN_ID = 1
+USER_ID = 2
+
+# Callback data админ-обработчиков: точное совпадение и префикс пространства имен
+ADMIN_CALLBACKS = ("admin_toggle_orders", "admin_orders_type:3d_print")
+
+
+async def _feed(dp, data: str, user_id: int) -> List[Tuple[str, object]]:
+    """Подать callback-запрос, вернуть отправленные методы Bot API (имя, текст)"""
+    bot = create_fake_bot()
+    sent: List[Tuple[str, object]] = []
+    make_request = bot.session.make_request
+
+    async def capture(bot_object, method, timeout=None):
+        sent.append((type(method).__name__, getattr(method, "text", None)))
+        return await make_request(bot_object, method, timeout)
+
+    bot.session.make_request = capture
+    await dp.feed_update(bot, Update(update_id=1, callback_query=make_callback(bot, user_id, data)))
+    return sent
+
+
+async def _check(dp, use_table: bool) -> List[str]:
+    """Ошибки проверки для одного режима диспетчеризации"""
+    errors = []
+    dispatch = next(
+        item for item in dp.callback_query.outer_middleware
+        if isinstance(item, middlewares.CallbackDispatchMiddleware)
+    )
+    # Без таблицы — как при изменившихся внутренних атрибутах aiogram
+    problem = None if use_table else "проверка без таблицы"
+    with mock.patch.object(middlewares, "dispatch_api_problem", lambda root: problem):
+        dispatch._enabled = dispatch._check_api()
+    dispatch._table = None
+    mode = "таблица" if use_table else "обычная обработка"
+
+    for data in ADMIN_CALLBACKS:
+        enabled = await database.db.is_orders_enabled()
+        sent = await _feed(dp, data, USER_ID)
+        if sent != [("AnswerCallbackQuery", middlewares.ADMIN_DENIED_CALLBACK_TEXT)]:
+            errors.append(f"{mode}: {data} от пользователя — ожидался только отказ, отправлено {sent}")
+        if await database.db.is_orders_enabled() != enabled:
+            errors.append(f"{mode}: {data} от пользователя изменил настройки")
+
+    enabled = await database.db.is_orders_enabled()
+    await _feed(dp, "admin_toggle_orders", ADMIN_ID)
+    if await database.db.is_orders_enabled() == enabled:
+        errors.append(f"{mode}: admin_toggle_orders от администратора не дошел до обработчика")
+    if (dispatch._table is not None) != use_table:
+        errors.append(f"{mode}: таблица диспетчеризации {'не построена' if use_table else 'построена'}")
+    return errors
+
+
+async def run() -> bool:
+    config.ADMIN_IDS = frozenset({ADMIN_ID})
+    with tempfile.TemporaryDirectory() as directory:
+        database.db = database.Database(Path(directory) / "database.db")
+        await database.db.init_db()
+        dp = main.create_dispatcher()
+        errors = await _check(dp, use_table=True) + await _check(dp, use_table=False)
+    for error in errors:
+        print(f"Ошибка: {error}")
+    if not errors:
+        print(f"OK: {len(ADMIN_CALLBACKS)} админ-callback от пользователя отклонены, от администратора — обработаны "
+              "(с таблицей и без)")
+    return not errors
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(run()) else 1)
@@ -0,0 +1,78 @@
+"""
+Бенчмарк диспетчеризации callback-запросов: обычная обработка aiogram и таблица по пространству имен
+
+Для N обработчиков F.data.startswith("nsI:") измеряется время обработки
+callback-запроса к последнему зарегистрированному обработчику через
+dp.feed_update (без обращений к Telegram API).
+
+Запуск из корня проекта:
+    python bench/callback_dispatch.py [--iterations 2000] [--sizes 10 50 200 1000]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram import Bot, Dispatcher, F, Router  # noqa: E402
+from aiogram.types import CallbackQuery, Update, User  # noqa: E402
+
+from middlewares import CallbackDispatchMiddleware  # noqa: E402
+
+
+def _build_dispatcher(handler_count: int, use_table: bool) -> Dispatcher:
+    dp = Dispatcher()
+    router = Router()
+
+    async def handler(callback: CallbackQuery):
+        return True
+
+    for index in range(handler_count):
+        router.callback_query(F.data.startswith(f"ns{index}:"))(handler)
+    dp.include_router(router)
+    if use_table:
+        dp.callback_query.outer_middleware(CallbackDispatchMiddleware(dp))
+    return dp
+
+
+def _make_update(update_id: int, data: str) -> Update:
+    user = User(id=1, is_bot=False, first_name="Bench")
+    callback = CallbackQuery(id=str(update_id), from_user=user, chat_instance="bench", data=data)
+    return Update(update_id=update_id, callback_query=callback)
+
+
+async def _measure(dp: Dispatcher, bot: Bot, data: str, iterations: int) -> float:
+    """Среднее время обработки одного обновления в микросекундах"""
+    updates = [_make_update(index, data) for index in range(iterations)]
+    # Прогрев: построение таблицы и кешей фильтров
+    for update in updates[:50]:
+        await dp.feed_update(bot, update)
+
+    started = time.perf_counter()
+    for update in updates:
+        await dp.feed_update(bot, update)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def main(sizes, iterations: int) -> None:
+    # Токен фиктивный: запросы к API не выполняются
+    bot = Bot(token="42:BENCHMARK")
+    try:
+        print(f"{'handlers':>8} | {'aiogram, мкс':>12} | {'таблица, мкс':>12} | {'ускорение':>9}")
+        for size in sizes:
+            data = f"ns{size - 1}:1"
+            linear = await _measure(_build_dispatcher(size, use_table=False), bot, data, iterations)
+            table = await _measure(_build_dispatcher(size, use_table=True), bot, data, iterations)
+            print(f"{size:>8} | {linear:>12.1f} | {table:>12.1f} | {linear / table:>8.1f}x")
+    finally:
+        await bot.session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200, 1000])
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.iterations))
@@ -0,0 +1,332 @@
+"""
+Бенчмарк методов Database и путей обработчиков на синтетической базе
+
+Замеряет каждый публичный метод Database, а также _show_orders_page и
+cmd_my_orders с фиктивным ботом, и сохраняет JSON-отчет для сравнения
+между коммитами.
+
+Запуск из корня проекта:
+    python bench/db_bench.py [--db bench.db] [--iterations 20] [--output report.json] [--compare old.json]
+
+Без --db база генерируется во временном каталоге (около 30 секунд);
+с --db используется копия указанной базы, так что исходный файл не меняется.
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram.fsm.context import FSMContext  # noqa: E402
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+from aiogram.fsm.storage.memory import MemoryStorage  # noqa: E402
+from loguru import logger  # noqa: E402
+
+import database  # noqa: E402
+from handlers import admin_handlers, user_handlers  # noqa: E402
+
+from fake_bot import create_fake_bot, make_callback, make_message  # noqa: E402
+from synthetic_data import DEFAULT_ORDERS, DEFAULT_USERS, copy_database, populate  # noqa: E402
+
+
+# (название, фабрика вызова по номеру итерации[, подготовка вне замера])
+Case = Tuple[Any, ...]
+
+# Предел времени на один сценарий: медленные пути замеряются меньшее число раз
+CASE_TIME_BUDGET = 30.0
+
+# Период чтения журнала смены статусов и выгрузки (дни)
+EVENTS_PERIOD_DAYS = 30
+
+# Событий журнала, которые дочитывает обновление индекса количества заказов
+EVENT_LOG_TAIL = 1000
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _sample_ids(db_path: Path) -> Dict[str, Any]:
+    """Идентификаторы для аргументов: самый активный пользователь, заказ, материал"""
+    connection = sqlite3.connect(db_path)
+    try:
+        heavy_user = connection.execute(
+            "SELECT user_id FROM orders GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 1"
+        ).fetchone()[0]
+        typical_user = connection.execute(
+            "SELECT user_id FROM orders GROUP BY user_id ORDER BY COUNT(*) LIMIT 1 OFFSET ("
+            "SELECT COUNT(DISTINCT user_id) / 2 FROM orders)"
+        ).fetchone()[0]
+        order_id = connection.execute("SELECT MAX(id) / 2 FROM orders").fetchone()[0]
+        material_id, material_name = connection.execute(
+            "SELECT id, name FROM materials WHERE type = '3d_print' ORDER BY id LIMIT 1"
+        ).fetchone()
+        orders_count = connection.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+        last_event_id = connection.execute("SELECT COALESCE(MAX(id), 0) FROM order_events").fetchone()[0]
+        users_count = connection.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    finally:
+        connection.close()
+    return {
+        "heavy_user": heavy_user,
+        "typical_user": typical_user,
+        "order_id": order_id,
+        "material_id": material_id,
+        "material_name": material_name,
+        "orders": orders_count,
+        "users": users_count,
+        "last_event_id": last_event_id,
+    }
+
+
+async def _drain(chunks: AsyncIterator[List[Tuple[Any, ...]]]) -> int:
+    """Прочитать все пачки метода iter_*, вернуть количество строк"""
+    count = 0
+    async for rows in chunks:
+        count += len(rows)
+    return count
+
+
+def _database_cases(db: database.Database, ids: Dict[str, Any], iterations: int) -> List[Case]:
+    """Сценарии по методам Database: сначала чтение, затем изменение данных"""
+    heavy_user = ids["heavy_user"]
+    typical_user = ids["typical_user"]
+    order_id = ids["order_id"]
+    material_id = ids["material_id"]
+    created_orders: List[int] = []
+    # Журнал и выгрузка читаются за последние EVENTS_PERIOD_DAYS дней, как в отчетах
+    since = int(time.time()) - EVENTS_PERIOD_DAYS * 86400
+    # Хвост журнала, который дочитывает TimeBucketIndex.refresh
+    event_log_start = max(0, ids["last_event_id"] - EVENT_LOG_TAIL)
+    bench_materials: List[int] = []
+    bench_templates: List[int] = []
+
+    async def create_order(i: int) -> None:
+        created_orders.append(await db.create_order(
+            typical_user, material_id, f"bench part {i}", "files/photos/bench.jpg",
+            "files/models/bench.stl", original_filename="bench.stl", comment="bench",
+        ))
+
+    async def load_materials() -> None:
+        bench_materials[:] = [
+            await db.get_material_id_by_name(f"bench material {i}", "3d_print") for i in range(iterations)
+        ]
+
+    async def load_templates() -> None:
+        bench_templates[:] = [
+            template["id"] for template in await db.get_rejection_templates("3d_print")
+            if template["text"].startswith("bench template")
+        ]
+
+    async def prepare_template() -> None:
+        await db.add_rejection_template("3d_print", "bench template")
+        await load_templates()
+
+    return [
+        ("init_db", lambda i: db.init_db()),
+        ("rebuild_status_counters", lambda i: db.rebuild_status_counters()),
+        ("get_or_create_user", lambda i: db.get_or_create_user(typical_user, "Bench", "User", None)),
+        ("is_user_registered", lambda i: db.is_user_registered(typical_user)),
+        ("get_user", lambda i: db.get_user(heavy_user)),
+        ("get_all_user_ids", lambda i: db.get_all_user_ids()),
+        ("get_order", lambda i: db.get_order(order_id)),
+        ("get_user_orders", lambda i: db.get_user_orders(heavy_user)),
+        ("get_user_archived_orders", lambda i: db.get_user_archived_orders(heavy_user, limit=6)),
+        ("count_user_archived_orders", lambda i: db.count_user_archived_orders(heavy_user)),
+        ("get_orders_statistics", lambda i: db.get_orders_statistics("3d_print")),
+        ("get_orders_overview", lambda i: db.get_orders_overview()),
+        ("get_orders_by_status", lambda i: db.get_orders_by_status("pending", "3d_print", limit=6)),
+        ("count_orders_by_status", lambda i: db.count_orders_by_status("pending", "3d_print")),
+        ("get_orders_by_material", lambda i: db.get_orders_by_material(
+            material_id, ("pending", "in_progress"), "3d_print", limit=6)),
+        ("count_orders_by_material", lambda i: db.count_orders_by_material(
+            material_id, ("pending", "in_progress"), "3d_print")),
+        ("get_all_materials", lambda i: db.get_all_materials("3d_print")),
+        ("get_materials_with_usage_count", lambda i: db.get_materials_with_usage_count("3d_print")),
+        ("get_materials_with_orders", lambda i: db.get_materials_with_orders("3d_print")),
+        ("get_setting", lambda i: db.get_setting("orders_enabled")),
+        ("is_orders_enabled", lambda i: db.is_orders_enabled()),
+        ("get_material", lambda i: db.get_material(material_id)),
+        ("get_material_id_by_name", lambda i: db.get_material_id_by_name(ids["material_name"], "3d_print")),
+        ("get_ready_orders_for_reminder", lambda i: db.get_ready_orders_for_reminder(hours=4)),
+        ("get_archived_orders", lambda i: db.get_archived_orders("3d_print", limit=6)),
+        ("count_archived_orders", lambda i: db.count_archived_orders("3d_print")),
+        ("is_search_available", lambda i: db.is_search_available()),
+        ("search_orders", lambda i: db.search_orders("кронштейн", limit=6)),
+        ("count_search_orders", lambda i: db.count_search_orders("кронштейн")),
+        ("get_rejection_templates", lambda i: db.get_rejection_templates("3d_print")),
+        ("get_rejection_template", lambda i: db.get_rejection_template(bench_templates[0]), prepare_template),
+        ("get_model_metadata", lambda i: db.get_model_metadata("0" * 64)),
+        ("get_status_ids", lambda i: db.get_status_ids()),
+        ("get_last_order_event_id", lambda i: db.get_last_order_event_id()),
+        ("iter_order_event_log", lambda i: _drain(db.iter_order_event_log(event_log_start))),
+        ("iter_order_events", lambda i: _drain(db.iter_order_events(since))),
+        ("iter_orders_for_export", lambda i: _drain(db.iter_orders_for_export(created_from=since))),
+        ("iter_order_events_for_export", lambda i: _drain(db.iter_order_events_for_export(created_from=since))),
+        ("iter_users_for_export", lambda i: _drain(db.iter_users_for_export())),
+        # Изменение данных
+        ("set_setting", lambda i: db.set_setting("bench_key", str(i))),
+        ("set_orders_enabled", lambda i: db.set_orders_enabled(True)),
+        ("save_model_metadata", lambda i: db.save_model_metadata(f"{i:064x}", {"valid": True})),
+        ("create_order", create_order),
+        ("update_order_status", lambda i: db.update_order_status(created_orders[i % len(created_orders)], "in_progress")),
+        ("update_last_reminder_time", lambda i: db.update_last_reminder_time(created_orders[i % len(created_orders)])),
+        ("archive_order", lambda i: db.archive_order(created_orders[i])),
+        ("delete_order", lambda i: db.delete_order(created_orders[iterations + 1 + i])),
+        ("add_material", lambda i: db.add_material(f"bench material {i}")),
+        ("delete_material", lambda i: db.delete_material(bench_materials[i]), load_materials),
+        ("restore_material", lambda i: db.restore_material(bench_materials[i])),
+        ("add_rejection_template", lambda i: db.add_rejection_template("3d_print", f"bench template {i}")),
+        ("delete_rejection_template", lambda i: db.delete_rejection_template(bench_templates[i]), load_templates),
+    ]
+
+
+def _handler_cases(ids: Dict[str, Any]) -> List[Case]:
+    """Полные пути обработчиков с фиктивным ботом"""
+    bot = create_fake_bot()
+    storage = MemoryStorage()
+    admin_id = ids["heavy_user"]
+
+    def state_for(user_id: int) -> FSMContext:
+        return FSMContext(storage=storage, key=StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id))
+
+    last_page = max(0, (ids["orders"] // 4) // 6 - 1)
+    return [
+        ("handler:_show_orders_page pending p0", lambda i: admin_handlers._show_orders_page(
+            make_callback(bot, admin_id, "bench"), state_for(admin_id), "3d_print", "pending", page=0)),
+        ("handler:_show_orders_page all p0", lambda i: admin_handlers._show_orders_page(
+            make_callback(bot, admin_id, "bench"), state_for(admin_id), "3d_print", "all", page=0)),
+        ("handler:_show_orders_page pending deep", lambda i: admin_handlers._show_orders_page(
+            make_callback(bot, admin_id, "bench"), state_for(admin_id), "3d_print", "pending", page=last_page)),
+        ("handler:cmd_my_orders heavy", lambda i: user_handlers.cmd_my_orders(
+            make_message(bot, ids["heavy_user"], "Мои заказы"))),
+        ("handler:cmd_my_orders typical", lambda i: user_handlers.cmd_my_orders(
+            make_message(bot, ids["typical_user"], "Мои заказы"))),
+    ]
+
+
+async def _measure(name: str, factory: Callable[[int], Awaitable[Any]], iterations: int) -> Dict[str, float]:
+    timings = []
+    deadline = time.perf_counter() + CASE_TIME_BUDGET
+    for i in range(iterations):
+        started = time.perf_counter()
+        await factory(i)
+        timings.append((time.perf_counter() - started) * 1000)
+        if time.perf_counter() > deadline:
+            logger.warning(f"{name}: превышен предел {CASE_TIME_BUDGET:.0f} с, выполнено {len(timings)} из {iterations}")
+            break
+    timings.sort()
+    return {
+        "iterations": len(timings),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "min_ms": round(timings[0], 3),
+    }
+
+
+async def run(db_path: Path, iterations: int) -> Dict[str, Any]:
+    ids = _sample_ids(db_path)
+    db = database.Database(db_path)
+    # Обработчики обращаются к глобальному database.db
+    database.db = db
+    await db.init_db()
+
+    results: Dict[str, Dict[str, float]] = {}
+    cases = _database_cases(db, ids, iterations)
+    # create_order выполняется чаще: заказы нужны для archive_order и delete_order
+    repeats = {"create_order": 2 * iterations + 2}
+    for name, factory, *setup in cases:
+        if setup:
+            await setup[0]()
+        results[name] = await _measure(name, factory, repeats.get(name, iterations))
+        logger.info(f"{name}: {results[name]['median_ms']} мс")
+
+    covered = {case[0] for case in cases}
+    # Методы iter_* — асинхронные генераторы, они тоже должны быть замерены
+    public_methods = {
+        name for name, member in inspect.getmembers(database.Database)
+        if not name.startswith("_") and (inspect.iscoroutinefunction(member) or inspect.isasyncgenfunction(member))
+    }
+
+    for name, factory in _handler_cases(ids):
+        results[name] = await _measure(name, factory, iterations)
+        logger.info(f"{name}: {results[name]['median_ms']} мс")
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "users": ids["users"],
+            "orders": ids["orders"],
+            "iterations": iterations,
+            "not_benchmarked": sorted(public_methods - covered),
+        },
+        "results": results,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Вывести медианы текущего отчета относительно базового"""
+    print(f"{'case':<40} {'base, мс':>10} {'now, мс':>10} {'ratio':>7}")
+    for name, current in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"{name:<40} {'-':>10} {current['median_ms']:>10.3f} {'new':>7}")
+            continue
+        ratio = current["median_ms"] / base["median_ms"] if base["median_ms"] else float("inf")
+        print(f"{name:<40} {base['median_ms']:>10.3f} {current['median_ms']:>10.3f} {ratio:>6.2f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", type=Path, help="готовая база из bench/synthetic_data.py (используется копия)")
+    parser.add_argument("--users", type=int, default=DEFAULT_USERS)
+    parser.add_argument("--orders", type=int, default=DEFAULT_ORDERS)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--output", type=Path, default=Path("bench_report.json"))
+    parser.add_argument("--compare", type=Path, help="базовый отчет для сравнения")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="INFO", filter=lambda record: record["name"] == "__main__")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_path = Path(work_dir) / "bench.db"
+        if args.db:
+            copy_database(args.db, db_path)
+            dataset = {"source": str(args.db)}
+        else:
+            dataset = populate(db_path, args.users, args.orders)
+        logger.info(f"База: {dataset}")
+        report = asyncio.run(run(db_path, args.iterations))
+        report["meta"]["dataset"] = dataset
+
+    args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    logger.info(f"Отчет сохранен в {args.output}")
+    if args.compare:
+        compare(report, json.loads(args.compare.read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
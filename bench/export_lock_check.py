@@ -0,0 +1,94 @@
+"""
+Проверка: выгрузка истории заказов не блокирует запись в базу
+
+Пока идет выгрузка (export.export_orders), параллельно выполняется запись
+настройки (Database.set_setting) каждые WRITE_INTERVAL секунд; замеряется
+задержка каждой записи. В журнале отката (rollback journal) курсор выгрузки
+держит SHARED-блокировку, и запись ждет конца выгрузки — с журналом WAL
+задержка записи не зависит от выгрузки. Выгрузка parquet (если установлен
+pyarrow) читает таблицы по очереди — запись не должна ждать ни одну из них.
+
+Запуск из корня проекта:
+    python bench/export_lock_check.py [--db bench.db] [--orders 100000] [--formats csv jsonl parquet]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger  # noqa: E402
+
+import database  # noqa: E402
+import export  # noqa: E402
+
+from synthetic_data import copy_database, populate  # noqa: E402
+
+
+# Пауза между записями во время выгрузки (секунды)
+WRITE_INTERVAL = 0.05
+
+# Предел задержки одной записи: дольше — выгрузка блокирует запись
+MAX_WRITE_SECONDS = 0.5
+
+# Форматы по умолчанию: parquet — только при установленном pyarrow
+DEFAULT_FORMATS = [name for name in export.EXPORT_FORMATS if name != "parquet" or export.pa is not None]
+
+
+async def _check_format(work_dir: Path, export_format: str) -> Dict[str, Any]:
+    """Выгрузка в формате export_format с параллельной записью, сводка задержек"""
+    path = work_dir / export.file_name(export_format)
+    started = time.perf_counter()
+    export_task = asyncio.create_task(export.export_orders(path, export_format, {}))
+    latencies: List[float] = []
+    while not export_task.done():
+        write_started = time.perf_counter()
+        await database.db.set_setting("export_lock_check", str(len(latencies)))
+        latencies.append(time.perf_counter() - write_started)
+        await asyncio.sleep(WRITE_INTERVAL)
+    count = await export_task
+    path.unlink(missing_ok=True)
+    return {
+        "orders": count,
+        "export_s": round(time.perf_counter() - started, 2),
+        "writes": len(latencies),
+        "write_p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "write_max_ms": round(max(latencies) * 1000, 1),
+    }
+
+
+async def run(db_path: Path, formats: List[str]) -> bool:
+    database.db = database.Database(db_path)
+    await database.db.init_db()
+    ok = True
+    for export_format in formats:
+        result = await _check_format(db_path.parent, export_format)
+        blocked = result["write_max_ms"] > MAX_WRITE_SECONDS * 1000
+        ok = ok and not blocked
+        logger.info(f"{export_format}: {result}" + (" — запись блокируется выгрузкой" if blocked else ""))
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", type=Path, help="база для проверки (используется копия)")
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--formats", nargs="+", choices=export.EXPORT_FORMATS, default=DEFAULT_FORMATS)
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="INFO", filter=lambda record: record["name"] == "__main__")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_path = Path(work_dir) / "bench.db"
+        if args.db:
+            copy_database(args.db, db_path)
+        else:
+            logger.info(f"База: {populate(db_path, args.users, args.orders)}")
+        sys.exit(0 if asyncio.run(run(db_path, args.formats)) else 1)
@@ -0,0 +1,294 @@
+"""
+Локальная замена Telegram Bot API на aiohttp для нагрузочного тестирования
+
+Поддерживает getUpdates (long polling), отправку и редактирование сообщений,
+getFile и скачивание файлов. Задержку ответа и долю ответов 429 можно
+настроить. Бот подключается к серверу через TELEGRAM_API_URL.
+
+Запуск отдельно из корня проекта:
+    python bench/fake_api_server.py [--port 8081] [--latency-ms 30] [--rate-limit 0.01]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+from loguru import logger
+
+
+FAKE_BOT_USERNAME = "fake_load_bot"
+
+# Поля запроса, которые aiogram передает как JSON
+_JSON_FIELDS = {"reply_markup", "allowed_updates", "entities", "caption_entities", "link_preview_options"}
+_INT_FIELDS = {"chat_id", "message_id", "offset", "limit", "timeout", "from_chat_id"}
+
+# Методы, результат которых — сообщение в чате
+_SEND_METHODS = {"sendMessage", "sendPhoto", "sendDocument", "copyMessage", "forwardMessage"}
+_EDIT_METHODS = {"editMessageText", "editMessageCaption", "editMessageReplyMarkup"}
+
+# Методы, для которых не имитируются задержка и ответ 429
+_SERVICE_METHODS = {"getUpdates", "getMe", "deleteWebhook", "getFile"}
+
+
+class ChatEvent:
+    """Сообщение, отправленное или отредактированное ботом в чате"""
+
+    __slots__ = ("method", "message", "received_at")
+
+    def __init__(self, method: str, message: Dict[str, Any], received_at: float):
+        self.method = method
+        self.message = message
+        self.received_at = received_at
+
+    @property
+    def text(self) -> str:
+        return self.message.get("text") or self.message.get("caption") or ""
+
+    def buttons(self) -> List[Dict[str, Any]]:
+        """Inline-кнопки сообщения одним списком"""
+        markup = self.message.get("reply_markup") or {}
+        return [button for row in markup.get("inline_keyboard", []) for button in row]
+
+
+class FakeTelegramServer:
+    """Сервер Bot API в памяти: очередь обновлений и журнал сообщений по чатам"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, rate_limit: float = 0.0,
+                 retry_after: int = 1, seed: Optional[int] = None):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.calls: Counter = Counter()
+        self.rate_limited: Counter = Counter()
+        self.uploaded_bytes = 0
+        self.polling_started = asyncio.Event()
+
+        self._random = random.Random(seed)
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._updates: List[Dict[str, Any]] = []
+        self._updates_changed = asyncio.Condition()
+        self._messages: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        self._files: Dict[str, Tuple[str, bytes]] = {}
+        self._file_contents: Dict[str, bytes] = {}
+        self._chat_events: Dict[int, List[ChatEvent]] = defaultdict(list)
+        self._chat_changed: Dict[int, asyncio.Condition] = defaultdict(asyncio.Condition)
+        self._bot_id = 0
+
+    # Сторона клиентов
+
+    def next_message_id(self) -> int:
+        return next(self._message_ids)
+
+    def add_file(self, content: bytes, file_path: str) -> str:
+        """Зарегистрировать файл для getFile и скачивания, вернуть file_id"""
+        file_id = f"file{next(self._file_ids)}"
+        self._files[file_id] = (file_path, content)
+        self._file_contents[file_path] = content
+        return file_id
+
+    async def push_update(self, update: Dict[str, Any]) -> int:
+        """Поставить обновление в очередь getUpdates"""
+        update_id = next(self._update_ids)
+        update["update_id"] = update_id
+        async with self._updates_changed:
+            self._updates.append(update)
+            self._updates_changed.notify_all()
+        return update_id
+
+    def event_count(self, chat_id: int) -> int:
+        return len(self._chat_events[chat_id])
+
+    async def wait_event(
+        self,
+        chat_id: int,
+        start: int,
+        predicate: Callable[[ChatEvent], bool],
+        timeout: float
+    ) -> Tuple[int, ChatEvent]:
+        """Дождаться события чата с номером не меньше start, подходящего под predicate"""
+        events = self._chat_events[chat_id]
+        condition = self._chat_changed[chat_id]
+        deadline = time.perf_counter() + timeout
+        while True:
+            for index in range(start, len(events)):
+                if predicate(events[index]):
+                    return index, events[index]
+            start = len(events)
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            async with condition:
+                if len(events) == start:
+                    await asyncio.wait_for(condition.wait(), remaining)
+
+    # Сторона бота
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        self.polling_started.set()
+        offset = params.get("offset") or 0
+        limit = params.get("limit") or 100
+        timeout = params.get("timeout") or 0
+        async with self._updates_changed:
+            # Обновления до offset подтверждены ботом
+            self._updates = [update for update in self._updates if update["update_id"] >= offset]
+            if not self._updates and timeout:
+                try:
+                    await asyncio.wait_for(self._updates_changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            return self._updates[:limit]
+
+    def _new_message(self, chat_id: int, params: Dict[str, Any]) -> Dict[str, Any]:
+        message = {
+            "message_id": self.next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": self._bot_id, "is_bot": True, "first_name": "Bot", "username": FAKE_BOT_USERNAME},
+        }
+        for key in ("text", "caption"):
+            if params.get(key) is not None:
+                message[key] = params[key]
+        # В Message возвращается только inline-клавиатура
+        if "inline_keyboard" in (params.get("reply_markup") or {}):
+            message["reply_markup"] = params["reply_markup"]
+        return message
+
+    async def _record(self, method: str, chat_id: int, message: Dict[str, Any], received_at: float) -> None:
+        self._messages[(chat_id, message["message_id"])] = message
+        condition = self._chat_changed[chat_id]
+        async with condition:
+            self._chat_events[chat_id].append(ChatEvent(method, message, received_at))
+            condition.notify_all()
+
+    async def _call(self, method: str, params: Dict[str, Any], received_at: float) -> Any:
+        if method == "getUpdates":
+            return await self._get_updates(params)
+        if method == "getMe":
+            return {"id": self._bot_id, "is_bot": True, "first_name": "Bot", "username": FAKE_BOT_USERNAME}
+        if method == "getFile":
+            file_id = params.get("file_id")
+            if file_id not in self._files:
+                raise web.HTTPBadRequest(text=json.dumps(
+                    {"ok": False, "error_code": 400, "description": "Bad Request: invalid file_id"}
+                ), content_type="application/json")
+            file_path, content = self._files[file_id]
+            return {"file_id": file_id, "file_unique_id": file_id, "file_size": len(content), "file_path": file_path}
+
+        chat_id = params.get("chat_id")
+        if method in _SEND_METHODS and isinstance(chat_id, int):
+            message = self._new_message(chat_id, params)
+            if method == "sendPhoto":
+                file_id = f"sent{message['message_id']}"
+                message["photo"] = [{"file_id": file_id, "file_unique_id": file_id, "width": 800, "height": 600}]
+            elif method == "sendDocument":
+                file_id = f"sent{message['message_id']}"
+                message["document"] = {"file_id": file_id, "file_unique_id": file_id, "file_name": "file"}
+            await self._record(method, chat_id, message, received_at)
+            if method == "copyMessage":
+                return {"message_id": message["message_id"]}
+            return message
+        if method in _EDIT_METHODS and isinstance(chat_id, int):
+            message = dict(self._messages.get((chat_id, params.get("message_id"))) or self._new_message(chat_id, {}))
+            message["message_id"] = params.get("message_id", message["message_id"])
+            message["edit_date"] = int(time.time())
+            if method == "editMessageText":
+                message["text"] = params.get("text", "")
+            elif method == "editMessageCaption":
+                message["caption"] = params.get("caption", "")
+            if "inline_keyboard" in (params.get("reply_markup") or {}):
+                message["reply_markup"] = params["reply_markup"]
+            else:
+                message.pop("reply_markup", None)
+            await self._record(method, chat_id, message, received_at)
+            return message
+        # answerCallbackQuery, deleteMessage, sendChatAction и прочие методы
+        return True
+
+    async def _parse_params(self, request: web.Request) -> Dict[str, Any]:
+        params: Dict[str, Any] = dict(request.query)
+        if request.can_read_body:
+            for key, value in (await request.post()).items():
+                if isinstance(value, web.FileField):
+                    self.uploaded_bytes += len(value.file.read())
+                    continue
+                params[key] = value
+        for key in _JSON_FIELDS & params.keys():
+            params[key] = json.loads(params[key])
+        for key in _INT_FIELDS & params.keys():
+            try:
+                params[key] = int(params[key])
+            except ValueError:
+                pass
+        return params
+
+    async def _api_handler(self, request: web.Request) -> web.Response:
+        received_at = time.perf_counter()
+        method = request.match_info["method"]
+        self._bot_id = int(request.match_info["token"].split(":")[0])
+        self.calls[method] += 1
+        params = await self._parse_params(request)
+
+        if method not in _SERVICE_METHODS:
+            if self.latency or self.jitter:
+                await asyncio.sleep(self.latency + self._random.uniform(0, self.jitter))
+            if self.rate_limit and self._random.random() < self.rate_limit:
+                self.rate_limited[method] += 1
+                return web.json_response({
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                }, status=429)
+
+        result = await self._call(method, params, received_at)
+        return web.json_response({"ok": True, "result": result})
+
+    async def _file_handler(self, request: web.Request) -> web.Response:
+        content = self._file_contents.get(request.match_info["path"])
+        if content is None:
+            raise web.HTTPNotFound()
+        return web.Response(body=content)
+
+    def create_app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_route("*", "/bot{token}/{method}", self._api_handler)
+        app.router.add_get("/file/bot{token}/{path:.+}", self._file_handler)
+        return app
+
+    async def start(self, host: str, port: int) -> web.AppRunner:
+        runner = web.AppRunner(self.create_app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"Фиктивный Bot API: http://{host}:{port}")
+        return runner
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    server = FakeTelegramServer(args.latency_ms, args.jitter_ms, args.rate_limit, args.retry_after)
+    runner = await server.start(args.host, args.port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="задержка ответа на каждый запрос")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="случайная добавка к задержке")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="доля запросов с ответом 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,89 @@
+"""
+Бот с фиктивной сессией: запросы к Bot API не уходят в сеть, а возвращают правдоподобные ответы
+"""
+import itertools
+import sys
+import typing
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncGenerator, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.methods import TelegramMethod  # noqa: E402
+from aiogram.types import CallbackQuery, Chat, File, Message, MessageId, User  # noqa: E402
+
+
+FAKE_BOT_TOKEN = "42:BENCHMARK"
+
+
+class FakeSession(BaseSession):
+    """Сессия, которая считает вызовы методов и отвечает без сети"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls: Counter = Counter()
+        self._message_ids = itertools.count(1000)
+
+    def _fake_message(self, bot: Bot, method: TelegramMethod) -> Message:
+        chat_id = getattr(method, "chat_id", None)
+        chat_id = chat_id if isinstance(chat_id, int) else 1
+        return Message(
+            message_id=getattr(method, "message_id", None) or next(self._message_ids),
+            date=datetime.now(),
+            chat=Chat(id=chat_id, type="private"),
+            text=getattr(method, "text", None),
+        ).as_(bot)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        self.calls[method.__api_method__] += 1
+        returning = method.__returning__
+        if returning is Message or Message in typing.get_args(returning):
+            return self._fake_message(bot, method)
+        if returning is File:
+            return File(file_id=method.file_id, file_unique_id=method.file_id, file_path=f"files/{method.file_id}")
+        if returning is MessageId:
+            return MessageId(message_id=next(self._message_ids))
+        if typing.get_origin(returning) is list:
+            return [self._fake_message(bot, method)]
+        return True
+
+    async def stream_content(self, url: str, headers: Optional[dict] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+def create_fake_bot() -> Bot:
+    return Bot(token=FAKE_BOT_TOKEN, session=FakeSession())
+
+
+def make_user(user_id: int) -> User:
+    return User(id=user_id, is_bot=False, first_name="Bench")
+
+
+def make_message(bot: Bot, user_id: int, text: str) -> Message:
+    """Входящее сообщение пользователя, привязанное к боту"""
+    return Message(
+        message_id=1,
+        date=datetime.now(),
+        chat=Chat(id=user_id, type="private"),
+        from_user=make_user(user_id),
+        text=text,
+    ).as_(bot)
+
+
+def make_callback(bot: Bot, user_id: int, data: str) -> CallbackQuery:
+    """Callback-запрос от кнопки под сообщением бота"""
+    return CallbackQuery(
+        id="1",
+        from_user=make_user(user_id),
+        chat_instance="bench",
+        data=data,
+        message=make_message(bot, user_id, "menu"),
+    ).as_(bot)
@@ -0,0 +1,414 @@
+"""
+Нагрузочный тест: main.py против фиктивного Bot API с тысячами пользователей
+
+Бот запускается без изменений отдельным процессом во временном каталоге
+(TELEGRAM_API_URL указывает на bench/fake_api_server.py). Пользователи проходят
+регистрацию и весь сценарий OrderCreationStates, администраторы переводят
+новые заказы в работу и в статус "Готов". Задержка шага — от постановки
+обновления в очередь getUpdates до ответа бота в чате.
+
+Обработчики переводят FSM в следующее состояние уже после ответа, поэтому
+пауза пользователя между шагами (--think-ms) должна быть заметно больше
+задержки Bot API, иначе следующий шаг попадет в старое состояние.
+
+Запуск из корня проекта:
+    python bench/load_test.py [--users 1000] [--concurrency 100] [--latency-ms 30] [--rate-limit 0.01]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import shutil
+import signal
+import socket
+import struct
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger  # noqa: E402
+
+from db_bench import _git_commit  # noqa: E402
+from fake_api_server import ChatEvent, FakeTelegramServer  # noqa: E402
+from synthetic_data import copy_database, populate  # noqa: E402
+
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+FAKE_BOT_TOKEN = "4242:LOADTEST"
+
+# Идентификаторы участников не пересекаются с пользователями synthetic_data
+FIRST_USER_ID = 200_000_000
+FIRST_ADMIN_ID = 1_000
+
+# Уведомления, которые бот присылает сам, а не в ответ на действие
+_NOTIFICATION_MARKERS = ("🆕 Новый заказ", "готов к выдаче", "❌ Заказ №", "📋 Ваш заказ №", "🔔 Напоминание")
+_NEW_ORDER_PATTERN = re.compile(r"🆕 Новый заказ №(\d+)")
+
+
+def is_notification(event: ChatEvent) -> bool:
+    return any(marker in event.text for marker in _NOTIFICATION_MARKERS)
+
+
+def is_reply(event: ChatEvent) -> bool:
+    return not is_notification(event)
+
+
+def _tetrahedron_stl() -> bytes:
+    """Минимальная бинарная STL-модель для загрузки в заказ"""
+    vertices = [(0, 0, 0), (10, 0, 0), (0, 10, 0), (0, 0, 10)]
+    faces = [(0, 2, 1), (0, 1, 3), (0, 3, 2), (1, 2, 3)]
+    data = bytearray(b"load test".ljust(80, b"\0"))
+    data += struct.pack("<I", len(faces))
+    for face in faces:
+        data += struct.pack("<3f", 0.0, 0.0, 0.0)
+        for index in face:
+            data += struct.pack("<3f", *vertices[index])
+        data += struct.pack("<H", 0)
+    return bytes(data)
+
+
+class StepFailed(Exception):
+    """Бот не ответил на шаг сценария"""
+
+
+class LoadStats:
+    """Задержки и ошибки по шагам сценариев"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.orders_created = 0
+        self.orders_processed = 0
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        result = {}
+        for step in sorted(set(self.latencies) | set(self.errors)):
+            timings = sorted(self.latencies.get(step, []))
+            result[step] = {
+                "count": len(timings),
+                "errors": self.errors.get(step, 0),
+                "p50_ms": round(_percentile(timings, 0.50) * 1000, 2),
+                "p99_ms": round(_percentile(timings, 0.99) * 1000, 2),
+                "max_ms": round(timings[-1] * 1000, 2) if timings else 0.0,
+            }
+        return result
+
+
+def _percentile(timings: List[float], q: float) -> float:
+    if not timings:
+        return 0.0
+    return timings[min(len(timings) - 1, int(len(timings) * q))]
+
+
+class SimulatedClient:
+    """Участник чата с ботом: отправляет обновления и ждет ответа"""
+
+    _callback_ids = itertools.count(1)
+
+    def __init__(self, server: FakeTelegramServer, user_id: int, stats: LoadStats, timeout: float):
+        self.server = server
+        self.user_id = user_id
+        self.stats = stats
+        self.timeout = timeout
+        self.user = {"id": user_id, "is_bot": False, "first_name": "Load", "username": f"load{user_id}"}
+
+    async def _exchange(self, step: str, update: Dict[str, Any]) -> ChatEvent:
+        start = self.server.event_count(self.user_id)
+        pushed = time.perf_counter()
+        await self.server.push_update(update)
+        try:
+            _, event = await self.server.wait_event(self.user_id, start, is_reply, self.timeout)
+        except asyncio.TimeoutError:
+            self.stats.errors[step] += 1
+            raise StepFailed(step)
+        self.stats.latencies[step].append(event.received_at - pushed)
+        return event
+
+    def _message(self, **content: Any) -> Dict[str, Any]:
+        return {
+            "message_id": self.server.next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": self.user_id, "type": "private"},
+            "from": self.user,
+            **content,
+        }
+
+    async def send_text(self, step: str, text: str) -> ChatEvent:
+        return await self._exchange(step, {"message": self._message(text=text)})
+
+    async def send_photo(self, step: str, file_id: str) -> ChatEvent:
+        photo = [{"file_id": file_id, "file_unique_id": file_id, "width": 800, "height": 600}]
+        return await self._exchange(step, {"message": self._message(photo=photo)})
+
+    async def send_document(self, step: str, file_id: str, file_name: str) -> ChatEvent:
+        document = {"file_id": file_id, "file_unique_id": file_id, "file_name": file_name}
+        return await self._exchange(step, {"message": self._message(document=document)})
+
+    async def press(self, step: str, event: ChatEvent, data_prefix: Optional[str] = None,
+                    text: Optional[str] = None) -> ChatEvent:
+        """Нажать inline-кнопку сообщения по префиксу callback data или тексту"""
+        for button in event.buttons():
+            data = button.get("callback_data") or ""
+            if (data_prefix is not None and data.startswith(data_prefix)) or button.get("text") == text:
+                break
+        else:
+            self.stats.errors[step] += 1
+            raise StepFailed(f"{step}: нет кнопки {data_prefix or text!r}")
+        callback = {
+            "id": str(next(self._callback_ids)),
+            "from": self.user,
+            "chat_instance": str(self.user_id),
+            "data": data,
+            "message": event.message,
+        }
+        return await self._exchange(step, {"callback_query": callback})
+
+
+async def user_scenario(client: SimulatedClient, files: Dict[str, str], think: float) -> None:
+    """Регистрация и создание заказа на 3D-печать"""
+    await client.send_text("/start", "/start")
+    await asyncio.sleep(think)
+    await client.send_text("register:first_name", "Нагрузкин")
+    await asyncio.sleep(think)
+    await client.send_text("register:last_name", "Тест")
+    await asyncio.sleep(think)
+    event = await client.send_text("new_order", "Создать заказ")
+    await asyncio.sleep(think)
+    await client.press("select_order_type", event, data_prefix="select_order_type:3d_print")
+    await asyncio.sleep(think)
+    await client.send_photo("photo", files["photo"])
+    await asyncio.sleep(think)
+    await client.send_document("model", files["model"], "bracket.stl")
+    await asyncio.sleep(think)
+    event = await client.send_text("part_name", f"кронштейн {client.user_id}")
+    await asyncio.sleep(think)
+    event = await client.press("select_material", event, data_prefix="select_material:")
+    await asyncio.sleep(think)
+    event = await client.press("select_quantity", event, data_prefix="select_quantity:")
+    await asyncio.sleep(think)
+    event = await client.press("skip_comment", event, data_prefix="skip_comment")
+    await asyncio.sleep(think)
+    event = await client.press("confirm_order", event, data_prefix="confirm_order")
+    if "создан" in event.text:
+        client.stats.orders_created += 1
+    await asyncio.sleep(think)
+    await client.send_text("my_orders", "Мои заказы")
+
+
+async def admin_worker(client: SimulatedClient, queue: asyncio.Queue) -> None:
+    """Разворачивает уведомления о новых заказах и доводит заказы до статуса "Готов" """
+    while True:
+        order_id, event = await queue.get()
+        try:
+            event = await client.press("admin:expand_order", event, data_prefix=f"admin_expand_order:{order_id}")
+            event = await client.press("admin:set_in_progress", event, text="Принять в работу")
+            await client.press("admin:set_ready", event, text="Готов")
+            client.stats.orders_processed += 1
+        except StepFailed:
+            pass
+        finally:
+            queue.task_done()
+
+
+async def watch_new_orders(server: FakeTelegramServer, admin_ids: List[int], queues: List[asyncio.Queue]) -> None:
+    """Раздать уведомления о новых заказах администраторам (каждому свою долю)"""
+    async def watch(index: int, admin_id: int) -> None:
+        cursor = 0
+        while True:
+            cursor, event = await server.wait_event(
+                admin_id, cursor, lambda item: _NEW_ORDER_PATTERN.search(item.text) is not None, timeout=86400
+            )
+            cursor += 1
+            order_id = int(_NEW_ORDER_PATTERN.search(event.text).group(1))
+            if order_id % len(admin_ids) == index:
+                queues[index].put_nowait((order_id, event))
+
+    await asyncio.gather(*(watch(index, admin_id) for index, admin_id in enumerate(admin_ids)))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _start_bot(work_dir: Path, api_url: str, admin_ids: List[int]) -> asyncio.subprocess.Process:
+    env = dict(
+        os.environ,
+        BOT_TOKEN=FAKE_BOT_TOKEN,
+        TELEGRAM_API_URL=api_url,
+        ADMIN_IDS=",".join(map(str, admin_ids)),
+        METRICS_PORT="0",
+        PYTHONUNBUFFERED="1",
+    )
+    log_file = open(work_dir / "bot.log", "wb")
+    try:
+        return await asyncio.create_subprocess_exec(
+            sys.executable, str(PROJECT_DIR / "main.py"),
+            cwd=work_dir, env=env, stdout=log_file, stderr=asyncio.subprocess.STDOUT,
+        )
+    finally:
+        log_file.close()
+
+
+async def _stop_bot(process: asyncio.subprocess.Process) -> None:
+    if process.returncode is not None:
+        return
+    process.send_signal(signal.SIGINT)
+    try:
+        await asyncio.wait_for(process.wait(), 15)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+
+async def run(args: argparse.Namespace, work_dir: Path) -> Dict[str, Any]:
+    server = FakeTelegramServer(args.latency_ms, args.jitter_ms, args.rate_limit, args.retry_after, seed=548)
+    port = args.port or _free_port()
+    runner = await server.start("127.0.0.1", port)
+    admin_ids = [FIRST_ADMIN_ID + index for index in range(args.admins)]
+    process = await _start_bot(work_dir, f"http://127.0.0.1:{port}", admin_ids)
+    stats = LoadStats()
+    try:
+        started = asyncio.ensure_future(server.polling_started.wait())
+        exited = asyncio.ensure_future(process.wait())
+        await asyncio.wait({started, exited}, timeout=60, return_when=asyncio.FIRST_COMPLETED)
+        exited.cancel()
+        if not server.polling_started.is_set():
+            started.cancel()
+            raise RuntimeError("Бот не начал опрос getUpdates, см. журнал бота")
+        logger.info("Бот запущен, начинаем нагрузку")
+
+        files = {
+            "photo": server.add_file(b"\xff\xd8\xff\xe0" + bytes(4096), "photos/load.jpg"),
+            "model": server.add_file(_tetrahedron_stl(), "documents/bracket.stl"),
+        }
+        queues: List[asyncio.Queue] = [asyncio.Queue() for _ in admin_ids]
+        background = [asyncio.create_task(watch_new_orders(server, admin_ids, queues))]
+        background += [
+            asyncio.create_task(admin_worker(SimulatedClient(server, admin_id, stats, args.step_timeout), queue))
+            for admin_id, queue in zip(admin_ids, queues)
+        ]
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+        completed = Counter()
+
+        async def simulate(index: int) -> None:
+            async with semaphore:
+                client = SimulatedClient(server, FIRST_USER_ID + index, stats, args.step_timeout)
+                try:
+                    await user_scenario(client, files, args.think_ms / 1000.0)
+                    completed["ok"] += 1
+                except StepFailed:
+                    completed["failed"] += 1
+                if sum(completed.values()) % 100 == 0:
+                    logger.info(f"Пользователей: {sum(completed.values())}/{args.users}")
+
+        load_started = time.perf_counter()
+        await asyncio.gather(*(simulate(index) for index in range(args.users)))
+        users_elapsed = time.perf_counter() - load_started
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in queues)), args.step_timeout * 3)
+        except asyncio.TimeoutError:
+            logger.warning("Администраторы не успели обработать все заказы")
+        elapsed = time.perf_counter() - load_started
+        for task in background:
+            task.cancel()
+    finally:
+        await _stop_bot(process)
+        await runner.cleanup()
+
+    updates = sum(len(timings) for timings in stats.latencies.values())
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "users": args.users,
+            "admins": args.admins,
+            "concurrency": args.concurrency,
+            "think_ms": args.think_ms,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "rate_limit": args.rate_limit,
+            "bot_exit_code": process.returncode,
+        },
+        "throughput": {
+            "duration_s": round(elapsed, 2),
+            "users_completed": completed["ok"],
+            "users_failed": completed["failed"],
+            "orders_created": stats.orders_created,
+            "orders_processed": stats.orders_processed,
+            "updates_per_s": round(updates / elapsed, 1) if elapsed else 0.0,
+            "orders_per_s": round(stats.orders_created / users_elapsed, 2) if users_elapsed else 0.0,
+        },
+        "steps": stats.summary(),
+        "api": {
+            "calls": dict(server.calls.most_common()),
+            "rate_limited": dict(server.rate_limited.most_common()),
+            "uploaded_mb": round(server.uploaded_bytes / 1024 / 1024, 2),
+        },
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"{'step':<26} {'count':>7} {'errors':>7} {'p50, мс':>9} {'p99, мс':>9} {'max, мс':>9}")
+    for step, item in report["steps"].items():
+        print(f"{step:<26} {item['count']:>7} {item['errors']:>7} "
+              f"{item['p50_ms']:>9.1f} {item['p99_ms']:>9.1f} {item['max_ms']:>9.1f}")
+    print(json.dumps(report["throughput"], ensure_ascii=False))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000, help="число пользователей, создающих заказ")
+    parser.add_argument("--admins", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=100, help="пользователей одновременно")
+    parser.add_argument("--think-ms", type=float, default=500.0, help="пауза пользователя между шагами")
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="задержка ответа Bot API")
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--step-timeout", type=float, default=30.0, help="ожидание ответа бота на шаг, с")
+    parser.add_argument("--port", type=int, default=0, help="порт фиктивного Bot API (0 — свободный)")
+    parser.add_argument("--db", type=Path, help="готовая база из bench/synthetic_data.py (используется копия)")
+    parser.add_argument("--history-users", type=int, default=1000, help="пользователей в синтетической истории")
+    parser.add_argument("--history-orders", type=int, default=20_000, help="заказов в синтетической истории")
+    parser.add_argument("--output", type=Path, default=Path("load_report.json"))
+    parser.add_argument("--bot-log", type=Path, default=Path("load_bot.log"), help="куда сохранить вывод бота")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="INFO", filter=lambda record: record["name"] in ("__main__", "fake_api_server"))
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = Path(work_dir)
+        db_path = work_dir / "database.db"
+        if args.db:
+            copy_database(args.db, db_path)
+            dataset = {"source": str(args.db)}
+        else:
+            dataset = populate(db_path, args.history_users, args.history_orders)
+        logger.info(f"База: {dataset}")
+        try:
+            report = asyncio.run(run(args, work_dir))
+        finally:
+            if (work_dir / "bot.log").exists():
+                shutil.copyfile(work_dir / "bot.log", args.bot_log)
+        report["meta"]["dataset"] = dataset
+        report["meta"]["bot_log"] = str(args.bot_log)
+
+    args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print_report(report)
+    logger.info(f"Отчет сохранен в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Проверка миграций на базе старой схемы: номера удаленных заказов не выдаются повторно
+
+База создается миграциями до пересоздания таблицы orders (время заказов
+текстом, как до миграции 4), из нее удаляется последний заказ, затем
+Database.init_db доводит схему до актуальной. Новый заказ должен получить
+номер больше удаленного: по номеру заказа его видят пользователи, а журнал
+order_events и аналитика связывают события с заказом.
+
+Запуск из корня проекта:
+    python bench/migration_check.py
+"""
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import aiosqlite  # noqa: E402
+
+import database  # noqa: E402
+import migrations  # noqa: E402
+
+
+# Миграция, пересоздающая таблицу orders
+REBUILD_MIGRATION = 4
+
+# Заказов в старой базе; последний удаляется до миграции
+ORDERS = 5
+
+USER_ID = 100
+
+
+async def _create_old_database(path: Path) -> int:
+    """База схемы до REBUILD_MIGRATION с ORDERS заказами без последнего, вернуть номер удаленного"""
+    async with aiosqlite.connect(path) as db:
+        for number, description, migration in migrations.MIGRATIONS:
+            if number >= REBUILD_MIGRATION:
+                break
+            await db.execute("BEGIN IMMEDIATE")
+            await migration(db)
+            await db.execute(f"PRAGMA user_version = {number:d}")
+            await db.commit()
+
+        await db.execute(
+            "INSERT INTO users (user_id, first_name, last_name) VALUES (?, 'Проверка', 'Миграции')", (USER_ID,)
+        )
+        cursor = await db.execute("SELECT id FROM statuses WHERE code = 'pending'")
+        status_id = (await cursor.fetchone())[0]
+        await db.executemany(
+            "INSERT INTO orders (user_id, status_id, part_name) VALUES (?, ?, ?)",
+            [(USER_ID, status_id, f"деталь {i}") for i in range(ORDERS)]
+        )
+        cursor = await db.execute("SELECT MAX(id) FROM orders")
+        deleted_id = (await cursor.fetchone())[0]
+        await db.execute("DELETE FROM orders WHERE id = ?", (deleted_id,))
+        await db.commit()
+    return deleted_id
+
+
+async def main() -> bool:
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "database.db"
+        deleted_id = await _create_old_database(path)
+
+        db = database.Database(path)
+        await db.init_db()
+        new_id = await db.create_order(USER_ID, None, "деталь после миграции", "", "")
+
+    if new_id <= deleted_id:
+        print(f"Ошибка: после миграции новый заказ получил номер {new_id}, удаленный заказ имел номер {deleted_id}")
+        return False
+    print(f"OK: удален заказ {deleted_id}, новый заказ после миграции — {new_id}")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
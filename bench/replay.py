@@ -0,0 +1,230 @@
+"""
+Воспроизведение записи обновлений (recorder.py) через Dispatcher бота
+
+Обновления подаются в dp.feed_update с фиктивным ботом (bench/fake_bot.py)
+и копией базы данных в исходном темпе (--speed 1), ускоренно (--speed N) или
+без пауз (--speed 0). Бот работает во временном каталоге, так что файлы и
+база проекта не меняются. Отчет — распределение задержек по обработчикам,
+сравнение времени обработки с записью и отставание от расписания.
+
+Запуск из корня проекта:
+    python bench/replay.py logs/recordings/updates_....jsonl.gz --db database.db [--speed 10]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger  # noqa: E402
+
+
+def _distribution(timings: List[float]) -> Dict[str, float]:
+    """Сводка по задержкам в миллисекундах"""
+    if not timings:
+        return {"count": 0}
+    timings = sorted(timings)
+
+    def percentile(q: float) -> float:
+        return round(timings[min(len(timings) - 1, int(len(timings) * q))] * 1000, 3)
+
+    return {
+        "count": len(timings),
+        "mean_ms": round(sum(timings) / len(timings) * 1000, 3),
+        "p50_ms": percentile(0.50),
+        "p90_ms": percentile(0.90),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(timings[-1] * 1000, 3),
+    }
+
+
+async def replay(recording: Path, speed: float, concurrency: int) -> Dict[str, Any]:
+    # Модули бота импортируются после перехода во временный каталог:
+    # config создает каталоги файлов, а база открывается по относительному пути
+    from aiogram import BaseMiddleware
+    from aiogram.fsm.storage.base import StorageKey
+    from aiogram.types import TelegramObject, Update
+
+    import config
+    import database
+    import main as bot_main
+    from fake_bot import create_fake_bot
+    from metrics import event_route
+    from recorder import read_recording
+
+    # main.py при импорте подключает журналы бота; в консоль выводится только ход воспроизведения
+    logger.remove()
+    logger.add(sys.stderr, level="INFO", filter=lambda record: record["name"] == "__main__")
+
+    entries = sorted(read_recording(recording), key=lambda entry: entry["offset"])
+    if not entries:
+        raise SystemExit(f"{recording}: нет записанных обновлений")
+    logger.info(f"Обновлений в записи: {len(entries)}")
+
+    # Псевдонимы администраторов из записи получают роль администратора
+    config.ADMIN_IDS = frozenset(entry["user_id"] for entry in entries if entry.get("admin") and entry.get("user_id"))
+
+    handler_timings: Dict[str, List[float]] = defaultdict(list)
+    handler_errors: Counter = Counter()
+
+    class ReplayTimingMiddleware(BaseMiddleware):
+        """Точное время каждого вызова обработчика по маршруту"""
+
+        async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+        ) -> Any:
+            route = event_route(event, data)
+            started = time.perf_counter()
+            try:
+                return await handler(event, data)
+            except Exception:
+                handler_errors[route] += 1
+                raise
+            finally:
+                handler_timings[route].append(time.perf_counter() - started)
+
+    dp = bot_main.create_dispatcher()
+    dp.message.middleware(ReplayTimingMiddleware())
+    dp.callback_query.middleware(ReplayTimingMiddleware())
+    bot = create_fake_bot()
+    await database.db.init_db()
+
+    # Состояние FSM на момент первого обновления каждого пользователя
+    seeded = set()
+    for entry in entries:
+        key = (entry.get("chat_id"), entry.get("user_id"))
+        if None in key or key in seeded:
+            continue
+        seeded.add(key)
+        if entry.get("state"):
+            await dp.storage.set_state(StorageKey(bot_id=bot.id, chat_id=key[0], user_id=key[1]), entry["state"])
+
+    update_timings: Dict[str, List[float]] = defaultdict(list)
+    recorded_timings: Dict[str, List[float]] = defaultdict(list)
+    lags: List[float] = []
+    failed = Counter()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    # Обновления одного чата подаются по очереди: пользователь дожидается ответа бота
+    chat_tails: Dict[Any, asyncio.Task] = {}
+
+    async def feed(entry: Dict[str, Any], previous: asyncio.Task | None) -> None:
+        if previous is not None:
+            await asyncio.wait([previous])
+        update = Update.model_validate(entry["update"], context={"bot": bot})
+        started = time.perf_counter()
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            failed[type(e).__name__] += 1
+            if failed[type(e).__name__] == 1:
+                logger.opt(exception=e).warning(f"Ошибка обработки обновления {update.update_id}")
+        finally:
+            update_timings[entry["event_type"]].append(time.perf_counter() - started)
+            semaphore.release()
+
+    tasks = []
+    replay_started = time.perf_counter()
+    for entry in entries:
+        recorded_timings[entry["event_type"]].append(entry["duration"])
+        if speed > 0:
+            target = replay_started + entry["offset"] / speed
+            delay = target - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await semaphore.acquire()
+        if speed > 0:
+            lags.append(max(0.0, time.perf_counter() - target))
+        chat = entry.get("chat_id") or entry.get("user_id") or entry["update"]["update_id"]
+        task = asyncio.create_task(feed(entry, chat_tails.get(chat)))
+        chat_tails[chat] = task
+        tasks.append(task)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - replay_started
+    await bot.session.close()
+
+    recorded_span = entries[-1]["offset"] - entries[0]["offset"] if entries else 0.0
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "speed": speed,
+            "concurrency": concurrency,
+            "updates": len(entries),
+            "recorded_span_s": round(recorded_span, 2),
+            "duration_s": round(elapsed, 2),
+            "updates_per_s": round(len(entries) / elapsed, 1) if elapsed else 0.0,
+            "failed_updates": dict(failed),
+            "api_calls": dict(bot.session.calls.most_common()),
+        },
+        "schedule_lag": _distribution(lags),
+        "handlers": {
+            route: {**_distribution(timings), "errors": handler_errors.get(route, 0)}
+            for route, timings in sorted(handler_timings.items())
+        },
+        "updates": {
+            event_type: {"replayed": _distribution(timings), "recorded": _distribution(recorded_timings[event_type])}
+            for event_type, timings in sorted(update_timings.items())
+        },
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"{'handler':<32} {'count':>7} {'p50, мс':>9} {'p90, мс':>9} {'p99, мс':>9} {'errors':>7}")
+    for route, item in report["handlers"].items():
+        print(f"{route:<32} {item['count']:>7} {item['p50_ms']:>9.2f} {item['p90_ms']:>9.2f} "
+              f"{item['p99_ms']:>9.2f} {item['errors']:>7}")
+    for event_type, item in report["updates"].items():
+        replayed, recorded = item["replayed"], item["recorded"]
+        print(f"{event_type}: p50 {replayed['p50_ms']:.2f} мс (в записи {recorded['p50_ms']:.2f}), "
+              f"p99 {replayed['p99_ms']:.2f} мс (в записи {recorded['p99_ms']:.2f})")
+    print(json.dumps(report["meta"], ensure_ascii=False))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("recording", type=Path, help="файл logs/recordings/updates_*.jsonl.gz")
+    parser.add_argument("--db", type=Path, help="база данных (используется копия); без нее — пустая база")
+    parser.add_argument("--speed", type=float, default=1.0, help="ускорение относительно записи, 0 — без пауз")
+    parser.add_argument("--concurrency", type=int, default=256, help="обновлений в обработке одновременно")
+    parser.add_argument("--output", type=Path, default=Path("replay_report.json"))
+    args = parser.parse_args()
+
+    recording = args.recording.resolve()
+    output = args.output.resolve()
+    project_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        if args.db:
+            # backup API: у работающего бота (журнал WAL) часть записей еще в файле -wal
+            source = sqlite3.connect(args.db)
+            target = sqlite3.connect(Path(work_dir) / "database.db")
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+        os.chdir(work_dir)
+        try:
+            report = asyncio.run(replay(recording, args.speed, args.concurrency))
+        finally:
+            os.chdir(project_dir)
+    report["meta"]["recording"] = str(args.recording)
+
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print_report(report)
+    logger.info(f"Отчет сохранен в {output}")
+
+
+if __name__ == "__main__":
+    main()
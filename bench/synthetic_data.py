@@ -0,0 +1,218 @@
+"""
+Генератор синтетической истории заказов для бенчмарков
+
+Схема создается через Database.init_db (со всеми триггерами и индексами),
+затем пользователи, материалы, заказы и журнал их статусов вставляются
+одной транзакцией.
+
+Запуск из корня проекта:
+    python bench/synthetic_data.py bench.db [--users 10000] [--orders 500000]
+"""
+import argparse
+import asyncio
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import config  # noqa: E402
+import database  # noqa: E402
+
+
+DEFAULT_USERS = 10_000
+DEFAULT_ORDERS = 500_000
+DEFAULT_SEED = 548
+
+# Доли заказов по статусам; архив ограничен ARCHIVE_MAX_SIZE, как в рабочей базе
+STATUS_WEIGHTS = {
+    "pending": 0.25,
+    "in_progress": 0.20,
+    "ready": 0.15,
+    "rejected": 0.40,
+}
+
+# Статусы, через которые заказ прошел к конечному статусу (журнал order_events)
+STATUS_PATHS = {
+    "pending": ("pending",),
+    "in_progress": ("pending", "in_progress"),
+    "ready": ("pending", "in_progress", "ready"),
+    "rejected": ("pending", "rejected"),
+    "archived": ("pending", "in_progress", "ready", "archived"),
+}
+
+# Среднее время в статусе до перехода в следующий (часы); для работы умножается на скорость материала
+STATUS_MEAN_HOURS = {"pending": 20, "in_progress": 30, "ready": 48}
+
+# Доля заказов лазерной резки
+LASER_CUT_SHARE = 0.2
+
+# Период, на который растягивается история заказов
+HISTORY_DAYS = 730
+
+_FIRST_NAMES = ["Иван", "Анна", "Петр", "Мария", "Алексей", "Ольга", "Дмитрий", "Елена", "Сергей", "Наталья"]
+_LAST_NAMES = ["Иванов", "Смирнова", "Кузнецов", "Попова", "Соколов", "Лебедева", "Козлов", "Новикова"]
+_PLASTICS = ["PLA", "PETG", "ABS", "TPU", "Nylon", "ASA"]
+_COLORS = ["черный", "белый", "красный", "синий", "зеленый", "серый", "желтый", "оранжевый"]
+_SHEETS = ["фанера 3 мм", "фанера 6 мм", "акрил 3 мм", "акрил 5 мм", "МДФ 4 мм", "картон 2 мм"]
+_PARTS = [
+    "кронштейн", "корпус датчика", "шестерня", "крышка", "держатель камеры", "колесо",
+    "панель", "втулка", "захват манипулятора", "рамка", "пластина основания", "упор",
+]
+_COMMENTS = [
+    "заполнение 30%", "нужно срочно", "с поддержками", "слой 0.2 мм", "без поддержек",
+    "2 экземпляра", "аккуратно с отверстиями", "для соревнований",
+]
+_REJECTIONS = ["Модель не помещается на стол", "Нет материала", "Ошибки в модели", "Дубликат заказа"]
+
+
+def _timestamp(moment: datetime) -> int:
+    """Время в формате столбцов orders (created_at, last_reminder_time): секунды Unix"""
+    return int(moment.timestamp())
+
+
+def copy_database(source: Path, target: Path) -> None:
+    """Копия базы через backup API SQLite: в режиме WAL часть записей может быть еще в файле -wal"""
+    source_connection = sqlite3.connect(source)
+    try:
+        target_connection = sqlite3.connect(target)
+        try:
+            source_connection.backup(target_connection)
+        finally:
+            target_connection.close()
+    finally:
+        source_connection.close()
+
+
+def populate(
+    db_path: Path,
+    users: int = DEFAULT_USERS,
+    orders: int = DEFAULT_ORDERS,
+    seed: int = DEFAULT_SEED
+) -> dict:
+    """Создать базу db_path и заполнить ее синтетическими данными, вернуть сводку"""
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    asyncio.run(database.Database(db_path).init_db())
+
+    connection = sqlite3.connect(db_path)
+    try:
+        connection.execute("PRAGMA synchronous = OFF")
+        status_ids = dict(connection.execute("SELECT code, id FROM statuses"))
+
+        materials = [(f"{color} {plastic}", "3d_print") for plastic in _PLASTICS for color in _COLORS]
+        materials += [(sheet, "laser_cut") for sheet in _SHEETS]
+        connection.executemany("INSERT OR IGNORE INTO materials (name, type) VALUES (?, ?)", materials)
+        material_ids = {"3d_print": [], "laser_cut": []}
+        for material_id, material_type in connection.execute("SELECT id, type FROM materials"):
+            material_ids.setdefault(material_type, []).append(material_id)
+
+        now = datetime.now().replace(microsecond=0)
+        user_rows = []
+        for index in range(users):
+            user_id = 100_000_000 + index
+            registered = now - timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400))
+            username = f"user{index}" if rng.random() < 0.8 else None
+            user_rows.append((
+                user_id, rng.choice(_FIRST_NAMES), rng.choice(_LAST_NAMES), username,
+                registered.strftime("%Y-%m-%d %H:%M:%S"),
+            ))
+        connection.executemany(
+            "INSERT OR IGNORE INTO users (user_id, first_name, last_name, username, registered_at) VALUES (?, ?, ?, ?, ?)",
+            user_rows
+        )
+
+        # Активность пользователей неравномерна: часть заказывает намного чаще
+        user_ids = [row[0] for row in user_rows]
+        user_weights = [rng.paretovariate(1.2) for _ in user_ids]
+        statuses = list(STATUS_WEIGHTS)
+        status_weights = list(STATUS_WEIGHTS.values())
+        archived = min(config.ARCHIVE_MAX_SIZE, orders)
+
+        def order_rows():
+            owners = rng.choices(user_ids, weights=user_weights, k=orders)
+            for index in range(orders):
+                order_type = "laser_cut" if rng.random() < LASER_CUT_SHARE else "3d_print"
+                status = "archived" if index >= orders - archived else rng.choices(statuses, status_weights)[0]
+                # Номера заказов растут вместе с датой создания
+                created = now - timedelta(seconds=HISTORY_DAYS * 86400 * (orders - index) // orders)
+                part_name = f"{rng.choice(_PARTS)} {rng.randint(1, 999)}"
+                extension = ".dxf" if order_type == "laser_cut" else rng.choice([".stl", ".stl", ".step"])
+                yield (
+                    owners[index],
+                    status_ids[status],
+                    rng.choice(material_ids[order_type]) if material_ids[order_type] else None,
+                    part_name,
+                    f"files/photos/bench_{index}.jpg",
+                    f"files/models/bench_{index}{extension}",
+                    None,
+                    f"{part_name.replace(' ', '_')}{extension}",
+                    rng.choice(_REJECTIONS) if status == "rejected" else None,
+                    rng.choice(_COMMENTS) if rng.random() < 0.3 else None,
+                    order_type,
+                    _timestamp(created),
+                    rng.choice([1, 1, 1, 2, 3, 5]),
+                )
+
+        connection.executemany(
+            """
+            INSERT INTO orders (
+                user_id, status_id, material_id, part_name, photo_path, model_path, photo_caption,
+                original_filename, rejection_reason, comment, order_type, created_at, quantity
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            order_rows()
+        )
+
+        # Триггер записал одно событие на заказ (конечный статус в момент создания);
+        # вместо него — путь заказа по статусам со случайными длительностями
+        connection.execute("DELETE FROM order_events")
+        status_codes = {status_id: code for code, status_id in status_ids.items()}
+        material_speed = {
+            material_id: rng.uniform(0.5, 2.0) for ids in material_ids.values() for material_id in ids
+        }
+        latest = _timestamp(now)
+
+        def event_rows():
+            order_items = connection.execute(
+                "SELECT id, status_id, order_type, material_id, created_at FROM orders ORDER BY id"
+            ).fetchall()
+            for order_id, status_id, order_type, material_id, created_at in order_items:
+                moment = created_at
+                for code in STATUS_PATHS[status_codes[status_id]]:
+                    yield order_id, status_ids[code], order_type, material_id, min(moment, latest)
+                    hours = rng.expovariate(1 / STATUS_MEAN_HOURS.get(code, 24))
+                    if code == "in_progress":
+                        hours *= material_speed.get(material_id, 1.0)
+                    moment += int(hours * 3600)
+
+        connection.executemany(
+            "INSERT INTO order_events (order_id, status_id, order_type, material_id, created_at) VALUES (?, ?, ?, ?, ?)",
+            event_rows()
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+    return {
+        "users": users,
+        "orders": orders,
+        "seed": seed,
+        "seconds": round(time.perf_counter() - started, 2),
+        "size_mb": round(db_path.stat().st_size / 1024 / 1024, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("db_path", type=Path)
+    parser.add_argument("--users", type=int, default=DEFAULT_USERS)
+    parser.add_argument("--orders", type=int, default=DEFAULT_ORDERS)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    args = parser.parse_args()
+    if args.db_path.exists():
+        parser.error(f"{args.db_path} уже существует")
+    print(populate(args.db_path, args.users, args.orders, args.seed))
@@ -0,0 +1,119 @@
+"""
+Кеши в памяти процесса
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class AsyncTTLCache:
+    """Асинхронный read-through кеш с временем жизни записей
+
+    Одновременные промахи по одному ключу выполняют загрузку один раз:
+    остальные корутины ждут результат уже запущенной загрузки.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._loading: Dict[Hashable, asyncio.Future] = {}
+        # Увеличивается при сбросе, чтобы не сохранять результат устаревшей загрузки
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None
+    ) -> Any:
+        """Вернуть значение из кеша или загрузить его через loader"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        pending = self._loading.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        generation = self._generation
+        try:
+            value = await loader()
+        except BaseException as e:
+            future.set_exception(e)
+            # Исключение уже передано ожидающим, повторно его не логируем
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            return value
+        finally:
+            if self._loading.get(key) is future:
+                del self._loading[key]
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Сбросить одну запись или весь кеш (key=None)"""
+        self._generation += 1
+        if key is None:
+            self._entries.clear()
+            self._loading.clear()
+        else:
+            self._entries.pop(key, None)
+            self._loading.pop(key, None)
+
+
+class LRUCache:
+    """Ограниченный по размеру кеш с вытеснением давно не использованных записей"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Получить значение и отметить запись как недавно использованную"""
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Сохранить значение, вытеснив самую старую запись при переполнении"""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика попаданий"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
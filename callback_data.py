@@ -0,0 +1,149 @@
+"""
+Компактные типизированные callback data для inline-кнопок
+
+Целые числа кодируются в base36, типы заказов и статусы — короткими кодами,
+поэтому полезная нагрузка заметно меньше лимита Telegram в 64 байта.
+"""
+from typing import Any, ClassVar, Dict, Optional
+
+from aiogram.filters.callback_data import CallbackData
+
+
+_BASE36_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+# Короткие коды типов заказов ("all" — все типы, используется поиском)
+ORDER_TYPE_CODES = {
+    "3d_print": "p",
+    "laser_cut": "l",
+    "all": "*",
+}
+
+# Короткие коды статусов и разделов списка заказов
+STATUS_CODES = {
+    "pending": "p",
+    "in_progress": "w",
+    "ready": "r",
+    "rejected": "x",
+    "archived": "a",
+    "all": "*",
+    "search": "s",
+}
+
+# Раздел "заказы по материалу": material|<id> -> m<id в base36>
+_MATERIAL_STATUS_PREFIX = "material|"
+_MATERIAL_STATUS_CODE = "m"
+
+
+def to_base36(value: int) -> str:
+    """Записать неотрицательное целое в base36"""
+    if value < 0:
+        return "-" + to_base36(-value)
+    digits = []
+    while True:
+        value, remainder = divmod(value, 36)
+        digits.append(_BASE36_DIGITS[remainder])
+        if value == 0:
+            return "".join(reversed(digits))
+
+
+def _encode_status(status: str) -> str:
+    if status.startswith(_MATERIAL_STATUS_PREFIX):
+        return _MATERIAL_STATUS_CODE + to_base36(int(status[len(_MATERIAL_STATUS_PREFIX):]))
+    return STATUS_CODES.get(status, status)
+
+
+def _decode_status(code: str) -> str:
+    for status, short in STATUS_CODES.items():
+        if short == code:
+            return status
+    if code.startswith(_MATERIAL_STATUS_CODE) and len(code) > 1:
+        return f"{_MATERIAL_STATUS_PREFIX}{int(code[1:], 36)}"
+    return code
+
+
+_ORDER_TYPE_BY_CODE = {code: order_type for order_type, code in ORDER_TYPE_CODES.items()}
+
+
+class CompactCallbackData(CallbackData, prefix="~"):
+    """Базовый класс: base36 для int-полей, короткие коды для order_type и status"""
+
+    _INT_FIELDS: ClassVar[frozenset] = frozenset()
+
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs: Any) -> None:
+        super().__pydantic_init_subclass__(**kwargs)
+        cls._INT_FIELDS = frozenset(
+            name for name, field in cls.model_fields.items()
+            if field.annotation in (int, Optional[int])
+        )
+
+    def _encode_value(self, key: str, value: Any) -> str:
+        if value is None:
+            return ""
+        if key in self._INT_FIELDS:
+            return to_base36(value)
+        if key == "order_type":
+            return ORDER_TYPE_CODES.get(value, value)
+        if key == "status":
+            return _encode_status(value)
+        return super()._encode_value(key, value)
+
+    @classmethod
+    def unpack(cls, value: str) -> "CompactCallbackData":
+        """Разобрать callback data, раскодировав base36 и короткие коды"""
+        prefix, *parts = value.split(cls.__separator__)
+        names = list(cls.model_fields)
+        if prefix != cls.__prefix__:
+            raise ValueError(f"Bad prefix ({prefix!r} != {cls.__prefix__!r})")
+        if len(parts) != len(names):
+            raise TypeError(
+                f"Callback data {cls.__name__!r} takes {len(names)} arguments but {len(parts)} were given"
+            )
+
+        payload: Dict[str, Any] = {}
+        for key, part in zip(names, parts):
+            if part == "":
+                payload[key] = None
+            elif key in cls._INT_FIELDS:
+                payload[key] = int(part, 36)
+            elif key == "order_type":
+                payload[key] = _ORDER_TYPE_BY_CODE.get(part, part)
+            elif key == "status":
+                payload[key] = _decode_status(part)
+            else:
+                payload[key] = part
+        return cls(**payload)
+
+
+class AdminOrderCallback(CompactCallbackData, prefix="ao"):
+    """Открыть заказ из списка администратора"""
+    order_type: str
+    status: str
+    order_id: int
+    page: int = 0
+
+
+class AdminOrdersPageCallback(CompactCallbackData, prefix="ap"):
+    """Страница списка заказов администратора"""
+    order_type: str
+    status: str
+    page: int = 0
+
+
+class AdminBackToOrdersCallback(CompactCallbackData, prefix="ab"):
+    """Вернуться из карточки заказа к списку (без параметров — по данным состояния)"""
+    order_type: Optional[str] = None
+    status: Optional[str] = None
+    page: Optional[int] = None
+
+
+class AdminOrdersCallback(CompactCallbackData, prefix="as"):
+    """Открыть раздел заказов (тип + статус)"""
+    order_type: str
+    status: str
+
+
+class SetStatusCallback(CompactCallbackData, prefix="ss"):
+    """Изменить статус заказа"""
+    order_id: int
+    status: str
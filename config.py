@@ -12,13 +12,17 @@ load_dotenv()
 # Читается из .env файла или переменной окружения
 BOT_TOKEN = os.getenv("BOT_TOKEN", "")
 
-# Список user_id администраторов (через запятую или список)
+# Адрес сервера Bot API (по умолчанию api.telegram.org); используется для локального
+# Bot API и фиктивного сервера нагрузочных тестов (bench/fake_api_server.py)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+
+# Множество user_id администраторов (в .env через запятую)
 # Читается из .env файла или переменной окружения
-ADMIN_IDS = [
+ADMIN_IDS = frozenset(
     int(admin_id.strip()) 
     for admin_id in os.getenv("ADMIN_IDS", "").split(",") 
     if admin_id.strip().isdigit()
-]
+)
 
 # Путь к базе данных
 DB_PATH = Path("database.db")
@@ -27,11 +31,16 @@ DB_PATH = Path("database.db")
 FILES_DIR = Path("files")
 PHOTOS_DIR = FILES_DIR / "photos"
 MODELS_DIR = FILES_DIR / "models"
+PREVIEWS_DIR = FILES_DIR / "previews"
+# Упрощенные копии крупных сеток (кеш по хешу содержимого)
+DECIMATED_MODELS_DIR = FILES_DIR / "models_decimated"
 
 # Создаем директории если их нет
 FILES_DIR.mkdir(exist_ok=True)
 PHOTOS_DIR.mkdir(exist_ok=True)
 MODELS_DIR.mkdir(exist_ok=True)
+PREVIEWS_DIR.mkdir(exist_ok=True)
+DECIMATED_MODELS_DIR.mkdir(exist_ok=True)
 
 # Статусы заказов
 ORDER_STATUSES = {
@@ -45,9 +54,52 @@ ORDER_STATUSES = {
 # Максимальное количество заказов в архиве
 ARCHIVE_MAX_SIZE = 25
 
+# Время жизни кеша настроек и материалов в памяти (секунды)
+SETTINGS_CACHE_TTL = 30
+MATERIALS_CACHE_TTL = 300
+
+# Максимальное количество профилей пользователей в кеше (LRU)
+USER_CACHE_SIZE = 10_000
+
+# HTTP-эндпоинт метрик Prometheus (/metrics); порт 0 отключает сервер
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+try:
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+except ValueError:
+    METRICS_PORT = 9108
+
+# Порог журнала медленных SQL-запросов (мс), 0 — трассировка выключена
+try:
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+except ValueError:
+    SLOW_QUERY_MS = 0.0
+
+# Запись входящих обновлений для bench/replay.py (персональные данные удаляются)
+RECORD_UPDATES = os.getenv("RECORD_UPDATES", "0").strip().lower() in ("1", "true", "yes")
+RECORDINGS_DIR = Path("logs/recordings")
+
 # Допустимые расширения для 3D-моделей
 ALLOWED_MODEL_EXTENSIONS = {".stl", ".stp", ".step"}
 
+# Расширения моделей, для которых рендерится превью
+PREVIEW_MODEL_EXTENSIONS = {".stl"}
+
+# Расширения моделей STEP, для которых извлекаются метаданные
+STEP_MODEL_EXTENSIONS = {".stp", ".step"}
+
+# Количество процессов для рендера превью моделей
+try:
+    PREVIEW_WORKERS = max(1, int(os.getenv("PREVIEW_WORKERS", "2")))
+except ValueError:
+    PREVIEW_WORKERS = 2
+
+# Сколько секунд подтверждение заказа ждет превью модели; дольше — администраторы
+# получают уведомление без превью, рендер продолжается и попадает в кеш
+try:
+    PREVIEW_WAIT_SECONDS = max(0.0, float(os.getenv("PREVIEW_WAIT_SECONDS", "5")))
+except ValueError:
+    PREVIEW_WAIT_SECONDS = 5.0
+
 # Допустимые расширения для файлов лазерной резки
 LASER_ALLOWED_MODEL_EXTENSIONS = {".dxf"}
 
@@ -69,3 +121,8 @@ TECH_SUPPORT_CONTACTS = [
     {"name": "Виктор Николаев", "role": "Технический специалист", "contact": "@vdnrobo"}
 ]
 
+
+# Индекс количества заказов по дням и часам (time_buckets.py), сохраняется между запусками
+TIME_BUCKETS_PATH = Path("time_buckets.npz")
+# Сколько последних дней индекс хранит с точностью до часа
+TIME_BUCKETS_HOURLY_DAYS = 90
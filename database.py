@@ -2,300 +2,143 @@
 Модуль для работы с базой данных SQLite
 """
 import aiosqlite
+import json
+import re
+import time
 from pathlib import Path
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any, Tuple, Sequence
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple, Sequence
 from loguru import logger
 import config
+import migrations
+from cache import AsyncTTLCache, LRUCache
+from metrics import DB_DURATION, timed_methods
+from records import OrderListItem, OrderRecord
+import slow_queries
 
 
-class Database:
-    def __init__(self, db_path: Path = config.DB_PATH):
-        self.db_path = db_path
+# Веса столбцов orders_fts для bm25: название детали и заказчик важнее комментариев
+_SEARCH_COLUMN_WEIGHTS = "10.0, 2.0, 2.0, 4.0, 5.0, 5.0, 5.0"
 
-    _DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
-    _DATETIME_MICRO_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
-    _UTC_OFFSET = timedelta(hours=config.TIMEZONE_OFFSET_HOURS)
+# Максимальное количество слов в поисковом запросе
+_SEARCH_MAX_TOKENS = 8
 
-    @classmethod
-    def _format_created_at(cls, created_at: Optional[str]) -> Optional[str]:
-        if not created_at:
-            return created_at
-        for fmt in (cls._DATETIME_FORMAT, cls._DATETIME_MICRO_FORMAT):
-            try:
-                dt = datetime.strptime(created_at, fmt)
-                dt += cls._UTC_OFFSET
-                return dt.strftime(cls._DATETIME_FORMAT)
-            except ValueError:
-                continue
-        return created_at
-
-    @classmethod
-    def _order_row_to_dict(cls, row) -> Optional[Dict[str, Any]]:
-        if row is None:
-            return None
-        data = dict(row)
-        formatted = cls._format_created_at(data.get("created_at"))
-        if formatted:
-            data["created_at"] = formatted
-        return data
+# Статусы, не входящие в активные заказы (статистика 'all')
+_CLOSED_STATUS_CODES = ('archived', 'rejected')
 
-    @classmethod
-    def _order_rows_to_list(cls, rows: List[Any]) -> List[Dict[str, Any]]:
-        return [cls._order_row_to_dict(row) for row in rows if row is not None]
+# Столбцы выгрузки истории заказов (export.EXPORT_COLUMNS — в том же порядке)
+_EXPORT_COLUMNS = """
+    o.id, {created_at}, o.order_type, s.code, m.name, o.user_id, u.first_name, u.last_name,
+    u.username, o.part_name, o.quantity, o.original_filename, o.comment, o.rejection_reason
+"""
+# created_at в выгрузке текстом — местное время, как records.format_timestamp
+_EXPORT_LOCAL_TIME = f"datetime(o.created_at + {round(config.TIMEZONE_OFFSET_HOURS * 3600)}, 'unixepoch')"
 
-    async def init_db(self):
-        """Инициализация базы данных и создание таблиц"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # Таблица пользователей
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    first_name TEXT NOT NULL,
-                    last_name TEXT NOT NULL,
-                    username TEXT,
-                    registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Миграция: добавляем поле username если его нет
-            try:
-                cursor = await db.execute("PRAGMA table_info(users)")
-                columns = [row[1] for row in await cursor.fetchall()]
-                if 'username' not in columns:
-                    await db.execute("ALTER TABLE users ADD COLUMN username TEXT")
-                    await db.commit()
-                    logger.info("Добавлено поле username в таблицу users")
-            except Exception as e:
-                logger.warning(f"Ошибка при добавлении поля username: {e}")
+# Столбцы списков заказов (OrderListItem): запросы списков читают только покрывающие
+# индексы orders (migrations.py, миграция 5) и таблицу statuses
+_ORDER_LIST_COLUMNS = "o.id, o.part_name, s.code as status_code, s.name as status_name"
 
-            # Таблица статусов (предопределенные)
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS statuses (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    code TEXT UNIQUE NOT NULL,
-                    name TEXT NOT NULL
-                )
-            """)
 
-            # Таблица материалов (объединенная: цвет + тип пластика)
-            # Пример: "зеленый PETG", "синий PLA"
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS materials (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE NOT NULL,
-                    type TEXT NOT NULL DEFAULT '3d_print',
-                    is_available INTEGER NOT NULL DEFAULT 1
-                )
-            """)
+@timed_methods(DB_DURATION)
+class Database:
+    def __init__(self, db_path: Path = config.DB_PATH):
+        self.db_path = db_path
+        self._settings_cache = AsyncTTLCache(config.SETTINGS_CACHE_TTL)
+        self._materials_cache = AsyncTTLCache(config.MATERIALS_CACHE_TTL)
+        # Профили пользователей: user_id -> строка users (без отрицательных записей)
+        self._users_cache = LRUCache(config.USER_CACHE_SIZE)
+        # Есть ли orders_fts (None — еще не проверялось)
+        self._search_available: Optional[bool] = None
+
+    def _connect(self) -> aiosqlite.Connection:
+        """Открыть соединение (с трассировкой запросов, если задан SLOW_QUERY_MS)"""
+        if config.SLOW_QUERY_MS > 0:
+            return slow_queries.connect(self.db_path, config.SLOW_QUERY_MS)
+        return aiosqlite.connect(self.db_path)
 
-            # Таблица настроек
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS settings (
-                    key TEXT PRIMARY KEY,
-                    value TEXT NOT NULL
-                )
+    async def init_db(self):
+        """Инициализация базы данных: применение недостающих миграций схемы (migrations.py)"""
+        async with self._connect() as db:
+            await migrations.ensure_wal(db)
+            version = await migrations.migrate(db)
+            self._search_available = await migrations.ensure_search_index(db)
+        logger.info(f"База данных инициализирована (версия схемы {version})")
+
+    async def _rebuild_status_counters(self, db) -> List[Dict[str, Any]]:
+        """Пересчитать счетчики по таблице orders, вернуть найденные расхождения"""
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = await db.execute("""
+                SELECT c.order_type, s.code, c.count
+                FROM order_status_counters c
+                JOIN statuses s ON s.id = c.status_id
             """)
+            stored = {(row[0], row[1]): row[2] for row in await cursor.fetchall()}
 
-            # Таблица шаблонных комментариев для отклонения заказов
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS rejection_templates (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    order_type TEXT NOT NULL,
-                    text TEXT NOT NULL
-                )
+            cursor = await db.execute("""
+                SELECT o.order_type, s.code, COUNT(*)
+                FROM orders o
+                JOIN statuses s ON s.id = o.status_id
+                GROUP BY o.order_type, o.status_id
             """)
+            actual = {(row[0], row[1]): row[2] for row in await cursor.fetchall()}
 
-            # Значения по умолчанию для настроек
-            cursor = await db.execute("SELECT value FROM settings WHERE key = 'orders_enabled'")
-            if not await cursor.fetchone():
-                await db.execute(
-                    "INSERT INTO settings (key, value) VALUES ('orders_enabled', '1')"
-                )
-
-            # Таблица заказов
+            await db.execute("DELETE FROM order_status_counters")
             await db.execute("""
-                CREATE TABLE IF NOT EXISTS orders (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    status_id INTEGER NOT NULL,
-                    material_id INTEGER,
-                    part_name TEXT,
-                    photo_path TEXT,
-                    model_path TEXT,
-                    photo_caption TEXT,
-                    original_filename TEXT,
-                    rejection_reason TEXT,
-                    last_reminder_time TIMESTAMP,
-                    comment TEXT,
-                    order_type TEXT NOT NULL DEFAULT '3d_print',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id),
-                    FOREIGN KEY (status_id) REFERENCES statuses(id),
-                    FOREIGN KEY (material_id) REFERENCES materials(id)
-                )
+                INSERT INTO order_status_counters (order_type, status_id, count)
+                SELECT order_type, status_id, COUNT(*)
+                FROM orders
+                GROUP BY order_type, status_id
             """)
-            
-            # Миграция: добавляем поля если их нет
-            try:
-                cursor = await db.execute("PRAGMA table_info(orders)")
-                columns = [row[1] for row in await cursor.fetchall()]
-                
-                if 'rejection_reason' not in columns:
-                    await db.execute("ALTER TABLE orders ADD COLUMN rejection_reason TEXT")
-                    await db.commit()
-                    logger.info("Добавлено поле rejection_reason в таблицу orders")
-                
-                if 'last_reminder_time' not in columns:
-                    await db.execute("ALTER TABLE orders ADD COLUMN last_reminder_time TIMESTAMP")
-                    await db.commit()
-                    logger.info("Добавлено поле last_reminder_time в таблицу orders")
-                
-                if 'comment' not in columns:
-                    await db.execute("ALTER TABLE orders ADD COLUMN comment TEXT")
-                    await db.commit()
-                    logger.info("Добавлено поле comment в таблицу orders")
-
-                if 'order_type' not in columns:
-                    await db.execute("ALTER TABLE orders ADD COLUMN order_type TEXT NOT NULL DEFAULT '3d_print'")
-                    await db.commit()
-                    logger.info("Добавлено поле order_type в таблицу orders")
-
-                if 'quantity' not in columns:
-                    await db.execute("ALTER TABLE orders ADD COLUMN quantity INTEGER NOT NULL DEFAULT 1")
-                    await db.commit()
-                    logger.info("Добавлено поле quantity в таблицу orders")
-
-                cursor = await db.execute("PRAGMA table_info(materials)")
-                material_columns = [row[1] for row in await cursor.fetchall()]
-
-                if 'type' not in material_columns:
-                    await db.execute("ALTER TABLE materials ADD COLUMN type TEXT NOT NULL DEFAULT '3d_print'")
-                    await db.commit()
-                    logger.info("Добавлено поле type в таблицу materials")
-                if 'is_available' not in material_columns:
-                    await db.execute("ALTER TABLE materials ADD COLUMN is_available INTEGER NOT NULL DEFAULT 1")
-                    await db.commit()
-                    logger.info("Добавлено поле is_available в таблицу materials")
-            except Exception as e:
-                logger.warning(f"Ошибка при добавлении полей в orders или materials: {e}")
-
             await db.commit()
-
-            # Миграция данных из старой структуры (если есть)
-            try:
-                await self._migrate_old_data(db)
-            except Exception as e:
-                logger.warning(f"Миграция данных: {e}")
-            
-            # Удаляем старую таблицу colors если она существует (после миграции)
-            try:
-                await db.execute("DROP TABLE IF EXISTS colors")
-                await db.commit()
-            except Exception as e:
-                logger.warning(f"Удаление таблицы colors: {e}")
-
-            # Добавляем начальные статусы
-            await self._init_statuses(db)
-            # Добавляем начальные материалы (комбинации цвет+тип)
-            # await self._init_default_materials(db)
-
-            logger.info("База данных инициализирована")
-
-    async def _init_statuses(self, db):
-        """Инициализация статусов заказов"""
-        statuses = [
-            ("pending", "В ожидании"),
-            ("in_progress", "В работе"),
-            ("ready", "Готов"),
-            ("rejected", "Отклонен"),
-            ("archived", "Архив")
-        ]
-        for code, name in statuses:
-            await db.execute(
-                "INSERT OR IGNORE INTO statuses (code, name) VALUES (?, ?)",
-                (code, name)
-            )
-        await db.commit()
-
-    async def _migrate_old_data(self, db):
-        """Миграция данных из старой структуры (если есть)"""
-        # Проверяем, есть ли старые данные в orders с color_id
-        try:
-            cursor = await db.execute("PRAGMA table_info(orders)")
-            columns = [row[1] for row in await cursor.fetchall()]
-            
-            if 'color_id' in columns:
-                # Если есть старые данные, создаем комбинации
-                # Получаем все комбинации material_id + color_id
-                cursor = await db.execute("""
-                    SELECT DISTINCT o.material_id, o.color_id, m.name as material_name, c.name as color_name
-                    FROM orders o
-                    LEFT JOIN materials m ON o.material_id = m.id
-                    LEFT JOIN colors c ON o.color_id = c.id
-                    WHERE o.material_id IS NOT NULL AND o.color_id IS NOT NULL
-                """)
-                combinations = await cursor.fetchall()
-                
-                # Создаем комбинации и обновляем orders
-                for material_id, color_id, material_name, color_name in combinations:
-                    if material_name and color_name:
-                        combined_name = f"{color_name.lower()} {material_name.upper()}"
-                        # Проверяем, существует ли уже такая комбинация
-                        cursor = await db.execute(
-                            "SELECT id FROM materials WHERE name = ?",
-                            (combined_name,)
-                        )
-                        existing = await cursor.fetchone()
-                        
-                        if not existing:
-                            # Добавляем новую комбинацию
-                            cursor = await db.execute(
-                                "INSERT INTO materials (name) VALUES (?)",
-                                (combined_name,)
-                            )
-                            new_material_id = cursor.lastrowid
-                        else:
-                            new_material_id = existing[0]
-                        
-                        # Обновляем заказы
-                        await db.execute(
-                            "UPDATE orders SET material_id = ?, color_id = NULL WHERE material_id = ? AND color_id = ?",
-                            (new_material_id, material_id, color_id)
-                        )
-                
-                # Удаляем столбец color_id из orders (SQLite не поддерживает DROP COLUMN напрямую)
-                # Создаем новую таблицу без color_id
-                await db.execute("""
-                    CREATE TABLE orders_new (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        status_id INTEGER NOT NULL,
-                        material_id INTEGER,
-                        part_name TEXT,
-                        photo_path TEXT,
-                        model_path TEXT,
-                        photo_caption TEXT,
-                        original_filename TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (user_id) REFERENCES users(user_id),
-                        FOREIGN KEY (status_id) REFERENCES statuses(id),
-                        FOREIGN KEY (material_id) REFERENCES materials(id)
-                    )
-                """)
-                await db.execute("""
-                    INSERT INTO orders_new 
-                    (id, user_id, status_id, material_id, part_name, photo_path, model_path, photo_caption, original_filename, created_at)
-                    SELECT id, user_id, status_id, material_id, part_name, photo_path, model_path, photo_caption, original_filename, created_at
-                    FROM orders
-                """)
-                await db.execute("DROP TABLE orders")
-                await db.execute("ALTER TABLE orders_new RENAME TO orders")
-                
-                await db.commit()
-                logger.info("Миграция данных выполнена успешно")
-        except Exception as e:
-            logger.warning(f"Ошибка при миграции: {e}")
+        except Exception:
+            await db.rollback()
+            raise
+
+        drift = []
+        for key in sorted(set(stored) | set(actual)):
+            stored_count = stored.get(key, 0)
+            actual_count = actual.get(key, 0)
+            if stored_count != actual_count:
+                drift.append({
+                    "order_type": key[0],
+                    "status_code": key[1],
+                    "stored": stored_count,
+                    "actual": actual_count,
+                })
+        return drift
+
+    async def rebuild_status_counters(self) -> List[Dict[str, Any]]:
+        """Пересчитать счетчики заказов и вернуть расхождения с сохраненными значениями"""
+        async with self._connect() as db:
+            drift = await self._rebuild_status_counters(db)
+            if drift:
+                logger.warning(f"Счетчики заказов расходились с данными: {drift}")
+            return drift
+
+    async def _read_status_counters(self, db, order_type: Optional[str] = None) -> Dict[str, int]:
+        """Количество заказов по кодам статусов из таблицы счетчиков"""
+        join_filter = ""
+        params: Tuple[Any, ...] = ()
+        if order_type:
+            join_filter = " AND c.order_type = ?"
+            params = (order_type,)
+        cursor = await db.execute(
+            f"""
+            SELECT s.code, COALESCE(SUM(c.count), 0)
+            FROM statuses s
+            LEFT JOIN order_status_counters c ON c.status_id = s.id{join_filter}
+            GROUP BY s.code
+            """,
+            params
+        )
+        return {row[0]: row[1] for row in await cursor.fetchall()}
+
+    @staticmethod
+    def _active_statistics(counts: Dict[str, int]) -> Dict[str, int]:
+        """Статистика без архива и отклоненных с итогом в ключе 'all'"""
+        stats = {code: count for code, count in counts.items() if code not in _CLOSED_STATUS_CODES}
+        stats['all'] = sum(stats.values())
+        return stats
 
     async def _init_default_materials(self, db):
         """Инициализация начальных материалов (комбинации цвет+тип)"""
@@ -321,7 +164,11 @@ class Database:
 
     async def get_or_create_user(self, user_id: int, first_name: str, last_name: str, username: Optional[str] = None) -> Dict[str, Any]:
         """Получить или создать пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
+        cached = self._users_cache.get(user_id)
+        if cached is not None and not (username and username != cached.get('username')):
+            return dict(cached)
+
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(
                 "SELECT * FROM users WHERE user_id = ?",
@@ -339,6 +186,7 @@ class Database:
                         (username, user_id)
                     )
                     await db.commit()
+                    self.invalidate_user(user_id)
                     logger.info(f"Обновлен username для пользователя {user_id}: {username}")
                     # Получаем обновленного пользователя
                     cursor = await db.execute(
@@ -347,7 +195,8 @@ class Database:
                     )
                     user = await cursor.fetchone()
                     user_dict = dict(user)
-                return user_dict
+                self._users_cache.set(user_id, user_dict)
+                return dict(user_dict)
 
             await db.execute(
                 "INSERT INTO users (user_id, first_name, last_name, username) VALUES (?, ?, ?, ?)",
@@ -361,31 +210,47 @@ class Database:
                 (user_id,)
             )
             user = await cursor.fetchone()
-            return dict(user)
+            user_dict = dict(user)
+            self._users_cache.set(user_id, user_dict)
+            return dict(user_dict)
 
     async def is_user_registered(self, user_id: int) -> bool:
         """Проверить, зарегистрирован ли пользователь"""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "SELECT 1 FROM users WHERE user_id = ?",
-                (user_id,)
-            )
-            return await cursor.fetchone() is not None
+        return await self.get_user(user_id) is not None
 
     async def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Получить пользователя по ID"""
-        async with aiosqlite.connect(self.db_path) as db:
+        cached = self._users_cache.get(user_id)
+        if cached is not None:
+            return dict(cached)
+
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(
                 "SELECT * FROM users WHERE user_id = ?",
                 (user_id,)
             )
             user = await cursor.fetchone()
-            return dict(user) if user else None
+            if not user:
+                return None
+            user_dict = dict(user)
+            self._users_cache.set(user_id, user_dict)
+            return dict(user_dict)
+
+    def invalidate_user(self, user_id: Optional[int] = None) -> None:
+        """Сбросить профиль пользователя в кеше (или весь кеш при user_id=None)"""
+        if user_id is None:
+            self._users_cache.clear()
+        else:
+            self._users_cache.pop(user_id)
+
+    def get_user_cache_stats(self) -> Dict[str, Any]:
+        """Статистика кеша профилей пользователей"""
+        return self._users_cache.stats()
 
     async def get_all_user_ids(self) -> List[int]:
         """Получить список всех ID пользователей бота"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             cursor = await db.execute("SELECT user_id FROM users")
             rows = await cursor.fetchall()
             return [int(row[0]) for row in rows if row and row[0] is not None]
@@ -401,10 +266,11 @@ class Database:
         original_filename: str = "",
         comment: Optional[str] = None,
         order_type: str = '3d_print',
-        quantity: int = 1
+        quantity: int = 1,
+        model_hash: Optional[str] = None
     ) -> int:
         """Создать новый заказ"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             # Получаем ID статуса "В ожидании"
             cursor = await db.execute(
                 "SELECT id FROM statuses WHERE code = 'pending'"
@@ -414,61 +280,58 @@ class Database:
 
             cursor = await db.execute("""
                 INSERT INTO orders 
-                (user_id, status_id, material_id, part_name, photo_path, model_path, photo_caption, original_filename, comment, order_type, quantity)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (user_id, status_id, material_id, part_name, photo_path, model_path, photo_caption, original_filename, comment, order_type, quantity))
+                (user_id, status_id, material_id, part_name, photo_path, model_path, photo_caption, original_filename, comment, order_type, quantity, model_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (user_id, status_id, material_id, part_name, photo_path, model_path, photo_caption, original_filename, comment, order_type, quantity, model_hash))
 
             await db.commit()
             order_id = cursor.lastrowid
             logger.info(f"Создан заказ №{order_id} для пользователя {user_id}")
             return order_id
 
-    async def get_order(self, order_id: int) -> Optional[Dict[str, Any]]:
+    async def get_order(self, order_id: int) -> Optional[OrderRecord]:
         """Получить заказ по ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._connect() as db:
+            db.row_factory = OrderRecord.row_factory
             cursor = await db.execute("""
                 SELECT o.*, 
                        u.first_name, u.last_name, u.user_id, u.username,
                        s.code as status_code, s.name as status_name,
-                       m.name as material_name
+                       m.name as material_name,
+                       mm.data as model_metadata
                 FROM orders o
                 JOIN users u ON o.user_id = u.user_id
                 JOIN statuses s ON o.status_id = s.id
                 LEFT JOIN materials m ON o.material_id = m.id
+                LEFT JOIN model_metadata mm ON mm.file_hash = o.model_hash
                 WHERE o.id = ?
             """, (order_id,))
             order = await cursor.fetchone()
-            return self._order_row_to_dict(order)
+            if order and order.model_metadata:
+                order.model_metadata = json.loads(order.model_metadata)
+            return order
 
-    async def get_user_orders(self, user_id: int) -> List[Dict[str, Any]]:
+    async def get_user_orders(self, user_id: int) -> List[OrderListItem]:
         """Получить все заказы пользователя (без архивных)"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute("""
-                SELECT o.*, 
-                       s.code as status_code, s.name as status_name,
-                       m.name as material_name
+        async with self._connect() as db:
+            db.row_factory = OrderListItem.row_factory
+            cursor = await db.execute(f"""
+                SELECT {_ORDER_LIST_COLUMNS}
                 FROM orders o
                 JOIN statuses s ON o.status_id = s.id
-                LEFT JOIN materials m ON o.material_id = m.id
                 WHERE o.user_id = ? AND s.code != 'archived'
                 ORDER BY o.created_at DESC
             """, (user_id,))
-            rows = await cursor.fetchall()
-            return self._order_rows_to_list(rows)
+            return await cursor.fetchall()
 
-    async def get_user_archived_orders(self, user_id: int, limit: int = None, offset: int = 0) -> List[Dict[str, Any]]:
+    async def get_user_archived_orders(self, user_id: int, limit: int = None, offset: int = 0) -> List[OrderListItem]:
         """Получить архивированные заказы пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            query = """
-                SELECT o.*, 
-                       s.code as status_code, s.name as status_name,
-                       m.name as material_name
+        async with self._connect() as db:
+            db.row_factory = OrderListItem.row_factory
+            query = f"""
+                SELECT {_ORDER_LIST_COLUMNS}
                 FROM orders o
                 JOIN statuses s ON o.status_id = s.id
-                LEFT JOIN materials m ON o.material_id = m.id
                 WHERE o.user_id = ? AND s.code = 'archived'
                 ORDER BY o.created_at DESC
             """
@@ -476,12 +339,11 @@ class Database:
                 query += f" LIMIT {limit} OFFSET {offset}"
             
             cursor = await db.execute(query, (user_id,))
-            rows = await cursor.fetchall()
-            return self._order_rows_to_list(rows)
+            return await cursor.fetchall()
 
     async def count_user_archived_orders(self, user_id: int) -> int:
         """Получить количество архивированных заказов пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             cursor = await db.execute("""
                 SELECT COUNT(*) FROM orders o
                 JOIN statuses s ON o.status_id = s.id
@@ -492,39 +354,206 @@ class Database:
 
     async def get_orders_statistics(self, order_type: Optional[str] = None) -> Dict[str, int]:
         """Получить статистику по заказам по статусам (без архива и rejected)"""
-        async with aiosqlite.connect(self.db_path) as db:
-            params: Tuple[Any, ...] = ()
-            join_filter = ""
-            if order_type:
-                join_filter = " AND o.order_type = ?"
-                params = (order_type,)
+        async with self._connect() as db:
+            counts = await self._read_status_counters(db, order_type)
+            return self._active_statistics(counts)
 
-            cursor = await db.execute(
-                f"""
-                SELECT s.code, COUNT(o.id) as count
+    async def get_orders_overview(self) -> Dict[str, Dict[str, int]]:
+        """Счетчики заказов всех типов одним запросом
+
+        Возвращает {order_type: {status_code: count, 'all': активные}};
+        в словаре есть и 'archived', и 'rejected'.
+        """
+        async with self._connect() as db:
+            cursor = await db.execute("""
+                SELECT s.code, c.order_type, c.count
                 FROM statuses s
-                LEFT JOIN orders o ON s.id = o.status_id
-                    {join_filter}
-                WHERE s.code != 'archived' AND s.code != 'rejected'
-                GROUP BY s.code
-                """,
-                params
-            )
+                LEFT JOIN order_status_counters c ON c.status_id = s.id
+            """)
             rows = await cursor.fetchall()
-            stats = {}
-            total = 0
-            for row in rows:
-                code = row[0]
-                count = row[1] if row[1] else 0
-                stats[code] = count
-                total += count
-            stats['all'] = total
-            return stats
-
-    async def get_orders_by_status(self, status_code: Optional[str] = None, order_type: Optional[str] = None, limit: int = None, offset: int = 0) -> List[Dict[str, Any]]:
+
+        codes = {row[0] for row in rows}
+        overview: Dict[str, Dict[str, int]] = {
+            order_type: dict.fromkeys(codes, 0) for order_type in config.ORDER_TYPES
+        }
+        for code, order_type, count in rows:
+            if order_type is not None:
+                overview.setdefault(order_type, dict.fromkeys(codes, 0))[code] = count
+        for counts in overview.values():
+            counts['all'] = sum(count for code, count in counts.items() if code not in _CLOSED_STATUS_CODES)
+        return overview
+
+    async def _iter_rows(self, query: str, params: Sequence[Any], chunk_size: int) -> AsyncIterator[List[Tuple[Any, ...]]]:
+        """Строки запроса пачками по chunk_size: курсор читается по мере обработки пачек"""
+        async with self._connect() as db:
+            cursor = await db.execute(query, params)
+            while True:
+                rows = await cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+
+    async def get_status_ids(self) -> Dict[str, int]:
+        """Идентификаторы статусов по кодам"""
+        async with self._connect() as db:
+            cursor = await db.execute("SELECT code, id FROM statuses")
+            return dict(await cursor.fetchall())
+
+    async def iter_order_events(
+        self,
+        since: int = 0,
+        order_type: Optional[str] = None,
+        chunk_size: int = 10_000
+    ) -> AsyncIterator[List[Tuple[int, int, int, int, int]]]:
+        """События смены статусов не раньше since пачками строк (order_id, status_id, material_id, created_at, created)
+
+        Строки упорядочены по заказу и времени; material_id заказа без материала — 0.
+        created — 1 для создания заказа (первого события заказа в журнале): возврат
+        заказа в статус pending создания не означает.
+        """
+        query = """
+            SELECT e.order_id, e.status_id, COALESCE(e.material_id, 0), e.created_at,
+                   e.id = (SELECT MIN(p.id) FROM order_events p WHERE p.order_id = e.order_id)
+            FROM order_events e
+            WHERE e.created_at >= ?
+        """
+        params: List[Any] = [since]
+        if order_type:
+            query += " AND e.order_type = ?"
+            params.append(order_type)
+        # "+" — период выбирается по idx_order_events_time, а не просмотром всего журнала по заказам
+        query += " ORDER BY +e.order_id, e.created_at, e.id"
+        async for rows in self._iter_rows(query, params, chunk_size):
+            yield rows
+
+    async def get_last_order_event_id(self) -> int:
+        """Номер последнего события журнала смены статусов (0, если журнал пуст)"""
+        async with self._connect() as db:
+            cursor = await db.execute("SELECT COALESCE(MAX(id), 0) FROM order_events")
+            row = await cursor.fetchone()
+            return row[0]
+
+    async def iter_order_event_log(
+        self,
+        after_id: int = 0,
+        chunk_size: int = 10_000
+    ) -> AsyncIterator[List[Tuple[int, int, int, int, int, str]]]:
+        """События журнала с номером больше after_id в порядке записи
+
+        Пачки строк (id, order_id, status_id, material_id, created_at, order_type);
+        material_id заказа без материала — 0.
+        """
+        query = """
+            SELECT id, order_id, status_id, COALESCE(material_id, 0), created_at, order_type
+            FROM order_events
+            WHERE id > ?
+            ORDER BY id
+        """
+        async for rows in self._iter_rows(query, (after_id,), chunk_size):
+            yield rows
+
+    @staticmethod
+    def _export_conditions(
+        alias: str,
+        created_from: Optional[int],
+        created_to: Optional[int],
+        order_type: Optional[str],
+        material_id: Optional[int]
+    ) -> Tuple[List[str], List[Any]]:
+        """Условия WHERE выгрузки по времени, типу и материалу для таблицы alias"""
+        conditions = []
+        params: List[Any] = []
+        if created_from is not None:
+            conditions.append(f"{alias}.created_at >= ?")
+            params.append(created_from)
+        if created_to is not None:
+            conditions.append(f"{alias}.created_at < ?")
+            params.append(created_to)
+        if order_type:
+            conditions.append(f"{alias}.order_type = ?")
+            params.append(order_type)
+        if material_id is not None:
+            conditions.append(f"{alias}.material_id = ?")
+            params.append(material_id)
+        return conditions, params
+
+    async def iter_orders_for_export(
+        self,
+        created_from: Optional[int] = None,
+        created_to: Optional[int] = None,
+        order_type: Optional[str] = None,
+        status_code: Optional[str] = None,
+        material_id: Optional[int] = None,
+        local_time_text: bool = True,
+        chunk_size: int = 5_000
+    ) -> AsyncIterator[List[Tuple[Any, ...]]]:
+        """Заказы для выгрузки пачками строк (столбцы _EXPORT_COLUMNS) по возрастанию номера
+
+        Строки читаются курсором по мере выгрузки, вся выборка в памяти не собирается.
+        created_from и created_to — границы created_at в секундах Unix (конец не включается).
+        created_at в строках — местное время текстом или, при local_time_text=False, секунды Unix.
+        """
+        conditions, params = self._export_conditions("o", created_from, created_to, order_type, material_id)
+        if status_code:
+            conditions.append("s.code = ?")
+            params.append(status_code)
+        columns = _EXPORT_COLUMNS.format(created_at=_EXPORT_LOCAL_TIME if local_time_text else "o.created_at")
+        query = f"""
+            SELECT {columns}
+            FROM orders o
+            JOIN statuses s ON o.status_id = s.id
+            LEFT JOIN users u ON o.user_id = u.user_id
+            LEFT JOIN materials m ON o.material_id = m.id
+        """
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY o.id"
+        async for rows in self._iter_rows(query, params, chunk_size):
+            yield rows
+
+    async def iter_order_events_for_export(
+        self,
+        created_from: Optional[int] = None,
+        created_to: Optional[int] = None,
+        order_type: Optional[str] = None,
+        material_id: Optional[int] = None,
+        chunk_size: int = 5_000
+    ) -> AsyncIterator[List[Tuple[Any, ...]]]:
+        """События смены статусов для выгрузки по возрастанию номера
+
+        Пачки строк (id, order_id, status, order_type, material_id, material, created_at);
+        created_at — секунды Unix, границы created_from и created_to — как у заказов.
+        """
+        conditions, params = self._export_conditions("e", created_from, created_to, order_type, material_id)
+        query = """
+            SELECT e.id, e.order_id, s.code, e.order_type, e.material_id, m.name, e.created_at
+            FROM order_events e
+            JOIN statuses s ON e.status_id = s.id
+            LEFT JOIN materials m ON e.material_id = m.id
+        """
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY e.id"
+        async for rows in self._iter_rows(query, params, chunk_size):
+            yield rows
+
+    async def iter_users_for_export(self, chunk_size: int = 5_000) -> AsyncIterator[List[Tuple[Any, ...]]]:
+        """Пользователи для выгрузки пачками строк
+
+        Столбцы (user_id, first_name, last_name, username, registered_at); registered_at — секунды Unix.
+        """
+        query = """
+            SELECT user_id, first_name, last_name, username, CAST(strftime('%s', registered_at) AS INTEGER)
+            FROM users
+            ORDER BY user_id
+        """
+        async for rows in self._iter_rows(query, (), chunk_size):
+            yield rows
+
+    async def get_orders_by_status(self, status_code: Optional[str] = None, order_type: Optional[str] = None, limit: int = None, offset: int = 0) -> List[OrderListItem]:
         """Получить заказы по статусу (или все, если status_code=None, без архива)"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._connect() as db:
+            db.row_factory = OrderListItem.row_factory
             if status_code:
                 # Для статусов "pending" и "in_progress" сортируем в хронологическом порядке (старые сверху)
                 # Для остальных - по убыванию (новые сначала)
@@ -534,14 +563,9 @@ class Database:
                     order_by = "ORDER BY o.created_at DESC"
 
                 query = f"""
-                    SELECT o.*, 
-                           u.first_name, u.last_name, u.user_id, u.username,
-                           s.code as status_code, s.name as status_name,
-                           m.name as material_name
+                    SELECT {_ORDER_LIST_COLUMNS}
                     FROM orders o
-                    JOIN users u ON o.user_id = u.user_id
                     JOIN statuses s ON o.status_id = s.id
-                    LEFT JOIN materials m ON o.material_id = m.id
                     WHERE s.code = ?
                 """
                 params_list: List[Any] = [status_code]
@@ -551,15 +575,10 @@ class Database:
                 query += f"\n                    {order_by}"
                 params = tuple(params_list)
             else:
-                query = """
-                    SELECT o.*, 
-                           u.first_name, u.last_name, u.user_id, u.username,
-                           s.code as status_code, s.name as status_name,
-                           m.name as material_name
+                query = f"""
+                    SELECT {_ORDER_LIST_COLUMNS}
                     FROM orders o
-                    JOIN users u ON o.user_id = u.user_id
                     JOIN statuses s ON o.status_id = s.id
-                    LEFT JOIN materials m ON o.material_id = m.id
                     WHERE s.code != 'archived' AND s.code != 'rejected'
                     ORDER BY o.created_at DESC
                 """
@@ -573,36 +592,15 @@ class Database:
                 query += f" LIMIT {limit} OFFSET {offset}"
             
             cursor = await db.execute(query, params)
-            rows = await cursor.fetchall()
-            return self._order_rows_to_list(rows)
+            return await cursor.fetchall()
     
     async def count_orders_by_status(self, status_code: Optional[str] = None, order_type: Optional[str] = None) -> int:
         """Получить количество заказов по статусу"""
-        async with aiosqlite.connect(self.db_path) as db:
-            if status_code:
-                query = """
-                    SELECT COUNT(*) FROM orders o
-                    JOIN statuses s ON o.status_id = s.id
-                    WHERE s.code = ?
-                """
-                params: Tuple[Any, ...] = (status_code,)
-                if order_type:
-                    query += " AND o.order_type = ?"
-                    params += (order_type,)
-                cursor = await db.execute(query, params)
-            else:
-                query = """
-                    SELECT COUNT(*) FROM orders o
-                    JOIN statuses s ON o.status_id = s.id
-                    WHERE s.code != 'archived' AND s.code != 'rejected'
-                """
-                params = ()
-                if order_type:
-                    query += " AND o.order_type = ?"
-                    params = (order_type,)
-                cursor = await db.execute(query, params)
-            result = await cursor.fetchone()
-            return result[0] if result else 0
+        async with self._connect() as db:
+            counts = await self._read_status_counters(db, order_type)
+        if status_code:
+            return counts.get(status_code, 0)
+        return self._active_statistics(counts)['all']
 
     async def get_orders_by_material(
         self,
@@ -611,20 +609,15 @@ class Database:
         order_type: Optional[str] = None,
         limit: int | None = None,
         offset: int = 0
-    ) -> List[Dict[str, Any]]:
+    ) -> List[OrderListItem]:
         """Получить заказы по материалу с опциональным фильтром по статусам"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._connect() as db:
+            db.row_factory = OrderListItem.row_factory
 
-            base_query = """
-                SELECT o.*,
-                       u.first_name, u.last_name, u.user_id, u.username,
-                       s.code as status_code, s.name as status_name,
-                       m.name as material_name
+            base_query = f"""
+                SELECT {_ORDER_LIST_COLUMNS}
                 FROM orders o
-                JOIN users u ON o.user_id = u.user_id
                 JOIN statuses s ON o.status_id = s.id
-                LEFT JOIN materials m ON o.material_id = m.id
                 WHERE o.material_id = ?
             """
 
@@ -650,8 +643,7 @@ class Database:
                 base_query += f" LIMIT {int(limit)} OFFSET {int(offset)}"
 
             cursor = await db.execute(base_query, tuple(params))
-            rows = await cursor.fetchall()
-            return self._order_rows_to_list(rows)
+            return await cursor.fetchall()
 
     async def count_orders_by_material(
         self,
@@ -660,7 +652,7 @@ class Database:
         order_type: Optional[str] = None
     ) -> int:
         """Получить количество заказов по материалу"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             base_query = """
                 SELECT COUNT(*) 
                 FROM orders o
@@ -686,7 +678,7 @@ class Database:
 
     async def update_order_status(self, order_id: int, status_code: str, rejection_reason: Optional[str] = None) -> bool:
         """Обновить статус заказа"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             # Получаем ID статуса
             cursor = await db.execute(
                 "SELECT id FROM statuses WHERE code = ?",
@@ -722,7 +714,14 @@ class Database:
 
     async def get_all_materials(self, material_type: Optional[str] = None, only_available: bool = True) -> List[Dict[str, Any]]:
         """Получить материалы (с optional фильтром по типу)"""
-        async with aiosqlite.connect(self.db_path) as db:
+        materials = await self._materials_cache.get_or_load(
+            ("list", material_type, only_available),
+            lambda: self._load_materials(material_type, only_available)
+        )
+        return [dict(material) for material in materials]
+
+    async def _load_materials(self, material_type: Optional[str], only_available: bool) -> List[Dict[str, Any]]:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             query = "SELECT * FROM materials"
             conditions = []
@@ -737,11 +736,11 @@ class Database:
             query += " ORDER BY name"
             cursor = await db.execute(query, params)
             rows = await cursor.fetchall()
-            return self._order_rows_to_list(rows)
+            return [dict(row) for row in rows]
 
     async def get_materials_with_usage_count(self, material_type: Optional[str] = None, include_unavailable: bool = True) -> List[Dict[str, Any]]:
         """Получить материалы с количеством использований в заказах"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             query = """
                 SELECT m.id, m.name, m.type, m.is_available, COUNT(o.id) as usage_count
@@ -760,7 +759,7 @@ class Database:
             query += " GROUP BY m.id, m.name, m.type, m.is_available ORDER BY m.name"
             cursor = await db.execute(query, params)
             rows = await cursor.fetchall()
-            return self._order_rows_to_list(rows)
+            return [dict(row) for row in rows]
 
     async def get_materials_with_orders(
         self,
@@ -771,7 +770,7 @@ class Database:
         if not statuses:
             return []
 
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             placeholders = ",".join("?" for _ in statuses)
             query = f"""
@@ -787,17 +786,18 @@ class Database:
             params: Tuple[Any, ...] = (order_type, *statuses)
             cursor = await db.execute(query, params)
             rows = await cursor.fetchall()
-            return self._order_rows_to_list(rows)
+            return [dict(row) for row in rows]
 
     async def add_material(self, name: str, material_type: str = '3d_print') -> bool:
         """Добавить новый материал"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             try:
                 await db.execute(
                     "INSERT INTO materials (name, type, is_available) VALUES (?, ?, 1)",
                     (name.strip(), material_type)
                 )
                 await db.commit()
+                self._materials_cache.invalidate()
                 logger.info(f"Добавлен материал: {name} (тип: {material_type})")
                 return True
             except aiosqlite.IntegrityError:
@@ -805,37 +805,43 @@ class Database:
 
     async def delete_material(self, material_id: int) -> bool:
         """Сделать материал недоступным (soft delete)"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             cursor = await db.execute(
                 "UPDATE materials SET is_available = 0 WHERE id = ?",
                 (material_id,)
             )
             await db.commit()
+            self._materials_cache.invalidate()
             return cursor.rowcount > 0
 
     async def restore_material(self, material_id: int) -> bool:
         """Сделать материал вновь доступным"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             cursor = await db.execute(
                 "UPDATE materials SET is_available = 1 WHERE id = ?",
                 (material_id,)
             )
             await db.commit()
+            self._materials_cache.invalidate()
             return cursor.rowcount > 0
 
     async def get_setting(self, key: str, default: Optional[str] = None) -> Optional[str]:
         """Получить значение настройки"""
-        async with aiosqlite.connect(self.db_path) as db:
+        value = await self._settings_cache.get_or_load(key, lambda: self._load_setting(key))
+        return default if value is None else value
+
+    async def _load_setting(self, key: str) -> Optional[str]:
+        async with self._connect() as db:
             cursor = await db.execute(
                 "SELECT value FROM settings WHERE key = ?",
                 (key,)
             )
             row = await cursor.fetchone()
-            return row[0] if row else default
+            return row[0] if row else None
 
     async def set_setting(self, key: str, value: str) -> None:
         """Сохранить значение настройки"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             await db.execute(
                 """
                 INSERT INTO settings (key, value)
@@ -845,6 +851,7 @@ class Database:
                 (key, value)
             )
             await db.commit()
+        self._settings_cache.invalidate(key)
 
     async def is_orders_enabled(self) -> bool:
         """Проверить, открыт ли приём заказов"""
@@ -857,7 +864,14 @@ class Database:
 
     async def get_material(self, material_id: int) -> Optional[Dict[str, Any]]:
         """Получить материал по ID"""
-        async with aiosqlite.connect(self.db_path) as db:
+        material = await self._materials_cache.get_or_load(
+            ("id", material_id),
+            lambda: self._load_material(material_id)
+        )
+        return dict(material) if material else None
+
+    async def _load_material(self, material_id: int) -> Optional[Dict[str, Any]]:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(
                 "SELECT * FROM materials WHERE id = ?",
@@ -868,7 +882,7 @@ class Database:
 
     async def get_material_id_by_name(self, name: str, material_type: Optional[str] = None) -> Optional[int]:
         """Получить ID материала по имени"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             query = "SELECT id FROM materials WHERE name = ?"
             params: Tuple[Any, ...] = (name,)
             if material_type:
@@ -878,11 +892,12 @@ class Database:
             row = await cursor.fetchone()
             return row[0] if row else None
 
-    async def get_ready_orders_for_reminder(self, hours: int = 4) -> List[Dict[str, Any]]:
+    async def get_ready_orders_for_reminder(self, hours: int = 4) -> List[OrderRecord]:
         """Получить заказы со статусом 'Готов', которым нужно отправить напоминание"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            # Получаем заказы со статусом "ready", которым не отправляли напоминание или последнее напоминание было более hours часов назад
+        async with self._connect() as db:
+            db.row_factory = OrderRecord.row_factory
+            # Заказы со статусом "ready", которым не отправляли напоминание (last_reminder_time = 0)
+            # или последнее напоминание было более hours часов назад
             cursor = await db.execute("""
                 SELECT o.*, 
                        u.first_name, u.last_name, u.user_id, u.username,
@@ -893,25 +908,23 @@ class Database:
                 JOIN statuses s ON o.status_id = s.id
                 LEFT JOIN materials m ON o.material_id = m.id
                 WHERE s.code = 'ready'
-                AND (o.last_reminder_time IS NULL 
-                     OR datetime(o.last_reminder_time, '+' || ? || ' hours') <= datetime('now'))
+                AND o.last_reminder_time <= ?
                 ORDER BY o.created_at DESC
-            """, (hours,))
-            rows = await cursor.fetchall()
-            return self._order_rows_to_list(rows)
+            """, (int(time.time()) - hours * 3600,))
+            return await cursor.fetchall()
 
     async def update_last_reminder_time(self, order_id: int):
         """Обновить время последнего напоминания для заказа"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             await db.execute(
-                "UPDATE orders SET last_reminder_time = datetime('now') WHERE id = ?",
-                (order_id,)
+                "UPDATE orders SET last_reminder_time = ? WHERE id = ?",
+                (int(time.time()), order_id)
             )
             await db.commit()
 
     async def archive_order(self, order_id: int, rejection_reason: Optional[str] = None) -> bool:
         """Переместить заказ в архив"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             # Получаем ID статуса "archived"
             cursor = await db.execute(
                 "SELECT id FROM statuses WHERE code = 'archived'"
@@ -992,19 +1005,14 @@ class Database:
             await db.commit()
             logger.info(f"Архив очищен: удалено {len(orders_to_delete)} старых заказов")
 
-    async def get_archived_orders(self, order_type: Optional[str] = None, limit: int = None, offset: int = 0) -> List[Dict[str, Any]]:
+    async def get_archived_orders(self, order_type: Optional[str] = None, limit: int = None, offset: int = 0) -> List[OrderListItem]:
         """Получить архивированные заказы"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            query = """
-                SELECT o.*, 
-                       u.first_name, u.last_name, u.user_id, u.username,
-                       s.code as status_code, s.name as status_name,
-                       m.name as material_name
+        async with self._connect() as db:
+            db.row_factory = OrderListItem.row_factory
+            query = f"""
+                SELECT {_ORDER_LIST_COLUMNS}
                 FROM orders o
-                JOIN users u ON o.user_id = u.user_id
                 JOIN statuses s ON o.status_id = s.id
-                LEFT JOIN materials m ON o.material_id = m.id
                 WHERE s.code = 'archived'
                 ORDER BY o.created_at DESC
             """
@@ -1017,28 +1025,68 @@ class Database:
                 params = (order_type,)
 
             cursor = await db.execute(query, params)
-            rows = await cursor.fetchall()
-            return self._order_rows_to_list(rows)
+            return await cursor.fetchall()
 
     async def count_archived_orders(self, order_type: Optional[str] = None) -> int:
         """Получить количество архивированных заказов"""
-        async with aiosqlite.connect(self.db_path) as db:
-            query = """
-                SELECT COUNT(*) FROM orders o
+        async with self._connect() as db:
+            counts = await self._read_status_counters(db, order_type)
+        return counts.get('archived', 0)
+
+    @staticmethod
+    def _search_match_expression(query: str) -> Optional[str]:
+        """Преобразовать строку поиска в запрос FTS5: все слова как префиксы"""
+        tokens = re.findall(r"\w+", query.lower())[:_SEARCH_MAX_TOKENS]
+        if not tokens:
+            return None
+        return " ".join(f'"{token}"*' for token in tokens)
+
+    async def is_search_available(self) -> bool:
+        """Есть ли полнотекстовый индекс orders_fts (в сборке SQLite без fts5 его нет)"""
+        if self._search_available is None:
+            async with self._connect() as db:
+                cursor = await db.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'orders_fts'"
+                )
+                self._search_available = await cursor.fetchone() is not None
+        return self._search_available
+
+    async def search_orders(self, query: str, limit: int = None, offset: int = 0) -> List[OrderListItem]:
+        """Полнотекстовый поиск заказов (включая архив), самые релевантные сначала"""
+        match = self._search_match_expression(query)
+        if not match or not await self.is_search_available():
+            return []
+        async with self._connect() as db:
+            db.row_factory = OrderListItem.row_factory
+            sql = f"""
+                SELECT {_ORDER_LIST_COLUMNS}
+                FROM orders_fts f
+                JOIN orders o ON o.id = f.rowid
                 JOIN statuses s ON o.status_id = s.id
-                WHERE s.code = 'archived'
+                WHERE orders_fts MATCH ?
+                ORDER BY bm25(orders_fts, {_SEARCH_COLUMN_WEIGHTS}), o.id DESC
             """
-            params: Tuple[Any, ...] = ()
-            if order_type:
-                query += " AND o.order_type = ?"
-                params = (order_type,)
-            cursor = await db.execute(query, params)
+            if limit:
+                sql += f" LIMIT {limit} OFFSET {offset}"
+            cursor = await db.execute(sql, (match,))
+            return await cursor.fetchall()
+
+    async def count_search_orders(self, query: str) -> int:
+        """Количество заказов, найденных полнотекстовым поиском"""
+        match = self._search_match_expression(query)
+        if not match or not await self.is_search_available():
+            return 0
+        async with self._connect() as db:
+            cursor = await db.execute(
+                "SELECT COUNT(*) FROM orders_fts WHERE orders_fts MATCH ?",
+                (match,)
+            )
             result = await cursor.fetchone()
             return result[0] if result else 0
 
     async def delete_order(self, order_id: int) -> bool:
         """Удалить заказ из БД (полное удаление)"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             # Получаем информацию о заказе для удаления файлов
             cursor = await db.execute(
                 "SELECT photo_path, model_path FROM orders WHERE id = ?",
@@ -1078,7 +1126,7 @@ class Database:
 
     async def get_rejection_templates(self, order_type: str) -> List[Dict[str, Any]]:
         """Получить шаблонные комментарии для отклонения заказов по типу"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(
                 "SELECT * FROM rejection_templates WHERE order_type = ? ORDER BY id",
@@ -1089,7 +1137,7 @@ class Database:
 
     async def add_rejection_template(self, order_type: str, text: str) -> bool:
         """Добавить шаблонный комментарий для отклонения заказов"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             try:
                 await db.execute(
                     "INSERT INTO rejection_templates (order_type, text) VALUES (?, ?)",
@@ -1104,7 +1152,7 @@ class Database:
 
     async def delete_rejection_template(self, template_id: int) -> bool:
         """Удалить шаблонный комментарий для отклонения заказов"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             cursor = await db.execute(
                 "DELETE FROM rejection_templates WHERE id = ?",
                 (template_id,)
@@ -1114,7 +1162,7 @@ class Database:
 
     async def get_rejection_template(self, template_id: int) -> Optional[Dict[str, Any]]:
         """Получить шаблонный комментарий по ID"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(
                 "SELECT * FROM rejection_templates WHERE id = ?",
@@ -1123,7 +1171,25 @@ class Database:
             row = await cursor.fetchone()
             return dict(row) if row else None
 
+    async def get_model_metadata(self, file_hash: str) -> Optional[Dict[str, Any]]:
+        """Получить сохраненные метаданные файла модели по хешу содержимого"""
+        async with self._connect() as db:
+            cursor = await db.execute(
+                "SELECT data FROM model_metadata WHERE file_hash = ?",
+                (file_hash,)
+            )
+            row = await cursor.fetchone()
+            return json.loads(row[0]) if row else None
+
+    async def save_model_metadata(self, file_hash: str, data: Dict[str, Any]) -> None:
+        """Сохранить метаданные файла модели (перезаписывает существующие)"""
+        async with self._connect() as db:
+            await db.execute(
+                "INSERT OR REPLACE INTO model_metadata (file_hash, data) VALUES (?, ?)",
+                (file_hash, json.dumps(data, ensure_ascii=False))
+            )
+            await db.commit()
+
 
 # Глобальный экземпляр базы данных
 db = Database()
-
@@ -3,55 +3,75 @@
 """
 import asyncio
 import html
+import tempfile
 
 from aiogram import Router, F, Bot
 from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
 from aiogram.types import Message, CallbackQuery, FSInputFile, InlineKeyboardMarkup
 from aiogram.fsm.context import FSMContext
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from pathlib import Path
 from loguru import logger
 
+import analytics
 import config
 import database
+import export
 import keyboards
+import metrics
+import slow_queries
 import states
-from utils import notify_user_order_status_changed
+import time_buckets
+from callback_data import (
+    AdminBackToOrdersCallback,
+    AdminOrderCallback,
+    AdminOrdersCallback,
+    AdminOrdersPageCallback,
+    SetStatusCallback,
+)
+from middlewares import AdminOnlyMiddleware
+from records import OrderRecord
+from utils import notify_user_order_status_changed, format_step_metadata
 
 
 router = Router()
+# Доступ к обработчикам роутера только для администраторов
+router.message.middleware(AdminOnlyMiddleware())
+router.callback_query.middleware(AdminOnlyMiddleware())
 
+# Ответ не-администратору для обработчиков рассылки (флаг admin_denied)
+BROADCAST_DENIED_TEXT = "У вас нет доступа к режиму рассылки."
 
-def is_admin(user_id: int) -> bool:
-    """Проверка, является ли пользователь администратором"""
-    return user_id in config.ADMIN_IDS
+# Псевдо-раздел списка заказов для результатов полнотекстового поиска
+SEARCH_LIST_STATUS = "search"
+SEARCH_ORDER_TYPE = "all"
 
 
-def _build_admin_new_order_summary(order: dict) -> str:
+def _build_admin_new_order_summary(order: OrderRecord) -> str:
     """Краткое описание заказа для уведомления"""
-    order_type_code = order.get('order_type', '3d_print')
+    order_type_code = order.order_type
     order_type_name = config.ORDER_TYPES.get(order_type_code, order_type_code)
-    material_name = order.get('material_name') or "Не указан"
-    first_name = (order.get('first_name') or "").strip()
-    last_name = (order.get('last_name') or "").strip()
+    material_name = order.material_name or "Не указан"
+    first_name = (order.first_name or "").strip()
+    last_name = (order.last_name or "").strip()
     full_name = f"{first_name} {last_name}".strip() or "Не указан"
-    username = order.get('username')
+    username = order.username
     if username:
         customer = f"{full_name} (@{username})"
     else:
         customer = full_name
 
-    quantity = order.get('quantity', 1)
+    quantity = order.quantity
     summary = (
-        f"🆕 Заказ №{order['id']}\n\n"
+        f"🆕 Заказ №{order.id}\n\n"
         f"⚙️ Тип: {order_type_name}\n"
-        f"📦 Деталь: {order.get('part_name', '—')}\n"
+        f"📦 Деталь: {order.part_name or '—'}\n"
         f"🔢 Количество: {quantity} шт.\n"
         f"🧪 Материал: {material_name}\n"
-        f"👤 Клиент: {customer} (ID: {order.get('user_id')})\n"
+        f"👤 Клиент: {customer} (ID: {order.user_id})\n"
     )
 
-    comment = order.get('comment')
+    comment = order.comment
     if comment:
         summary += f"💬 Комментарий: {comment}\n"
 
@@ -60,7 +80,7 @@ def _build_admin_new_order_summary(order: dict) -> str:
 
 
 def _build_admin_order_detail_payload(
-    order: dict,
+    order: OrderRecord,
     *,
     order_type: str | None = None,
     list_status: str | None = None,
@@ -69,33 +89,33 @@ def _build_admin_order_detail_payload(
     extra_buttons: list[tuple[str, str]] | None = None
 ) -> tuple[str, InlineKeyboardMarkup, str | None, str]:
     """Подготовить подробное описание заказа и клавиатуру"""
-    status_code = order.get('status_code', 'unknown')
-    status_name = order.get('status_name', 'Неизвестно')
-    material_name = order.get('material_name') or "Не указан"
-    order_type_code = order.get('order_type', order_type or '3d_print')
+    status_code = order.status_code or 'unknown'
+    status_name = order.status_name or 'Неизвестно'
+    material_name = order.material_name or "Не указан"
+    order_type_code = order.order_type
     order_type_name = config.ORDER_TYPES.get(order_type_code, order_type_code)
 
-    full_name = f"{order.get('first_name', '')} {order.get('last_name', '')}".strip()
+    full_name = f"{order.first_name or ''} {order.last_name or ''}".strip()
     full_name_html = html.escape(full_name) if full_name else "—"
-    username_value = order.get('username')
+    username_value = order.username
     if username_value:
         user_line = f"{full_name_html} (@{html.escape(username_value)})"
     else:
         user_line = full_name_html
-    user_info = f"{user_line}\n🆔 Telegram ID: {order['user_id']}"
+    user_info = f"{user_line}\n🆔 Telegram ID: {order.user_id}"
 
-    quantity = order.get('quantity', 1)
+    quantity = order.quantity
     detail_text = (
-        f"📋 Заказ №{order['id']}\n\n"
-        f"📅 Дата создания: {html.escape(order.get('created_at', '—'))}\n"
+        f"📋 Заказ №{order.id}\n\n"
+        f"📅 Дата создания: {html.escape(order.created_at_text or '—')}\n"
         f"👤 Заказчик: {user_info}\n"
         f"⚙️ Тип: {html.escape(order_type_name)}\n"
-        f"📦 Название детали: {html.escape(order.get('part_name', '—'))}\n"
+        f"📦 Название детали: {html.escape(order.part_name or '—')}\n"
         f"📊 Статус: {html.escape(status_name)}\n"
     )
 
-    if order.get('photo_caption'):
-        detail_text += f"📝 Подпись к фото: {html.escape(order['photo_caption'])}\n"
+    if order.photo_caption:
+        detail_text += f"📝 Подпись к фото: {html.escape(order.photo_caption)}\n"
 
     material_display = material_name or "Не указан"
     detail_text += (
@@ -105,18 +125,21 @@ def _build_admin_order_detail_payload(
 
     detail_text += f"\n\n<b>Количество:</b>\n{quantity} шт."
 
-    if order.get('comment'):
-        detail_text += f"\n\n<b>Комментарий:</b>\n{html.escape(order['comment'])}"
+    if order.comment:
+        detail_text += f"\n\n<b>Комментарий:</b>\n{html.escape(order.comment)}"
 
-    if order.get('rejection_reason'):
-        detail_text += f"\n\n❌ Причина отклонения: {html.escape(order['rejection_reason'])}\n"
+    if order.model_metadata:
+        detail_text += f"\n\n<b>Файл STEP:</b>\n{format_step_metadata(order.model_metadata)}"
+
+    if order.rejection_reason:
+        detail_text += f"\n\n❌ Причина отклонения: {html.escape(order.rejection_reason)}\n"
 
     back_order_type = order_type if show_list_back else None
     if show_list_back and back_order_type is None:
         back_order_type = order_type_code
 
     keyboard = keyboards.get_order_detail_keyboard(
-        order['id'],
+        order.id,
         status_code,
         is_admin=True,
         order_type=back_order_type,
@@ -126,17 +149,13 @@ def _build_admin_order_detail_payload(
         extra_buttons=extra_buttons
     )
 
-    photo_path = order.get('photo_path')
+    photo_path = order.photo_path
     return detail_text, keyboard, photo_path, status_name
 
 
 @router.callback_query(F.data.startswith("admin_materials_back:"))
 async def materials_back_to_list(callback: CallbackQuery, state: FSMContext):
     """Вернуться к списку материалов после действий"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-
     material_type = callback.data.split(":")[1]
     await state.update_data(material_management_type=material_type)
 
@@ -169,10 +188,6 @@ async def materials_back_to_list(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data == "admin_back_to_material_types")
 async def back_to_material_types(callback: CallbackQuery, state: FSMContext):
     """Вернуться к выбору типов материалов"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-
     await state.update_data(material_management_type=None)
 
     print_materials = await database.db.get_materials_with_usage_count('3d_print')
@@ -196,10 +211,6 @@ async def back_to_material_types(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("admin_materials_type:"))
 async def show_materials_for_type(callback: CallbackQuery, state: FSMContext):
     """Показать материалы выбранного типа"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-
     material_type = callback.data.split(":")[1]
     await state.update_data(material_management_type=material_type)
 
@@ -234,19 +245,17 @@ async def show_materials_for_type(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data == "admin_back_to_order_types")
 async def back_to_order_types(callback: CallbackQuery, state: FSMContext):
     """Вернуться к выбору типов заказов"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-
     await state.update_data(admin_order_type=None, admin_order_status=None, admin_orders_page=0)
 
     order_stats: dict[str, dict] = {}
     archived_counts: dict[str, int] = {}
     summary_lines = []
 
+    overview = await database.db.get_orders_overview()
     for order_type, title in config.ORDER_TYPES.items():
-        stats = await database.db.get_orders_statistics(order_type)
-        archived = await database.db.count_archived_orders(order_type)
+        counts = overview.get(order_type, {})
+        stats = {code: count for code, count in counts.items() if code not in ("archived", "rejected")}
+        archived = counts.get("archived", 0)
         order_stats[order_type] = stats
         archived_counts[order_type] = archived
 
@@ -270,10 +279,6 @@ async def back_to_order_types(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("admin_back_to_statuses:"))
 async def back_to_statuses(callback: CallbackQuery, state: FSMContext):
     """Вернуться к списку статусов для выбранного типа"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-
     order_type = callback.data.split(":")[1]
     await _render_orders_overview(callback.message, order_type, state)
     await callback.answer()
@@ -293,6 +298,13 @@ async def _render_orders_overview(message: Message, order_type: str, state: FSMC
         f"• Архив: {archived_count} шт\n"
         f"• Всего (без архива): {stats.get('all', 0)} шт"
     )
+    week = await time_buckets.index.count_last_days(7, order_type)
+    average = await time_buckets.index.moving_average(30, order_type)
+    stats_text += (
+        f"\n\nЗа 7 дней: новых {week['created']}, готово {week['completed']}, "
+        f"отклонено {week['rejected']}\n"
+        f"В среднем за 30 дней: {average['created']:.1f} новых и {average['completed']:.1f} готовых в день"
+    )
 
     text = (
         f"📦 Заказы — {order_type_name}\n\n"
@@ -354,10 +366,6 @@ async def _render_orders_materials(message: Message, order_type: str, state: FSM
 @router.callback_query(F.data.startswith("admin_orders_type:"))
 async def show_orders_type(callback: CallbackQuery, state: FSMContext):
     """Показать статистику и разделы для выбранного типа заказов"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-
     order_type = callback.data.split(":")[1]
     await _render_orders_overview(callback.message, order_type, state)
     await callback.answer()
@@ -367,12 +375,6 @@ async def show_orders_type(callback: CallbackQuery, state: FSMContext):
 @router.message(F.text == "Админ-панель")
 async def cmd_admin(message: Message):
     """Обработчик команды админ-панели"""
-    user_id = message.from_user.id
-    
-    if not is_admin(user_id):
-        await message.answer("У вас нет доступа к админ-панели.")
-        return
-    
     orders_enabled = await database.db.is_orders_enabled()
     await message.answer(
         "🔧 Панель администратора\n\n"
@@ -381,13 +383,176 @@ async def cmd_admin(message: Message):
     )
 
 
+@router.message(Command("admin_check_counters"))
+async def cmd_check_counters(message: Message):
+    """Пересчитать счетчики заказов и сообщить о расхождениях"""
+    drift = await database.db.rebuild_status_counters()
+    if not drift:
+        await message.answer("✅ Счетчики заказов совпадают с данными.")
+        return
+
+    lines = []
+    for item in drift:
+        order_type_name = config.ORDER_TYPES.get(item["order_type"], item["order_type"])
+        status_name = config.ORDER_STATUSES.get(item["status_code"], item["status_code"])
+        lines.append(f"• {order_type_name} / {status_name}: было {item['stored']}, стало {item['actual']}")
+    await message.answer(
+        "⚠️ Счетчики заказов расходились с данными и пересчитаны:\n\n" + "\n".join(lines)
+    )
+
+
+def _format_latency_rows(histogram: metrics.Histogram, label: str, limit: int = 8) -> list[str]:
+    """Строки сводки гистограммы: самые затратные по суммарному времени"""
+    rows = sorted(histogram.snapshot(), key=lambda item: item["sum"], reverse=True)[:limit]
+    return [
+        f"• {item['labels'][label]}{' (ошибки)' if item['labels'].get('status') == 'error' else ''}: "
+        f"{item['count']} шт., ср. {item['avg'] * 1000:.1f} мс, p95 {item['p95'] * 1000:.1f} мс"
+        for item in rows
+    ]
+
+
+@router.message(Command("admin_stats"))
+async def cmd_stats(message: Message):
+    """Сводка метрик производительности с момента запуска"""
+    sections = [
+        ("Обработчики", metrics.HANDLER_DURATION, "route"),
+        ("База данных", metrics.DB_DURATION, "method"),
+        ("Bot API", metrics.API_DURATION, "method"),
+    ]
+    lines = ["📊 Производительность с момента запуска"]
+    for title, histogram, label in sections:
+        rows = _format_latency_rows(histogram, label)
+        lines.append(f"\n{title}:")
+        lines.extend(rows or ["• нет данных"])
+
+    keyboard_stats = keyboards.get_keyboard_cache_stats().values()
+    keyboard_hits = sum(item["hits"] for item in keyboard_stats)
+    keyboard_total = keyboard_hits + sum(item["misses"] for item in keyboard_stats)
+    user_stats = database.db.get_user_cache_stats()
+    lines.append("\nКеши:")
+    lines.append(
+        f"• клавиатуры: {keyboard_hits}/{keyboard_total} попаданий"
+        + (f" ({keyboard_hits / keyboard_total:.0%})" if keyboard_total else "")
+    )
+    lines.append(
+        f"• пользователи: {user_stats['size']}/{user_stats['maxsize']}, "
+        f"попаданий {user_stats['hit_rate']:.0%}"
+    )
+
+    if config.SLOW_QUERY_MS > 0:
+        lines.append(f"\nSQL (порог {config.SLOW_QUERY_MS:g} мс):")
+        statements = slow_queries.get_statement_stats(limit=5)
+        lines.extend(
+            f"• {item['sql'][:60]}: {item['count']} шт., ср. {item['avg'] * 1000:.1f} мс, "
+            f"медленных {item['slow']}"
+            for item in statements
+        )
+        if not statements:
+            lines.append("• нет данных")
+    await message.answer("\n".join(lines))
+
+
+def _format_duration(seconds: float) -> str:
+    """Длительность для отчета: минуты, часы или дни с часами"""
+    minutes = int(seconds // 60)
+    if minutes < 60:
+        return f"{minutes} мин"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 24:
+        return f"{hours} ч {minutes} мин"
+    days, hours = divmod(hours, 24)
+    return f"{days} д {hours} ч"
+
+
+def _format_percentiles(summary: dict) -> str:
+    if not summary["count"]:
+        return "нет данных"
+    return f"{summary['count']} шт., " + ", ".join(
+        f"p{q} {_format_duration(summary[f'p{q}'])}" for q in analytics.PERCENTILES
+    )
+
+
+@router.message(Command("admin_report"))
+async def cmd_report(message: Message, command: CommandObject):
+    """Отчет о прохождении заказов по статусам: /admin_report [дней] [тип заказа]"""
+    days = analytics.DEFAULT_PERIOD_DAYS
+    order_type = None
+    for argument in (command.args or "").split():
+        if argument.isdigit() and int(argument) > 0:
+            days = int(argument)
+        elif argument in config.ORDER_TYPES:
+            order_type = argument
+        else:
+            await message.answer(
+                "Использование: /admin_report [дней] [тип заказа]\n"
+                f"Типы заказов: {', '.join(config.ORDER_TYPES)}"
+            )
+            return
+
+    report = await analytics.build_report(days, order_type)
+    counts = report["orders"]
+    title = f"📈 Прохождение заказов за {days} дн."
+    if order_type:
+        title += f" ({config.ORDER_TYPES[order_type]})"
+    lines = [
+        title,
+        f"Создано: {counts['created']}, готово: {counts['completed']}, отклонено: {counts['rejected']}",
+        "",
+        f"Срок выполнения (создание → готов): {_format_percentiles(report['lead_time'])}",
+        f"Ожидание в очереди (до начала работы): {_format_percentiles(report['queue_wait'])}",
+        "\nВремя в статусах:",
+    ]
+    for code, summary in report["time_in_status"].items():
+        lines.append(f"• {config.ORDER_STATUSES.get(code, code)}: {_format_percentiles(summary)}")
+    if not report["time_in_status"]:
+        lines.append("• нет данных")
+
+    # Материалы с наибольшей медианой времени в работе — вероятные узкие места
+    material_names = {
+        material["id"]: material["name"]
+        for material in await database.db.get_all_materials(only_available=False)
+    }
+    cycles = sorted(report["cycle_by_material"].items(), key=lambda item: item[1]["p50"], reverse=True)
+    lines.append("\nВремя в работе по материалам:")
+    for material_id, summary in cycles[:10]:
+        name = material_names.get(material_id, "Не указан")
+        lines.append(f"• {name}: {_format_percentiles(summary)}")
+    if not cycles:
+        lines.append("• нет данных")
+    await message.answer("\n".join(lines))
+
+
+@router.message(Command("admin_export"))
+async def cmd_export(message: Message, command: CommandObject):
+    """Выгрузка истории заказов в сжатый CSV, JSONL или Parquet с фильтрами (export.USAGE)"""
+    try:
+        export_format, filters = export.parse_arguments(command.args)
+    except ValueError as e:
+        await message.answer(f"{e}\n\n{export.USAGE}")
+        return
+
+    progress = await message.answer("⏳ Готовлю выгрузку заказов...")
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / export.file_name(export_format)
+        count = await export.export_orders(path, export_format, filters)
+        size = path.stat().st_size
+        if not count:
+            await progress.edit_text("Заказов с такими условиями нет.")
+            return
+        if size > export.MAX_DOCUMENT_BYTES:
+            await progress.edit_text(
+                f"Выгрузка ({count} заказов, {size / 1024 / 1024:.0f} МБ) больше предела Telegram "
+                f"{export.MAX_DOCUMENT_BYTES // 1024 // 1024} МБ. Сузьте период или добавьте фильтры."
+            )
+            return
+        await message.answer_document(FSInputFile(path), caption=f"Заказов: {count}")
+    await progress.delete()
+    logger.info(f"Администратор {message.from_user.id} выгрузил {count} заказов ({export_format}, {size} байт)")
+
+
 @router.callback_query(F.data == "admin_toggle_orders")
 async def toggle_orders_acceptance(callback: CallbackQuery):
     """Переключение доступности приёма заказов"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-
     current_state = await database.db.is_orders_enabled()
     new_state = not current_state
     await database.db.set_orders_enabled(new_state)
@@ -405,29 +570,22 @@ async def toggle_orders_acceptance(callback: CallbackQuery):
 
 @router.callback_query(F.data == "admin_find_order")
 async def admin_find_order_start(callback: CallbackQuery, state: FSMContext):
-    """Начать поиск заказа по номеру"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-
+    """Начать поиск заказа по номеру или тексту"""
     await state.set_state(states.OrderSearchStates.waiting_for_order_number)
     await state.update_data(order_search_origin="types_menu")
 
     await callback.message.edit_text(
         "🔍 Поиск заказа\n\n"
-        "Введите номер заказа сообщением в чат.\n"
+        "Введите номер заказа или слова для поиска (фамилия заказчика, название детали, "
+        "комментарий, причина отклонения) сообщением в чат.\n"
         "Чтобы отменить поиск, напишите «отмена».",
     )
     await callback.answer()
 
 
-@router.message(F.text == "Рассылка")
+@router.message(F.text == "Рассылка", flags={"admin_denied": BROADCAST_DENIED_TEXT})
 async def start_broadcast_from_menu(message: Message, state: FSMContext):
     """Запуск режима рассылки из главного меню"""
-    if not is_admin(message.from_user.id):
-        await message.answer("У вас нет доступа к режиму рассылки.")
-        return
-
     prompt_message = await message.answer(
         "📢 Режим рассылки\n\n"
         "Отправьте сообщение, которое нужно разослать всем пользователям.\n"
@@ -446,10 +604,6 @@ async def start_broadcast_from_menu(message: Message, state: FSMContext):
 @router.callback_query(F.data == "admin_broadcast")
 async def start_broadcast(callback: CallbackQuery, state: FSMContext):
     """Запустить режим рассылки сообщений"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-
     await state.set_state(states.BroadcastStates.waiting_for_message)
     await state.update_data(
         broadcast_prompt_chat_id=callback.message.chat.id,
@@ -469,10 +623,6 @@ async def start_broadcast(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data == "admin_broadcast_cancel")
 async def cancel_broadcast(callback: CallbackQuery, state: FSMContext):
     """Отменить режим рассылки"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-
     await state.set_state(None)
     await state.update_data(broadcast_prompt_chat_id=None, broadcast_prompt_message_id=None)
 
@@ -485,14 +635,9 @@ async def cancel_broadcast(callback: CallbackQuery, state: FSMContext):
     await callback.answer("Рассылка отменена.")
 
 
-@router.message(states.BroadcastStates.waiting_for_message)
+@router.message(states.BroadcastStates.waiting_for_message, flags={"admin_denied": BROADCAST_DENIED_TEXT})
 async def process_broadcast_message(message: Message, state: FSMContext):
     """Отправить сообщение рассылки всем пользователям"""
-    if not is_admin(message.from_user.id):
-        await message.answer("У вас нет доступа к режиму рассылки.")
-        await state.set_state(None)
-        return
-
     user_ids = await database.db.get_all_user_ids()
     unique_user_ids = sorted({int(user_id) for user_id in user_ids if isinstance(user_id, int)})
 
@@ -562,10 +707,6 @@ async def process_broadcast_message(message: Message, state: FSMContext):
 @router.callback_query(F.data.startswith("admin_orders_materials:"))
 async def show_orders_materials(callback: CallbackQuery, state: FSMContext):
     """Показать материалы для фильтрации заказов по материалу"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-
     order_type = callback.data.split(":")[1]
     await _render_orders_materials(callback.message, order_type, state)
     await callback.answer()
@@ -574,19 +715,17 @@ async def show_orders_materials(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data == "admin_orders_menu")
 async def show_orders_menu(callback: CallbackQuery, state: FSMContext):
     """Показать меню фильтров заказов"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-    
     await state.update_data(admin_order_type=None, admin_order_status=None)
 
     order_stats: dict[str, dict] = {}
     archived_counts: dict[str, int] = {}
     summary_lines = []
 
+    overview = await database.db.get_orders_overview()
     for order_type, title in config.ORDER_TYPES.items():
-        stats = await database.db.get_orders_statistics(order_type)
-        archived = await database.db.count_archived_orders(order_type)
+        counts = overview.get(order_type, {})
+        stats = {code: count for code, count in counts.items() if code not in ("archived", "rejected")}
+        archived = counts.get("archived", 0)
         order_stats[order_type] = stats
         archived_counts[order_type] = archived
 
@@ -608,14 +747,11 @@ async def show_orders_menu(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("admin_orders:"))
-async def show_orders_by_status(callback: CallbackQuery, state: FSMContext):
+@router.callback_query(AdminOrdersCallback.filter())
+async def show_orders_by_status(callback: CallbackQuery, callback_data: AdminOrdersCallback, state: FSMContext):
     """Показать заказы по статусу (первая страница)"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-    
-    _, order_type, status_code = callback.data.split(":")
+    order_type = callback_data.order_type
+    status_code = callback_data.status
     order_type_name = config.ORDER_TYPES.get(order_type, order_type)
 
     await state.update_data(admin_order_type=order_type, admin_order_status=status_code)
@@ -646,10 +782,6 @@ async def show_orders_by_status(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("admin_orders_material:"))
 async def show_orders_by_material(callback: CallbackQuery, state: FSMContext):
     """Показать заказы для выбранного материала"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-
     try:
         _, order_type, material_id_str = callback.data.split(":")
         material_id = int(material_id_str)
@@ -684,6 +816,10 @@ async def show_orders_by_material(callback: CallbackQuery, state: FSMContext):
 
 async def _show_orders_page(callback: CallbackQuery, state: FSMContext, order_type: str, status_code: str, page: int = 0, orders_per_page: int = 6):
     """Показать страницу с заказами"""
+    if status_code == SEARCH_LIST_STATUS:
+        await _show_search_page(callback, state, page=page, orders_per_page=orders_per_page)
+        return
+
     order_type_name = config.ORDER_TYPES.get(order_type, order_type)
 
     is_material_filter = False
@@ -810,6 +946,11 @@ async def _show_orders_page(callback: CallbackQuery, state: FSMContext, order_ty
         orders_text += "<i>Показываются только заказы в статусах «В ожидании» и «В работе».</i>\n\n"
     orders_text += "Выберите заказ для просмотра:"
 
+    await _edit_orders_list_message(callback, orders_text, orders_keyboard)
+
+
+async def _edit_orders_list_message(callback: CallbackQuery, orders_text: str, orders_keyboard: InlineKeyboardMarkup):
+    """Показать список заказов в сообщении (фото-карточку заменяем новым сообщением)"""
     try:
         await callback.message.edit_text(
             orders_text,
@@ -837,44 +978,79 @@ async def _show_orders_page(callback: CallbackQuery, state: FSMContext, order_ty
         raise
 
 
-@router.callback_query(F.data.startswith("admin_orders_page:"))
-async def show_orders_page(callback: CallbackQuery, state: FSMContext):
-    """Показать конкретную страницу с заказами"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
+async def _build_search_page(
+    search_query: str,
+    page: int = 0,
+    orders_per_page: int = 6
+) -> tuple[str, InlineKeyboardMarkup, int] | None:
+    """Подготовить страницу результатов полнотекстового поиска (None — ничего не найдено)"""
+    total_count = await database.db.count_search_orders(search_query)
+    if total_count == 0:
+        return None
+
+    total_pages = (total_count + orders_per_page - 1) // orders_per_page
+    page = min(max(page, 0), total_pages - 1)
+    orders = await database.db.search_orders(search_query, limit=orders_per_page, offset=page * orders_per_page)
+
+    orders_keyboard = keyboards.get_orders_list_keyboard(
+        orders,
+        prefix="admin_order",
+        status_code=SEARCH_LIST_STATUS,
+        current_page=page,
+        total_pages=total_pages,
+        order_type=SEARCH_ORDER_TYPE,
+        back_callback="admin_orders_menu",
+        back_text="⬅️ Назад к заказам"
+    )
+    start_num = page * orders_per_page + 1
+    end_num = min((page + 1) * orders_per_page, total_count)
+    orders_text = (
+        f"🔍 Поиск: «{html.escape(search_query)}»\n"
+        f"Заказы {start_num}-{end_num} из {total_count}\n"
+        f"Страница {page + 1} из {total_pages}\n\n"
+        "Выберите заказ для просмотра:"
+    )
+    return orders_text, orders_keyboard, page
+
+
+async def _show_search_page(callback: CallbackQuery, state: FSMContext, page: int = 0, orders_per_page: int = 6):
+    """Показать страницу результатов поиска (запрос хранится в состоянии)"""
+    data = await state.get_data()
+    search_query = data.get("admin_search_query")
+    if not search_query:
+        await callback.answer("Результаты поиска устарели. Выполните поиск заново.", show_alert=True)
         return
-    
-    _, order_type, status_code, page = callback.data.split(":")
-    page = int(page)
-    
-    await _show_orders_page(callback, state, order_type, status_code, page=page)
-    await callback.answer()
+
+    result = await _build_search_page(search_query, page=page, orders_per_page=orders_per_page)
+    if result is None:
+        await callback.answer("По запросу больше ничего не найдено.", show_alert=True)
+        return
+
+    orders_text, orders_keyboard, page = result
+    await state.update_data(
+        admin_order_type=SEARCH_ORDER_TYPE,
+        admin_order_status=SEARCH_LIST_STATUS,
+        admin_orders_page=page
+    )
+    await _edit_orders_list_message(callback, orders_text, orders_keyboard)
 
 
-@router.callback_query(F.data == "noop")
-async def noop_handler(callback: CallbackQuery):
-    """Обработчик для пустых кнопок (без действия)"""
+@router.callback_query(AdminOrdersPageCallback.filter())
+async def show_orders_page(callback: CallbackQuery, callback_data: AdminOrdersPageCallback, state: FSMContext):
+    """Показать конкретную страницу с заказами"""
+    await _show_orders_page(
+        callback, state, callback_data.order_type, callback_data.status, page=callback_data.page
+    )
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("admin_back_to_orders"))
-async def back_to_orders_list(callback: CallbackQuery, state: FSMContext):
+@router.callback_query(AdminBackToOrdersCallback.filter())
+async def back_to_orders_list(callback: CallbackQuery, callback_data: AdminBackToOrdersCallback, state: FSMContext):
     """Вернуться к списку заказов выбранного типа"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-    
-    parts = callback.data.split(":")
     data = await state.get_data()
-
-    if len(parts) >= 4:
-        order_type = parts[1]
-        status_code = parts[2]
-        page = int(parts[3])
-    else:
-        order_type = parts[1] if len(parts) > 1 else data.get("admin_order_type") or "3d_print"
-        status_code = parts[2] if len(parts) > 2 else data.get("admin_order_status")
-        page = data.get("admin_orders_page", 0)
+    order_type = callback_data.order_type or data.get("admin_order_type") or "3d_print"
+    status_code = callback_data.status if callback_data.status is not None else data.get("admin_order_status")
+    page = callback_data.page if callback_data.page is not None else data.get("admin_orders_page", 0)
 
     if status_code and status_code not in (None, "None", ""):
         await _show_orders_page(callback, state, order_type, status_code, page=page)
@@ -886,10 +1062,6 @@ async def back_to_orders_list(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data == "admin_back_to_main")
 async def back_to_admin_main(callback: CallbackQuery, state: FSMContext):
     """Вернуться в главное меню админ-панели"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-    
     await state.set_state(None)
     await state.update_data(broadcast_prompt_chat_id=None, broadcast_prompt_message_id=None)
 
@@ -922,40 +1094,19 @@ async def back_to_admin_main(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("admin_order:"))
-async def show_order_detail(callback: CallbackQuery, state: FSMContext):
+@router.callback_query(AdminOrderCallback.filter())
+async def show_order_detail(callback: CallbackQuery, callback_data: AdminOrderCallback, state: FSMContext):
     """Показать детали заказа администратору"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-    
-    parts = callback.data.split(":")
-    current_page = None
-
-    if len(parts) >= 5:
-        _, order_type, list_status, order_id_str, page_str = parts[:5]
-        current_page = int(page_str)
-    elif len(parts) == 4:
-        _, order_type, list_status, order_id_str = parts
-    else:
-        order_id_str = parts[-1]
-        order_type = None
-        list_status = None
-
-    data = await state.get_data()
-    if order_type is None:
-        order_type = data.get("admin_order_type") or "3d_print"
-    if list_status is None:
-        list_status = data.get("admin_order_status")
-    if current_page is None:
-        current_page = data.get("admin_orders_page", 0)
+    order_type = callback_data.order_type
+    list_status = callback_data.status
+    current_page = callback_data.page
     await state.update_data(
         admin_order_type=order_type,
         admin_order_status=list_status,
         admin_orders_page=current_page
     )
 
-    order_id = int(order_id_str)
+    order_id = callback_data.order_id
     order = await database.db.get_order(order_id)
     
     if not order:
@@ -1000,10 +1151,6 @@ async def show_order_detail(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("admin_expand_order:"))
 async def expand_order_from_notification(callback: CallbackQuery, state: FSMContext):
     """Развернуть уведомление о новом заказе"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-
     try:
         _, order_id_str = callback.data.split(":")
         order_id = int(order_id_str)
@@ -1017,16 +1164,16 @@ async def expand_order_from_notification(callback: CallbackQuery, state: FSMCont
         return
 
     await state.update_data(
-        admin_order_type=order.get('order_type', '3d_print'),
-        admin_order_status=order.get('status_code'),
+        admin_order_type=order.order_type,
+        admin_order_status=order.status_code,
         admin_orders_page=0
     )
 
     collapse_button = [("⬅️ Скрыть уведомление", f"admin_collapse_order:{order_id}")]
     detail_text, detail_keyboard, photo_path, _ = _build_admin_order_detail_payload(
         order,
-        order_type=order.get('order_type'),
-        list_status=order.get('status_code'),
+        order_type=order.order_type,
+        list_status=order.status_code,
         current_page=0,
         show_list_back=False,
         extra_buttons=collapse_button
@@ -1050,6 +1197,18 @@ async def expand_order_from_notification(callback: CallbackQuery, state: FSMCont
                 reply_markup=detail_keyboard,
                 parse_mode="HTML"
             )
+    elif callback.message.photo:
+        # Уведомление с превью модели нельзя отредактировать в текст — отправляем заново
+        try:
+            await callback.message.delete()
+        except TelegramBadRequest:
+            pass
+        await callback.bot.send_message(
+            callback.message.chat.id,
+            detail_text,
+            reply_markup=detail_keyboard,
+            parse_mode="HTML"
+        )
     else:
         await callback.message.edit_text(
             detail_text,
@@ -1063,10 +1222,6 @@ async def expand_order_from_notification(callback: CallbackQuery, state: FSMCont
 @router.callback_query(F.data.startswith("admin_collapse_order:"))
 async def collapse_order_notification(callback: CallbackQuery, state: FSMContext):
     """Свернуть уведомление с подробностями заказа"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-
     try:
         _, order_id_str = callback.data.split(":")
         order_id = int(order_id_str)
@@ -1095,8 +1250,8 @@ async def collapse_order_notification(callback: CallbackQuery, state: FSMContext
     )
 
     await state.update_data(
-        admin_order_type=order.get('order_type', '3d_print'),
-        admin_order_status=order.get('status_code'),
+        admin_order_type=order.order_type,
+        admin_order_status=order.status_code,
         admin_orders_page=0
     )
 
@@ -1106,10 +1261,6 @@ async def collapse_order_notification(callback: CallbackQuery, state: FSMContext
 @router.callback_query(F.data.startswith("download_model:"))
 async def download_model(callback: CallbackQuery):
     """Скачать модель с переименованием"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-    
     order_id = int(callback.data.split(":")[1])
     order = await database.db.get_order(order_id)
     
@@ -1117,19 +1268,19 @@ async def download_model(callback: CallbackQuery):
         await callback.answer("Заказ не найден", show_alert=True)
         return
     
-    model_path = Path(order['model_path'])
+    model_path = Path(order.model_path)
     if not model_path.exists():
         await callback.answer("Файл модели не найден", show_alert=True)
         return
     
     # Формируем новое имя файла по шаблону: {order_id}_{last_name}_{first_name}_{part_name}.<ext>
     file_extension = model_path.suffix.lower()
-    original_filename = order.get('original_filename')
+    original_filename = order.original_filename
     if original_filename:
         part_name_source = Path(original_filename).stem
     else:
         part_name_source = model_path.stem
-    part_name = order['part_name'] or part_name_source
+    part_name = order.part_name or part_name_source
     
     # Очищаем имена от недопустимых символов для файловых имен
     import re
@@ -1139,9 +1290,9 @@ async def download_model(callback: CallbackQuery):
         name = name.replace(' ', '_')
         return name
     
-    order_id = order['id']
-    last_name = clean_filename(order['last_name'])
-    first_name = clean_filename(order['first_name'])
+    order_id = order.id
+    last_name = clean_filename(order.last_name)
+    first_name = clean_filename(order.first_name)
     part_name_clean = clean_filename(part_name)
     
     new_filename = f"{order_id}_{last_name}_{first_name}_{part_name_clean}{file_extension}"
@@ -1177,10 +1328,6 @@ async def download_model(callback: CallbackQuery):
 @router.callback_query(F.data.startswith("reject_order:"))
 async def reject_order_start(callback: CallbackQuery, state: FSMContext):
     """Начать процесс отклонения заказа"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-    
     parts = callback.data.split(":")
     state_data = await state.get_data()
     order_id = int(parts[1])
@@ -1191,7 +1338,7 @@ async def reject_order_start(callback: CallbackQuery, state: FSMContext):
     # Получаем заказ для определения типа
     order = await database.db.get_order(order_id)
     if order:
-        order_type = order.get('order_type', order_type or '3d_print')
+        order_type = order.order_type
     else:
         order_type = order_type or '3d_print'
     
@@ -1257,10 +1404,6 @@ async def reject_order_start(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("use_rejection_template:"))
 async def use_rejection_template(callback: CallbackQuery, state: FSMContext):
     """Использовать шаблонный комментарий для отклонения заказа"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-    
     try:
         parts = callback.data.split(":")
         _, order_id_str, template_id_str, order_type = parts[:4]
@@ -1292,7 +1435,7 @@ async def use_rejection_template(callback: CallbackQuery, state: FSMContext):
     
     # Обновляем заказ для отправки уведомления
     order = await database.db.get_order(order_id)
-    order['rejection_reason'] = rejection_reason
+    order.rejection_reason = rejection_reason
     
     # Отправляем уведомление пользователю с причиной отклонения
     await notify_user_order_status_changed(callback.bot, order, "Отклонен")
@@ -1330,10 +1473,6 @@ async def use_rejection_template(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("reject_order_custom:"))
 async def reject_order_custom_start(callback: CallbackQuery, state: FSMContext):
     """Начать процесс отклонения заказа с вводом своего комментария"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-    
     try:
         parts = callback.data.split(":")
         _, order_id_str, order_type = parts[:3]
@@ -1382,10 +1521,6 @@ async def reject_order_custom_start(callback: CallbackQuery, state: FSMContext):
 @router.message(states.OrderRejectionStates.waiting_for_rejection_reason)
 async def reject_order_process(message: Message, state: FSMContext):
     """Обработка комментария отклонения"""
-    if not is_admin(message.from_user.id):
-        await state.clear()
-        return
-    
     rejection_reason = message.text.strip()
     if not rejection_reason:
         await message.answer("Пожалуйста, укажите причину отклонения:")
@@ -1412,7 +1547,7 @@ async def reject_order_process(message: Message, state: FSMContext):
     
     # Обновляем заказ для отправки уведомления
     order = await database.db.get_order(order_id)
-    order['rejection_reason'] = rejection_reason
+    order.rejection_reason = rejection_reason
     
     # Отправляем уведомление пользователю с причиной отклонения
     await notify_user_order_status_changed(message.bot, order, "Отклонен")
@@ -1450,15 +1585,11 @@ async def reject_order_process(message: Message, state: FSMContext):
     await state.clear()
 
 
-@router.callback_query(F.data.startswith("set_status:"))
-async def set_order_status(callback: CallbackQuery, state: FSMContext):
+@router.callback_query(SetStatusCallback.filter())
+async def set_order_status(callback: CallbackQuery, callback_data: SetStatusCallback, state: FSMContext):
     """Изменить статус заказа"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-    
-    _, order_id, status_code = callback.data.split(":")
-    order_id = int(order_id)
+    order_id = callback_data.order_id
+    status_code = callback_data.status
     
     
     # Обновляем статус
@@ -1476,7 +1607,7 @@ async def set_order_status(callback: CallbackQuery, state: FSMContext):
     await notify_user_order_status_changed(callback.bot, order, status_name)
     
     data = await state.get_data()
-    order_type = data.get('admin_order_type') or order.get('order_type') or '3d_print'
+    order_type = data.get('admin_order_type') or order.order_type or '3d_print'
     current_list_status = data.get('admin_order_status')
     if current_list_status in ("all", "archived", None, "", "None"):
         list_status = current_list_status or status_code
@@ -1506,10 +1637,6 @@ async def set_order_status(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("admin_picked_up:"))
 async def admin_picked_up_order(callback: CallbackQuery, state: FSMContext):
     """Обработка нажатия кнопки 'Забрал' администратором"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-    
     order_id = int(callback.data.split(":")[1])
     order = await database.db.get_order(order_id)
     
@@ -1517,7 +1644,7 @@ async def admin_picked_up_order(callback: CallbackQuery, state: FSMContext):
         await callback.answer("Заказ не найден", show_alert=True)
         return
     
-    if order.get('status_code') != 'ready':
+    if order.status_code != 'ready':
         await callback.answer("Заказ не в статусе 'Готов'", show_alert=True)
         return
     
@@ -1525,7 +1652,7 @@ async def admin_picked_up_order(callback: CallbackQuery, state: FSMContext):
     success = await database.db.archive_order(order_id)
     
     if success:
-        order_type = order.get('order_type', '3d_print')
+        order_type = order.order_type
         stats = await database.db.get_orders_statistics(order_type)
         archived_count = await database.db.count_archived_orders(order_type)
         order_type_name = config.ORDER_TYPES.get(order_type, order_type)
@@ -1610,10 +1737,6 @@ async def show_order_detail_after_update(
 @router.callback_query(F.data == "admin_manage_materials")
 async def manage_materials(callback: CallbackQuery, state: FSMContext):
     """Управление материалами"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-    
     await state.update_data(material_management_type=None)
 
     print_materials = await database.db.get_materials_with_usage_count('3d_print')
@@ -1640,10 +1763,6 @@ async def manage_materials(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("admin_add_material:"))
 async def add_material_start(callback: CallbackQuery, state: FSMContext):
     """Начать добавление материала"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-    
     material_type = callback.data.split(":")[1]
     await state.update_data(material_management_type=material_type)
 
@@ -1672,10 +1791,6 @@ async def add_material_start(callback: CallbackQuery, state: FSMContext):
 @router.message(states.MaterialManagementStates.waiting_for_material_name)
 async def add_material_process(message: Message, state: FSMContext):
     """Обработка добавления материала"""
-    if not is_admin(message.from_user.id):
-        await state.clear()
-        return
-    
     material_name = message.text.strip()
     if not material_name:
         await message.answer("Пожалуйста, введите корректное название в формате \"цвет тип\":")
@@ -1685,6 +1800,8 @@ async def add_material_process(message: Message, state: FSMContext):
     material_type = data.get('material_management_type') or '3d_print'
     
     success = await database.db.add_material(material_name, material_type)
+    if success:
+        keyboards.invalidate_materials_keyboards()
     
     if success:
         # Получаем обновленный список материалов со статистикой
@@ -1726,10 +1843,6 @@ async def add_material_process(message: Message, state: FSMContext):
 @router.callback_query(F.data.startswith("admin_delete_material:"))
 async def delete_material_start(callback: CallbackQuery, state: FSMContext):
     """Начать удаление материала"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-    
     material_type = callback.data.split(":")[1]
     await state.update_data(material_management_type=material_type)
 
@@ -1750,10 +1863,6 @@ async def delete_material_start(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("admin_restore_material:"))
 async def restore_material_start(callback: CallbackQuery, state: FSMContext):
     """Начать восстановление доступа к материалу"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-
     material_type = callback.data.split(":")[1]
     await state.update_data(material_management_type=material_type)
 
@@ -1774,13 +1883,11 @@ async def restore_material_start(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("delete_material:"))
 async def delete_material_process(callback: CallbackQuery, state: FSMContext):
     """Обработка удаления материала"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-    
     _, material_type, material_id_str = callback.data.split(":")
     material_id = int(material_id_str)
     success = await database.db.delete_material(material_id)
+    if success:
+        keyboards.invalidate_materials_keyboards()
     
     if success:
         # Получаем обновленный список материалов со статистикой
@@ -1820,13 +1927,11 @@ async def delete_material_process(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("restore_material:"))
 async def restore_material_process(callback: CallbackQuery, state: FSMContext):
     """Обработка восстановления доступа к материалу"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-
     _, material_type, material_id_str = callback.data.split(":")
     material_id = int(material_id_str)
     success = await database.db.restore_material(material_id)
+    if success:
+        keyboards.invalidate_materials_keyboards()
 
     if success:
         materials = await database.db.get_materials_with_usage_count(material_type)
@@ -1864,10 +1969,6 @@ async def restore_material_process(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data == "admin_manage_rejection_templates_menu")
 async def manage_rejection_templates_menu(callback: CallbackQuery, state: FSMContext):
     """Показать меню управления шаблонами отклонения"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-    
     await callback.message.edit_text(
         "📝 Управление шаблонами отклонения заказов\n\n"
         "Выберите тип заказов для управления шаблонами:",
@@ -1879,10 +1980,6 @@ async def manage_rejection_templates_menu(callback: CallbackQuery, state: FSMCon
 @router.callback_query(F.data.startswith("admin_manage_rejection_templates:"))
 async def manage_rejection_templates(callback: CallbackQuery, state: FSMContext):
     """Показать управление шаблонами для выбранного типа заказа"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-    
     order_type = callback.data.split(":")[1]
     order_type_name = config.ORDER_TYPES.get(order_type, order_type)
     
@@ -1906,10 +2003,6 @@ async def manage_rejection_templates(callback: CallbackQuery, state: FSMContext)
 @router.callback_query(F.data.startswith("admin_add_rejection_template:"))
 async def add_rejection_template_start(callback: CallbackQuery, state: FSMContext):
     """Начать добавление шаблона отклонения"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-    
     order_type = callback.data.split(":")[1]
     order_type_name = config.ORDER_TYPES.get(order_type, order_type)
     
@@ -1926,10 +2019,6 @@ async def add_rejection_template_start(callback: CallbackQuery, state: FSMContex
 @router.message(states.RejectionTemplateManagementStates.waiting_for_template_text)
 async def add_rejection_template_process(message: Message, state: FSMContext):
     """Обработка добавления шаблона отклонения"""
-    if not is_admin(message.from_user.id):
-        await state.clear()
-        return
-    
     template_text = message.text.strip()
     if not template_text:
         await message.answer("Пожалуйста, введите текст шаблона:")
@@ -1970,10 +2059,6 @@ async def add_rejection_template_process(message: Message, state: FSMContext):
 @router.callback_query(F.data.startswith("admin_delete_rejection_template:"))
 async def delete_rejection_template_start(callback: CallbackQuery, state: FSMContext):
     """Начать удаление шаблона отклонения"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-    
     order_type = callback.data.split(":")[1]
     
     templates = await database.db.get_rejection_templates(order_type)
@@ -1992,10 +2077,6 @@ async def delete_rejection_template_start(callback: CallbackQuery, state: FSMCon
 @router.callback_query(F.data.startswith("delete_rejection_template:"))
 async def delete_rejection_template_process(callback: CallbackQuery, state: FSMContext):
     """Обработка удаления шаблона отклонения"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-    
     try:
         _, order_type, template_id_str = callback.data.split(":")
         template_id = int(template_id_str)
@@ -2029,11 +2110,7 @@ async def delete_rejection_template_process(callback: CallbackQuery, state: FSMC
 
 @router.message(states.OrderSearchStates.waiting_for_order_number)
 async def admin_process_order_search(message: Message, state: FSMContext):
-    """Обработка ввода номера заказа для поиска"""
-    if not is_admin(message.from_user.id):
-        await state.clear()
-        return
-
+    """Обработка ввода номера заказа или поискового запроса"""
     text = message.text.strip()
     if text.lower() in {"отмена", "cancel"}:
         await state.clear()
@@ -2045,7 +2122,30 @@ async def admin_process_order_search(message: Message, state: FSMContext):
         return
 
     if not text.isdigit():
-        await message.answer("Введите числовой номер заказа или напишите «отмена».")
+        if not await database.db.is_search_available():
+            await message.answer(
+                "Поиск по тексту недоступен: SQLite на сервере собран без полнотекстового поиска (FTS5). "
+                "Введите номер заказа или напишите «отмена»."
+            )
+            return
+        result = await _build_search_page(text)
+        if result is None:
+            await message.answer(
+                f"По запросу «{html.escape(text)}» ничего не найдено. "
+                "Измените запрос или напишите «отмена».",
+                parse_mode="HTML"
+            )
+            return
+
+        orders_text, orders_keyboard, page = result
+        await state.set_state(None)
+        await state.update_data(
+            admin_search_query=text,
+            admin_order_type=SEARCH_ORDER_TYPE,
+            admin_order_status=SEARCH_LIST_STATUS,
+            admin_orders_page=page
+        )
+        await message.answer(orders_text, reply_markup=orders_keyboard, parse_mode="HTML")
         return
 
     order_id = int(text)
@@ -2059,8 +2159,8 @@ async def admin_process_order_search(message: Message, state: FSMContext):
 
     await state.clear()
 
-    order_type = order.get('order_type', '3d_print')
-    list_status = order.get('status_code')
+    order_type = order.order_type
+    list_status = order.status_code
 
     extra_buttons = [
         ("➡️ Открыть раздел", f"admin_orders_type:{order_type}"),
@@ -2103,10 +2203,6 @@ async def admin_process_order_search(message: Message, state: FSMContext):
 @router.callback_query(F.data.startswith("admin_view_from_user:"))
 async def admin_view_order_from_user(callback: CallbackQuery, state: FSMContext):
     """Показать админское описание заказа из пользовательского списка"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-
     try:
         order_id = int(callback.data.split(":")[1])
     except (ValueError, IndexError):
@@ -2114,12 +2210,12 @@ async def admin_view_order_from_user(callback: CallbackQuery, state: FSMContext)
         return
 
     order = await database.db.get_order(order_id)
-    if not order or order.get('user_id') != callback.from_user.id:
+    if not order or order.user_id != callback.from_user.id:
         await callback.answer("Заказ не найден", show_alert=True)
         return
 
-    order_type = order.get('order_type', '3d_print')
-    status_code = order.get('status_code')
+    order_type = order.order_type
+    status_code = order.status_code
 
     await state.update_data(
         admin_order_type=order_type,
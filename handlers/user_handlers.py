@@ -1,6 +1,7 @@
 """
 Обработчики для пользователей
 """
+import asyncio
 import html
 
 from aiogram import Router, F
@@ -15,6 +16,7 @@ import config
 import database
 import keyboards
 import states
+import utils
 from utils import notify_user_order_status_changed
 
 
@@ -22,7 +24,7 @@ router = Router()
 
 
 @router.message(Command("start"))
-async def cmd_start(message: Message, state: FSMContext):
+async def cmd_start(message: Message, state: FSMContext, is_admin: bool):
     """Обработчик команды /start"""
     user_id = message.from_user.id
     username = message.from_user.username
@@ -46,7 +48,7 @@ async def cmd_start(message: Message, state: FSMContext):
             username
         )
         user = await database.db.get_user(user_id)
-        keyboard = keyboards.get_admin_menu_keyboard() if user_id in config.ADMIN_IDS else keyboards.get_main_menu_keyboard()
+        keyboard = keyboards.get_admin_menu_keyboard() if is_admin else keyboards.get_main_menu_keyboard()
         
         # Отправляем фото с подсказкой к меню
         menu_help_photo_path = Path("files/menu_help.png")
@@ -57,7 +59,7 @@ async def cmd_start(message: Message, state: FSMContext):
             "• <b>Мои заказы</b> - просмотреть все ваши заказы и их статусы\n"
         )
         
-        if user_id in config.ADMIN_IDS:
+        if is_admin:
             help_text += "• <b>Админ-панель</b> - управление заказами и настройками\n"
             help_text += "• <b>Рассылка</b> - отправка сообщений всем пользователям\n"
         
@@ -105,7 +107,7 @@ async def process_first_name(message: Message, state: FSMContext):
 
 
 @router.message(states.RegistrationStates.waiting_for_last_name)
-async def process_last_name(message: Message, state: FSMContext):
+async def process_last_name(message: Message, state: FSMContext, is_admin: bool):
     """Обработка имени при регистрации"""
     last_name = message.text.strip()
     if not last_name:
@@ -120,7 +122,7 @@ async def process_last_name(message: Message, state: FSMContext):
     username = message.from_user.username  # Получаем username из Telegram
     await database.db.get_or_create_user(user_id, first_name, last_name, username)
     
-    keyboard = keyboards.get_admin_menu_keyboard() if user_id in config.ADMIN_IDS else keyboards.get_main_menu_keyboard()
+    keyboard = keyboards.get_admin_menu_keyboard() if is_admin else keyboards.get_main_menu_keyboard()
     await message.answer(
         f"Регистрация завершена! Добро пожаловать, {first_name} {last_name}!\n\n"
         "Выберите действие:",
@@ -131,7 +133,7 @@ async def process_last_name(message: Message, state: FSMContext):
 
 @router.message(Command("new_order"))
 @router.message(F.text == "Создать заказ")
-async def cmd_new_order(message: Message, state: FSMContext):
+async def cmd_new_order(message: Message, state: FSMContext, is_admin: bool):
     """Обработчик команды создания заказа"""
     user_id = message.from_user.id
     username = message.from_user.username
@@ -141,7 +143,7 @@ async def cmd_new_order(message: Message, state: FSMContext):
         await message.answer("Пожалуйста, сначала зарегистрируйтесь через /start")
         return
     
-    if user_id not in config.ADMIN_IDS:
+    if not is_admin:
         orders_enabled = await database.db.is_orders_enabled()
         if not orders_enabled:
             await message.answer(
@@ -167,7 +169,7 @@ async def cmd_new_order(message: Message, state: FSMContext):
     )
 
 
-@router.callback_query(F.data.startswith("select_order_type"), states.OrderCreationStates.waiting_for_order_type)
+@router.callback_query(F.data.startswith("select_order_type:"), states.OrderCreationStates.waiting_for_order_type)
 async def process_order_type(callback: CallbackQuery, state: FSMContext):
     """Обработка выбора типа заказа"""
     order_type = callback.data.split(":")[1]
@@ -280,12 +282,29 @@ async def process_model(message: Message, state: FSMContext):
     await message.bot.download_file(file.file_path, model_path)
     
     original_filename = Path(document.file_name).stem
+    model_hash = await asyncio.to_thread(utils.file_sha256, model_path)
+
+    # STEP-файлы проверяем сразу, чтобы поврежденный файл не дошел до печати
+    step_metadata = await utils.get_step_metadata(model_path, model_hash)
+    if step_metadata is not None and not step_metadata.get('valid', True):
+        model_path.unlink(missing_ok=True)
+        errors = "\n".join(f"• {error}" for error in step_metadata.get('errors') or [])
+        await message.answer(
+            "Файл STEP повреждён или обрезан:\n"
+            f"{errors}\n\n"
+            "Пожалуйста, экспортируйте модель заново и загрузите файл ещё раз:"
+        )
+        return
     
     await state.update_data(
         model_path=str(model_path),
         original_filename=document.file_name,
-        file_extension=file_extension
+        file_extension=file_extension,
+        model_hash=model_hash
     )
+
+    # Рендер превью запускаем заранее, к подтверждению заказа оно уже будет готово
+    utils.schedule_model_preview(model_path, model_hash)
     
     await message.answer("Файл модели получен!\n\nВведите название детали:")
     await state.set_state(states.OrderCreationStates.waiting_for_part_name)
@@ -434,8 +453,8 @@ async def _show_order_summary(message_or_callback, state: FSMContext):
     
     order_type = data.get('order_type', '3d_print')
     material_id = data['material_id']
-    materials = await database.db.get_all_materials(order_type)
-    material_name = next((m['name'] for m in materials if m['id'] == material_id), "Не указан")
+    material = await database.db.get_material(material_id)
+    material_name = material['name'] if material else "Не указан"
 
     order_type_name = config.ORDER_TYPES.get(order_type, order_type)
 
@@ -499,7 +518,8 @@ async def confirm_order(callback: CallbackQuery, state: FSMContext):
             original_filename=data['original_filename'],
             comment=data.get('comment'),
             order_type=data.get('order_type', '3d_print'),
-            quantity=data.get('quantity', 1)
+            quantity=data.get('quantity', 1),
+            model_hash=data.get('model_hash')
         )
 
         # Уведомляем администраторов о новом заказе
@@ -523,12 +543,41 @@ async def confirm_order(callback: CallbackQuery, state: FSMContext):
         if comment:
             admin_message += f"💬 Комментарий: {comment}\n"
 
+        # Превью рендерится по самому файлу модели, а не по фото пользователя.
+        # Рендер крупной модели не задерживает ответ: ожидание ограничено (рендер защищен shield)
+        try:
+            preview_path = await asyncio.wait_for(
+                utils.get_model_preview(data['model_path'], data.get('model_hash')),
+                config.PREVIEW_WAIT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            logger.info(f"Превью модели заказа №{order_id} не готово за {config.PREVIEW_WAIT_SECONDS:g} с, уведомление без превью")
+            preview_path = None
+        model_metrics = utils.get_model_metrics(data.get('model_hash'))
+        if model_metrics:
+            admin_message += utils.format_model_metrics(model_metrics)
+
         admin_message += "\nНажмите «Раскрыть заказ», чтобы просмотреть детали. При необходимости перейдите в /admin."
 
+        # Подпись к фото ограничена 1024 символами
+        if preview_path and len(admin_message) > 1024:
+            preview_path = None
+
         for admin_id in config.ADMIN_IDS:
             if admin_id == user_id:
                 continue
             try:
+                if preview_path:
+                    try:
+                        await callback.bot.send_photo(
+                            admin_id,
+                            FSInputFile(preview_path),
+                            caption=admin_message,
+                            reply_markup=keyboards.get_admin_new_order_keyboard(order_id)
+                        )
+                        continue
+                    except Exception as photo_error:
+                        logger.warning(f"Не удалось отправить превью модели админу {admin_id}: {photo_error}")
                 await callback.bot.send_message(
                     admin_id,
                     admin_message,
@@ -608,32 +657,32 @@ async def cmd_my_orders(message: Message):
 
 
 @router.callback_query(F.data.startswith("my_order:"))
-async def show_user_order_detail(callback: CallbackQuery):
+async def show_user_order_detail(callback: CallbackQuery, is_admin: bool):
     """Показать детали заказа пользователю"""
     order_id = int(callback.data.split(":")[1])
     order = await database.db.get_order(order_id)
     
-    if not order or order['user_id'] != callback.from_user.id:
+    if not order or order.user_id != callback.from_user.id:
         await callback.answer("Заказ не найден", show_alert=True)
         return
     
     extra_buttons: list[tuple[str, str]] | None = None
-    if callback.from_user.id in config.ADMIN_IDS:
+    if is_admin:
         extra_buttons = [("🔧 Открыть админские действия", f"admin_view_from_user:{order_id}")]
 
-    status_name = order.get('status_name') or 'Неизвестно'
-    material_name = order.get('material_name') or 'Не указан'
-    status_code = order.get('status_code', 'unknown')
-    order_type_code = order.get('order_type', '3d_print')
+    status_name = order.status_name or 'Неизвестно'
+    material_name = order.material_name or 'Не указан'
+    status_code = order.status_code or 'unknown'
+    order_type_code = order.order_type
     order_type_name = config.ORDER_TYPES.get(order_type_code, order_type_code)
     
     # Безопасное экранирование с проверкой на None
-    created_at = order.get('created_at') or 'Не указана'
-    part_name = order.get('part_name') or 'Не указано'
-    quantity = order.get('quantity', 1)
+    created_at = order.created_at_text or 'Не указана'
+    part_name = order.part_name or 'Не указано'
+    quantity = order.quantity
     
     order_text = (
-        f"📋 Заказ №{order['id']}\n\n"
+        f"📋 Заказ №{order.id}\n\n"
         f"📅 Дата создания: {html.escape(str(created_at))}\n"
         f"⚙️ Тип: {html.escape(order_type_name)}\n"
         f"📦 Название детали: {html.escape(str(part_name))}\n"
@@ -643,8 +692,8 @@ async def show_user_order_detail(callback: CallbackQuery):
         f"<b>Материал:</b>\n{html.escape(str(material_name))}"
     )
     
-    if order.get('comment'):
-        order_text += f"\n\n<b>Комментарий:</b>\n{html.escape(str(order['comment']))}"
+    if order.comment:
+        order_text += f"\n\n<b>Комментарий:</b>\n{html.escape(str(order.comment))}"
     
     await callback.message.edit_text(
         order_text,
@@ -665,14 +714,14 @@ async def user_cancel_order(callback: CallbackQuery):
     order_id = int(callback.data.split(":")[1])
     order = await database.db.get_order(order_id)
     
-    if not order or order['user_id'] != callback.from_user.id:
+    if not order or order.user_id != callback.from_user.id:
         try:
             await callback.answer("Заказ не найден", show_alert=True)
         except Exception:
             pass
         return
     
-    if order.get('status_code') != 'pending':
+    if order.status_code != 'pending':
         try:
             await callback.answer("Отменить можно только заказы в статусе 'В ожидании'", show_alert=True)
         except Exception:
@@ -733,11 +782,11 @@ async def user_picked_up_order(callback: CallbackQuery):
     order_id = int(callback.data.split(":")[1])
     order = await database.db.get_order(order_id)
     
-    if not order or order['user_id'] != callback.from_user.id:
+    if not order or order.user_id != callback.from_user.id:
         await callback.answer("Заказ не найден", show_alert=True)
         return
     
-    if order.get('status_code') != 'ready':
+    if order.status_code != 'ready':
         await callback.answer("Заказ еще не готов к выдаче", show_alert=True)
         return
     
@@ -937,8 +986,14 @@ async def show_user_archived_orders_page(callback: CallbackQuery):
     await callback.answer()
 
 
+@router.callback_query(F.data == "noop")
+async def noop_handler(callback: CallbackQuery):
+    """Обработчик для пустых кнопок (без действия)"""
+    await callback.answer()
+
+
 @router.callback_query(F.data.startswith("user_archived_order:"))
-async def show_user_archived_order_detail(callback: CallbackQuery):
+async def show_user_archived_order_detail(callback: CallbackQuery, is_admin: bool):
     """Показать детали архивного заказа пользователю"""
     try:
         parts = callback.data.split(":")
@@ -950,31 +1005,31 @@ async def show_user_archived_order_detail(callback: CallbackQuery):
     
     order = await database.db.get_order(order_id)
     
-    if not order or order['user_id'] != callback.from_user.id:
+    if not order or order.user_id != callback.from_user.id:
         await callback.answer("Заказ не найден", show_alert=True)
         return
     
-    if order.get('status_code') != 'archived':
+    if order.status_code != 'archived':
         await callback.answer("Этот заказ не в архиве", show_alert=True)
         return
     
     extra_buttons: list[tuple[str, str]] | None = None
-    if callback.from_user.id in config.ADMIN_IDS:
+    if is_admin:
         extra_buttons = [("🔧 Открыть админские действия", f"admin_view_from_user:{order_id}")]
 
-    status_name = order.get('status_name') or 'Неизвестно'
-    material_name = order.get('material_name') or 'Не указан'
-    status_code = order.get('status_code', 'unknown')
-    order_type_code = order.get('order_type', '3d_print')
+    status_name = order.status_name or 'Неизвестно'
+    material_name = order.material_name or 'Не указан'
+    status_code = order.status_code or 'unknown'
+    order_type_code = order.order_type
     order_type_name = config.ORDER_TYPES.get(order_type_code, order_type_code)
     
     # Безопасное экранирование с проверкой на None
-    created_at = order.get('created_at') or 'Не указана'
-    part_name = order.get('part_name') or 'Не указано'
-    quantity = order.get('quantity', 1)
+    created_at = order.created_at_text or 'Не указана'
+    part_name = order.part_name or 'Не указано'
+    quantity = order.quantity
     
     order_text = (
-        f"📋 Заказ №{order['id']}\n\n"
+        f"📋 Заказ №{order.id}\n\n"
         f"📅 Дата создания: {html.escape(str(created_at))}\n"
         f"⚙️ Тип: {html.escape(order_type_name)}\n"
         f"📦 Название детали: {html.escape(str(part_name))}\n"
@@ -984,14 +1039,14 @@ async def show_user_archived_order_detail(callback: CallbackQuery):
         f"<b>Материал:</b>\n{html.escape(str(material_name))}"
     )
     
-    if order.get('photo_caption'):
-        order_text += f"\n\n📝 Подпись к фото: {html.escape(str(order['photo_caption']))}"
+    if order.photo_caption:
+        order_text += f"\n\n📝 Подпись к фото: {html.escape(str(order.photo_caption))}"
     
-    if order.get('comment'):
-        order_text += f"\n\n<b>Комментарий:</b>\n{html.escape(str(order['comment']))}"
+    if order.comment:
+        order_text += f"\n\n<b>Комментарий:</b>\n{html.escape(str(order.comment))}"
     
-    if order.get('rejection_reason'):
-        order_text += f"\n\n❌ Причина отклонения: {html.escape(str(order['rejection_reason']))}"
+    if order.rejection_reason:
+        order_text += f"\n\n❌ Причина отклонения: {html.escape(str(order.rejection_reason))}"
     
     keyboard = keyboards.get_order_detail_keyboard(
         order_id,
@@ -1001,7 +1056,7 @@ async def show_user_archived_order_detail(callback: CallbackQuery):
         extra_buttons=[("⬅️ К архиву", f"user_archived_orders:{page}")] + (extra_buttons or [])
     )
     
-    photo_path = order.get('photo_path')
+    photo_path = order.photo_path
     if photo_path and Path(photo_path).exists():
         try:
             photo_file = FSInputFile(photo_path)
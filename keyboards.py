@@ -1,12 +1,74 @@
 """
 Модуль для создания клавиатур бота
 """
+import functools
+
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 
 import config
+from cache import LRUCache
+from callback_data import (
+    AdminBackToOrdersCallback,
+    AdminOrderCallback,
+    AdminOrdersCallback,
+    AdminOrdersPageCallback,
+    SetStatusCallback,
+)
+from records import OrderListItem
+
+
+# Максимальное количество закешированных клавиатур на одну функцию
+KEYBOARD_CACHE_SIZE = 256
+
+# Кеши клавиатур: имя функции -> (группа, кеш)
+_keyboard_caches: dict[str, tuple[str, LRUCache]] = {}
+
+
+def _freeze(value):
+    """Привести аргументы (списки, словари) к хешируемому виду для ключа кеша"""
+    if isinstance(value, dict):
+        return tuple((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _cached_keyboard(group: str = "static", maxsize: int = KEYBOARD_CACHE_SIZE):
+    """Мемоизировать готовую разметку клавиатуры по значениям аргументов
+
+    Разметка отдается общей для всех вызовов, поэтому изменять ее нельзя.
+    """
+    def decorator(func):
+        cache = LRUCache(maxsize)
+        _keyboard_caches[func.__name__] = (group, cache)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (_freeze(args), _freeze(kwargs))
+            markup = cache.get(key)
+            if markup is None:
+                markup = func(*args, **kwargs)
+                cache.set(key, markup)
+            return markup
+
+        return wrapper
+    return decorator
+
+
+def invalidate_materials_keyboards():
+    """Сбросить закешированные клавиатуры со списками материалов"""
+    for group, cache in _keyboard_caches.values():
+        if group == "materials":
+            cache.clear()
+
+
+def get_keyboard_cache_stats() -> dict[str, dict]:
+    """Статистика попаданий в кеш клавиатур по функциям"""
+    return {name: cache.stats() for name, (_, cache) in _keyboard_caches.items()}
 
 
+@_cached_keyboard()
 def get_main_menu_keyboard() -> ReplyKeyboardMarkup:
     """Главное меню для пользователей"""
     builder = ReplyKeyboardBuilder()
@@ -16,6 +78,7 @@ def get_main_menu_keyboard() -> ReplyKeyboardMarkup:
     return builder.as_markup(resize_keyboard=True)
 
 
+@_cached_keyboard()
 def get_admin_menu_keyboard() -> ReplyKeyboardMarkup:
     """Главное меню для администраторов"""
     builder = ReplyKeyboardBuilder()
@@ -27,6 +90,7 @@ def get_admin_menu_keyboard() -> ReplyKeyboardMarkup:
     return builder.as_markup(resize_keyboard=True)
 
 
+@_cached_keyboard()
 def get_admin_main_keyboard(orders_enabled: bool = True) -> InlineKeyboardMarkup:
     """Главное меню админ-панели"""
     builder = InlineKeyboardBuilder()
@@ -48,6 +112,7 @@ def get_admin_new_order_keyboard(order_id: int) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@_cached_keyboard()
 def get_broadcast_cancel_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура для отмены или выхода из режима рассылки"""
     builder = InlineKeyboardBuilder()
@@ -56,6 +121,7 @@ def get_broadcast_cancel_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@_cached_keyboard()
 def get_order_type_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура выбора типа заказа для пользователя"""
     builder = InlineKeyboardBuilder()
@@ -65,6 +131,7 @@ def get_order_type_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@_cached_keyboard()
 def get_quantity_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура выбора количества деталей"""
     builder = InlineKeyboardBuilder()
@@ -76,6 +143,7 @@ def get_quantity_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@_cached_keyboard()
 def get_admin_order_types_keyboard(order_stats: dict, archived_counts: dict) -> InlineKeyboardMarkup:
     """Клавиатура выбора типа заказов для админ-панели"""
     builder = InlineKeyboardBuilder()
@@ -91,6 +159,7 @@ def get_admin_order_types_keyboard(order_stats: dict, archived_counts: dict) ->
     return builder.as_markup()
 
 
+@_cached_keyboard()
 def get_admin_orders_keyboard(stats: dict, archived_count: int, order_type: str) -> InlineKeyboardMarkup:
     """Клавиатура для выбора раздела заказов внутри конкретного типа"""
     builder = InlineKeyboardBuilder()
@@ -107,23 +176,23 @@ def get_admin_orders_keyboard(stats: dict, archived_count: int, order_type: str)
 
     builder.add(InlineKeyboardButton(
         text=f"Все заказы ({all_count} шт)" if all_count > 0 else "Все заказы",
-        callback_data=f"admin_orders:{order_type}:all"
+        callback_data=AdminOrdersCallback(order_type=order_type, status="all").pack()
     ))
     builder.add(InlineKeyboardButton(
         text=f"В ожидании ({pending_count} шт)" if pending_count > 0 else "В ожидании",
-        callback_data=f"admin_orders:{order_type}:pending"
+        callback_data=AdminOrdersCallback(order_type=order_type, status="pending").pack()
     ))
     builder.add(InlineKeyboardButton(
         text=f"В работе ({in_progress_count} шт)" if in_progress_count > 0 else "В работе",
-        callback_data=f"admin_orders:{order_type}:in_progress"
+        callback_data=AdminOrdersCallback(order_type=order_type, status="in_progress").pack()
     ))
     builder.add(InlineKeyboardButton(
         text=f"Готов ({ready_count} шт)" if ready_count > 0 else "Готов",
-        callback_data=f"admin_orders:{order_type}:ready"
+        callback_data=AdminOrdersCallback(order_type=order_type, status="ready").pack()
     ))
     builder.add(InlineKeyboardButton(
         text=f"📦 Архив ({archived_count} шт)" if archived_count > 0 else "📦 Архив",
-        callback_data=f"admin_orders:{order_type}:archived"
+        callback_data=AdminOrdersCallback(order_type=order_type, status="archived").pack()
     ))
     builder.add(InlineKeyboardButton(text="⬅️ К типам заказов", callback_data="admin_back_to_order_types"))
     builder.add(InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_back_to_main"))
@@ -132,7 +201,7 @@ def get_admin_orders_keyboard(stats: dict, archived_count: int, order_type: str)
 
 
 def get_orders_list_keyboard(
-    orders: list,
+    orders: list[OrderListItem],
     prefix: str = "order",
     status_code: str | None = None,
     current_page: int = 0,
@@ -147,12 +216,14 @@ def get_orders_list_keyboard(
     builder = InlineKeyboardBuilder()
 
     for order in orders:
-        order_id = order["id"]
-        status_name = order.get("status_name", "Без статуса")
+        order_id = order.id
+        status_name = order.status_name
         text = f"Заказ №{order_id} ({status_name})"
 
         if prefix == "admin_order":
-            callback_data = f"admin_order:{order_type}:{status_code}:{order_id}:{current_page}"
+            callback_data = AdminOrderCallback(
+                order_type=order_type, status=status_code, order_id=order_id, page=current_page
+            ).pack()
         elif prefix == "user_archived_order":
             callback_data = f"user_archived_order:{order_id}:{current_page}"
         else:
@@ -166,7 +237,9 @@ def get_orders_list_keyboard(
 
         if current_page > 0:
             if prefix == "admin_order":
-                callback_data = f"admin_orders_page:{order_type}:{status_code}:{current_page - 1}"
+                callback_data = AdminOrdersPageCallback(
+                    order_type=order_type, status=status_code, page=current_page - 1
+                ).pack()
             elif prefix == "user_archived_order":
                 callback_data = f"user_archived_orders_page:{current_page - 1}"
             else:
@@ -182,7 +255,9 @@ def get_orders_list_keyboard(
 
         if current_page < total_pages - 1:
             if prefix == "admin_order":
-                callback_data = f"admin_orders_page:{order_type}:{status_code}:{current_page + 1}"
+                callback_data = AdminOrdersPageCallback(
+                    order_type=order_type, status=status_code, page=current_page + 1
+                ).pack()
             elif prefix == "user_archived_order":
                 callback_data = f"user_archived_orders_page:{current_page + 1}"
             else:
@@ -235,6 +310,7 @@ def get_orders_list_keyboard(
     return builder.as_markup()
 
 
+@_cached_keyboard()
 def get_order_detail_keyboard(
     order_id: int,
     current_status: str,
@@ -258,10 +334,12 @@ def get_order_detail_keyboard(
                 if order_type:
                     builder.row(InlineKeyboardButton(
                         text="⬅️ Назад к списку",
-                        callback_data=f"admin_back_to_orders:{order_type}:{back_status}:{page_token}"
+                        callback_data=AdminBackToOrdersCallback(
+                            order_type=order_type, status=back_status, page=page_token
+                        ).pack()
                     ))
                 else:
-                    builder.row(InlineKeyboardButton(text="⬅️ Назад к списку", callback_data="admin_back_to_orders"))
+                    builder.row(InlineKeyboardButton(text="⬅️ Назад к списку", callback_data=AdminBackToOrdersCallback().pack()))
         # Для пользователей не добавляем кнопку "Назад" в архивных заказах
 
         if extra_buttons:
@@ -277,17 +355,17 @@ def get_order_detail_keyboard(
             if order_type and show_list_back:
                 reject_callback = f"reject_order:{order_id}:{order_type}:{back_status}:{page_token}"
             builder.row(
-                InlineKeyboardButton(text="Принять в работу", callback_data=f"set_status:{order_id}:in_progress"),
+                InlineKeyboardButton(text="Принять в работу", callback_data=SetStatusCallback(order_id=order_id, status="in_progress").pack()),
                 InlineKeyboardButton(text="Отклонить", callback_data=reject_callback)
             )
         elif current_status == "in_progress":
             builder.row(
-                InlineKeyboardButton(text="Готов", callback_data=f"set_status:{order_id}:ready"),
-                InlineKeyboardButton(text="В ожидании", callback_data=f"set_status:{order_id}:pending")
+                InlineKeyboardButton(text="Готов", callback_data=SetStatusCallback(order_id=order_id, status="ready").pack()),
+                InlineKeyboardButton(text="В ожидании", callback_data=SetStatusCallback(order_id=order_id, status="pending").pack())
             )
         elif current_status == "ready":
             builder.row(
-                InlineKeyboardButton(text="В работу", callback_data=f"set_status:{order_id}:in_progress"),
+                InlineKeyboardButton(text="В работу", callback_data=SetStatusCallback(order_id=order_id, status="in_progress").pack()),
                 InlineKeyboardButton(text="✅ Забрал", callback_data=f"admin_picked_up:{order_id}")
             )
 
@@ -295,10 +373,12 @@ def get_order_detail_keyboard(
             if order_type:
                 builder.row(InlineKeyboardButton(
                     text="⬅️ Назад к списку",
-                    callback_data=f"admin_back_to_orders:{order_type}:{back_status}:{page_token}"
+                    callback_data=AdminBackToOrdersCallback(
+                        order_type=order_type, status=back_status, page=page_token
+                    ).pack()
                 ))
             else:
-                builder.row(InlineKeyboardButton(text="⬅️ Назад к списку", callback_data="admin_back_to_orders"))
+                builder.row(InlineKeyboardButton(text="⬅️ Назад к списку", callback_data=AdminBackToOrdersCallback().pack()))
     else:
         # Для пользователей добавляем кнопки в зависимости от статуса
         if current_status == "pending":
@@ -314,6 +394,7 @@ def get_order_detail_keyboard(
     return builder.as_markup()
 
 
+@_cached_keyboard("materials")
 def get_materials_keyboard(materials: list) -> InlineKeyboardMarkup:
     """Клавиатура для выбора материала"""
     builder = InlineKeyboardBuilder()
@@ -326,6 +407,7 @@ def get_materials_keyboard(materials: list) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@_cached_keyboard()
 def get_skip_comment_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура для пропуска комментария"""
     builder = InlineKeyboardBuilder()
@@ -334,6 +416,7 @@ def get_skip_comment_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@_cached_keyboard()
 def get_confirm_order_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура для подтверждения заказа"""
     builder = InlineKeyboardBuilder()
@@ -343,6 +426,7 @@ def get_confirm_order_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@_cached_keyboard()
 def get_admin_materials_type_keyboard(material_counts: dict) -> InlineKeyboardMarkup:
     """Клавиатура выбора типа материалов"""
     builder = InlineKeyboardBuilder()
@@ -362,6 +446,7 @@ def get_admin_materials_type_keyboard(material_counts: dict) -> InlineKeyboardMa
     return builder.as_markup()
 
 
+@_cached_keyboard()
 def get_manage_materials_keyboard(material_type: str) -> InlineKeyboardMarkup:
     """Клавиатура управления материалами для выбранного типа"""
     builder = InlineKeyboardBuilder()
@@ -374,6 +459,7 @@ def get_manage_materials_keyboard(material_type: str) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@_cached_keyboard("materials")
 def get_admin_orders_materials_keyboard(materials: list, order_type: str) -> InlineKeyboardMarkup:
     """Клавиатура выбора материала для фильтрации заказов"""
     builder = InlineKeyboardBuilder()
@@ -398,6 +484,7 @@ def get_admin_orders_materials_keyboard(materials: list, order_type: str) -> Inl
     return builder.as_markup()
 
 
+@_cached_keyboard("materials")
 def get_delete_materials_keyboard(materials: list, material_type: str) -> InlineKeyboardMarkup:
     """Клавиатура для удаления материалов выбранного типа"""
     builder = InlineKeyboardBuilder()
@@ -411,6 +498,7 @@ def get_delete_materials_keyboard(materials: list, material_type: str) -> Inline
     return builder.as_markup()
 
 
+@_cached_keyboard("materials")
 def get_restore_materials_keyboard(materials: list, material_type: str) -> InlineKeyboardMarkup:
     """Клавиатура для восстановления материалов выбранного типа"""
     builder = InlineKeyboardBuilder()
@@ -448,6 +536,7 @@ def get_rejection_templates_keyboard(templates: list, order_id: int, order_type:
     return builder.as_markup()
 
 
+@_cached_keyboard()
 def get_rejection_template_management_keyboard(order_type: str) -> InlineKeyboardMarkup:
     """Клавиатура управления шаблонами отклонения для типа заказа"""
     builder = InlineKeyboardBuilder()
@@ -484,6 +573,7 @@ def get_delete_rejection_templates_keyboard(templates: list, order_type: str) ->
     return builder.as_markup()
 
 
+@_cached_keyboard()
 def get_rejection_template_type_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура выбора типа заказа для управления шаблонами отклонения"""
     builder = InlineKeyboardBuilder()
@@ -497,6 +587,7 @@ def get_rejection_template_type_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@_cached_keyboard()
 def get_rejected_order_notification_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура для уведомления об отклонении заказа"""
     # Клавиатура без кнопок - пользователь может использовать команду "Мои заказы" из меню
@@ -3,14 +3,26 @@
 """
 import asyncio
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.fsm.storage.memory import MemoryStorage
 from loguru import logger
 import sys
 
 import config
 import database
+import slow_queries
+import time_buckets
 from handlers import user_handlers, admin_handlers
-from utils import send_reminder_about_ready_order
+from metrics import (
+    ApiLatencyMiddleware,
+    HandlerLatencyMiddleware,
+    UpdateLatencyMiddleware,
+    start_metrics_server,
+)
+from middlewares import CallbackDispatchMiddleware, RoleMiddleware
+from recorder import UpdateRecorderMiddleware
+from utils import send_reminder_about_ready_order, shutdown_preview_executor
 from pathlib import Path
 
 
@@ -22,15 +34,42 @@ logger.remove()
 logger.add(
     sys.stdout,
     format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan> - <level>{message}</level>",
-    level="INFO"
+    level="INFO",
+    filter=lambda record: "slow_query" not in record["extra"]
 )
 logger.add(
     "logs/bot_{time:YYYY-MM-DD}.log",
     rotation="00:00",
     retention="30 days",
     format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function} - {message}",
-    level="DEBUG"
+    level="DEBUG",
+    filter=lambda record: "slow_query" not in record["extra"]
 )
+# Отдельный журнал медленных SQL-запросов: файл создается, только если трассировка включена
+if config.SLOW_QUERY_MS > 0:
+    logger.add(
+        slow_queries.SLOW_QUERY_LOG_PATH,
+        rotation="10 MB",
+        retention="30 days",
+        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {message}",
+        level="DEBUG",
+        filter=lambda record: "slow_query" in record["extra"]
+    )
+
+
+def create_dispatcher() -> Dispatcher:
+    """Диспетчер с роутерами и middleware бота (используется также bench/replay.py)"""
+    dp = Dispatcher(storage=MemoryStorage())
+    
+    # Регистрация роутеров
+    dp.include_router(user_handlers.router)
+    dp.include_router(admin_handlers.router)
+    dp.update.outer_middleware(UpdateLatencyMiddleware())
+    dp.update.outer_middleware(RoleMiddleware())
+    dp.message.middleware(HandlerLatencyMiddleware())
+    dp.callback_query.middleware(HandlerLatencyMiddleware())
+    dp.callback_query.outer_middleware(CallbackDispatchMiddleware(dp))
+    return dp
 
 
 async def main():
@@ -41,16 +80,25 @@ async def main():
         return
     
     # Инициализация бота и диспетчера
-    bot = Bot(token=config.BOT_TOKEN)
-    dp = Dispatcher(storage=MemoryStorage())
+    session = None
+    if config.TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.TELEGRAM_API_URL))
+        logger.info(f"Bot API: {config.TELEGRAM_API_URL}")
+    bot = Bot(token=config.BOT_TOKEN, session=session)
+    bot.session.middleware(ApiLatencyMiddleware())
+    dp = create_dispatcher()
     
-    # Регистрация роутеров
-    dp.include_router(user_handlers.router)
-    dp.include_router(admin_handlers.router)
+    # Запись обновлений для воспроизведения нагрузки (после RoleMiddleware — нужна роль)
+    update_recorder = None
+    if config.RECORD_UPDATES:
+        update_recorder = UpdateRecorderMiddleware(config.RECORDINGS_DIR)
+        dp.update.outer_middleware(update_recorder)
     
     # Инициализация базы данных
     await database.db.init_db()
     logger.info("База данных инициализирована")
+    # Индекс количества заказов загружается (или пересобирается) в фоне до первого запроса
+    time_buckets_task = asyncio.create_task(time_buckets.index.refresh())
     
     # Проверка администраторов
     if not config.ADMIN_IDS:
@@ -58,6 +106,14 @@ async def main():
     else:
         logger.info(f"Зарегистрировано администраторов: {len(config.ADMIN_IDS)}")
     
+    # HTTP-эндпоинт метрик Prometheus
+    metrics_runner = None
+    if config.METRICS_PORT:
+        try:
+            metrics_runner = await start_metrics_server(config.METRICS_HOST, config.METRICS_PORT)
+        except OSError as e:
+            logger.warning(f"Не удалось запустить сервер метрик на порту {config.METRICS_PORT}: {e}")
+    
     logger.info("Бот запущен и готов к работе")
     
     # Запускаем фоновую задачу для отправки напоминаний
@@ -100,6 +156,14 @@ async def main():
             await reminder_task_handle
         except asyncio.CancelledError:
             pass
+        shutdown_preview_executor()
+        slow_queries.log_statement_stats()
+        time_buckets_task.cancel()
+        time_buckets.index.save()
+        if update_recorder is not None:
+            update_recorder.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
         await bot.session.close()
 
 
@@ -0,0 +1,202 @@
+"""
+Обработка треугольных сеток: упрощение (кластеризация вершин) и точные метрики
+"""
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+
+import numpy as np
+from loguru import logger
+
+import config
+
+
+# Сколько треугольников обрабатывать за один шаг потокового прохода
+METRICS_CHUNK_TRIANGLES = 262_144
+
+# Максимум итераций подбора шага сетки под целевое число треугольников
+_MAX_RESOLUTION_ITERATIONS = 6
+
+
+ChunkSource = Callable[[], Iterable[np.ndarray]]
+
+
+def iter_triangle_chunks(triangles: np.ndarray, chunk_size: int = METRICS_CHUNK_TRIANGLES) -> Iterable[np.ndarray]:
+    """Разбить массив треугольников (n, 3, 3) на последовательные блоки"""
+    for start in range(0, len(triangles), chunk_size):
+        yield triangles[start:start + chunk_size]
+
+
+def _as_chunk_source(source: Union[np.ndarray, ChunkSource]) -> ChunkSource:
+    """Привести массив или фабрику блоков к фабрике блоков (для повторных проходов)"""
+    if isinstance(source, np.ndarray):
+        return lambda: iter_triangle_chunks(source)
+    return source
+
+
+def _bounds(chunk_source: ChunkSource) -> Tuple[np.ndarray, float]:
+    """Нижний угол и наибольший размер габаритного box за один потоковый проход"""
+    lo = np.full(3, np.inf)
+    hi = np.full(3, -np.inf)
+    for chunk in chunk_source():
+        if len(chunk):
+            points = chunk.reshape(-1, 3)
+            lo = np.minimum(lo, points.min(axis=0))
+            hi = np.maximum(hi, points.max(axis=0))
+    if not np.isfinite(lo).all():
+        return np.zeros(3), 1.0
+    return lo, float((hi - lo).max()) or 1.0
+
+
+def _unique_faces(faces: np.ndarray) -> np.ndarray:
+    """Убрать повторяющиеся грани без учета порядка вершин, сохранив ориентацию первой"""
+    if len(faces) == 0:
+        return faces
+    _, first = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+    return faces[np.sort(first)]
+
+
+def cluster_vertices(
+    source: Union[np.ndarray, ChunkSource],
+    resolution: int,
+    bounds: Optional[Tuple[np.ndarray, float]] = None
+) -> np.ndarray:
+    """Упростить сетку кластеризацией вершин на равномерной решетке resolution^3
+
+    Все вершины, попавшие в одну ячейку, сливаются в их среднюю точку;
+    вырожденные и повторяющиеся треугольники отбрасываются. Сетка читается
+    блоками, поэтому память ограничена размером блока и размером результата.
+    """
+    chunk_source = _as_chunk_source(source)
+    lo, extent = bounds if bounds is not None else _bounds(chunk_source)
+    cell_size = extent / resolution
+
+    cell_keys = np.empty(0, dtype=np.int64)
+    cell_sums = np.empty((0, 3), dtype=np.float64)
+    cell_counts = np.empty(0, dtype=np.float64)
+    face_keys = np.empty((0, 3), dtype=np.int64)
+
+    for chunk in chunk_source():
+        if len(chunk) == 0:
+            continue
+        vertices = chunk.reshape(-1, 3).astype(np.float64)
+        cells = np.floor((vertices - lo) / cell_size).astype(np.int64)
+        np.clip(cells, 0, resolution - 1, out=cells)
+        keys = (cells[:, 0] * resolution + cells[:, 1]) * resolution + cells[:, 2]
+
+        # Накопление сумм координат по ячейкам (слияние с уже накопленными)
+        merged_keys, inverse = np.unique(np.concatenate([cell_keys, keys]), return_inverse=True)
+        inverse = inverse.reshape(-1)
+        weights = np.concatenate([cell_sums, vertices])
+        cell_sums = np.stack(
+            [np.bincount(inverse, weights=weights[:, axis], minlength=len(merged_keys)) for axis in range(3)],
+            axis=1
+        )
+        cell_counts = np.bincount(
+            inverse,
+            weights=np.concatenate([cell_counts, np.ones(len(keys))]),
+            minlength=len(merged_keys)
+        )
+        cell_keys = merged_keys
+
+        faces = keys.reshape(-1, 3)
+        non_degenerate = (
+            (faces[:, 0] != faces[:, 1])
+            & (faces[:, 1] != faces[:, 2])
+            & (faces[:, 0] != faces[:, 2])
+        )
+        face_keys = _unique_faces(np.concatenate([face_keys, faces[non_degenerate]]))
+
+    if len(face_keys) == 0:
+        return np.empty((0, 3, 3), dtype=np.float32)
+
+    representatives = cell_sums / cell_counts[:, None]
+    faces = np.searchsorted(cell_keys, face_keys)
+    return representatives[faces].astype(np.float32)
+
+
+def decimate(source: Union[np.ndarray, ChunkSource], target_triangles: int) -> np.ndarray:
+    """Упростить сетку (массив или фабрику блоков) примерно до target_triangles треугольников"""
+    if isinstance(source, np.ndarray) and len(source) <= target_triangles:
+        return source
+
+    chunk_source = _as_chunk_source(source)
+    bounds = _bounds(chunk_source)
+
+    # Число треугольников на поверхности растет примерно как квадрат разрешения
+    resolution = max(8, int(np.sqrt(target_triangles / 2.0)))
+    result = cluster_vertices(chunk_source, resolution, bounds)
+    for _ in range(_MAX_RESOLUTION_ITERATIONS):
+        if len(result) <= target_triangles * 1.1 or resolution <= 8:
+            break
+        resolution = max(8, int(resolution * np.sqrt(target_triangles / len(result)) * 0.95))
+        result = cluster_vertices(chunk_source, resolution, bounds)
+    return result
+
+
+def _decimated_cache_path(content_hash: str, target_triangles: int) -> Path:
+    return config.DECIMATED_MODELS_DIR / f"{content_hash}_{target_triangles}.npy"
+
+
+def get_decimated_mesh(
+    source: Union[np.ndarray, ChunkSource],
+    content_hash: str,
+    target_triangles: int
+) -> np.ndarray:
+    """Получить упрощенную сетку из дискового кеша или построить и сохранить ее
+
+    source — массив треугольников или фабрика потоковых блоков; при попадании
+    в кеш исходная сетка не читается.
+    """
+    cache_path = _decimated_cache_path(content_hash, target_triangles)
+    if cache_path.exists():
+        try:
+            return np.load(cache_path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Поврежден кеш упрощенной сетки {cache_path}: {e}")
+
+    reduced = decimate(source, target_triangles)
+
+    tmp_path = cache_path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as file:
+        np.save(file, reduced)
+    tmp_path.replace(cache_path)
+    logger.info(f"Построена упрощенная сетка {content_hash[:12]}: {len(reduced)} треугольников")
+    return reduced
+
+
+def compute_mesh_metrics(chunks: Iterable[np.ndarray]) -> Dict[str, float]:
+    """Точные метрики полной сетки за один потоковый проход по блокам треугольников
+
+    Возвращает число треугольников, габариты, площадь поверхности и объем
+    (объем считается по теореме о дивергенции и корректен для замкнутых сеток).
+    """
+    triangle_count = 0
+    area = 0.0
+    signed_volume = 0.0
+    lo = np.full(3, np.inf)
+    hi = np.full(3, -np.inf)
+
+    for chunk in chunks:
+        if len(chunk) == 0:
+            continue
+        chunk = chunk.astype(np.float64, copy=False)
+        a, b, c = chunk[:, 0], chunk[:, 1], chunk[:, 2]
+        cross = np.cross(b - a, c - a)
+        area += 0.5 * float(np.linalg.norm(cross, axis=1).sum())
+        signed_volume += float(np.einsum("ij,ij->i", a, np.cross(b, c)).sum()) / 6.0
+        points = chunk.reshape(-1, 3)
+        lo = np.minimum(lo, points.min(axis=0))
+        hi = np.maximum(hi, points.max(axis=0))
+        triangle_count += len(chunk)
+
+    if triangle_count == 0:
+        lo = hi = np.zeros(3)
+    size = hi - lo
+    return {
+        "triangles": triangle_count,
+        "size_x": float(size[0]),
+        "size_y": float(size[1]),
+        "size_z": float(size[2]),
+        "surface_area": area,
+        "volume": abs(signed_volume),
+    }
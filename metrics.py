@@ -0,0 +1,285 @@
+"""
+Метрики производительности: гистограммы задержек и экспорт в формате Prometheus
+"""
+import bisect
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.filters.command import CommandObject
+from aiogram.methods import Response, TelegramMethod
+from aiogram.types import CallbackQuery, TelegramObject
+from aiohttp import web
+from loguru import logger
+
+from middlewares import callback_namespace
+
+
+# Границы корзин гистограмм (секунды)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Series:
+    """Значения гистограммы для одного набора меток"""
+
+    __slots__ = ("bucket_counts", "sum", "count")
+
+    def __init__(self, bucket_count: int):
+        # Последняя корзина — +Inf
+        self.bucket_counts = [0] * (bucket_count + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами и метками (аналог prometheus_client.Histogram)"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], _Series] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            if len(label_values) != len(self.label_names):
+                raise ValueError(f"{self.name}: ожидаются метки {self.label_names}, получено {label_values}")
+            series = self._series[label_values] = _Series(len(self.buckets))
+        series.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        series.sum += value
+        series.count += 1
+
+    @contextmanager
+    def time(self, *label_values: str) -> Iterator[None]:
+        """Измерить время выполнения блока"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def quantile(self, q: float, series: _Series) -> float:
+        """Оценка квантиля по корзинам (линейная интерполяция, как histogram_quantile)"""
+        if series.count == 0:
+            return 0.0
+        rank = q * series.count
+        cumulative = 0
+        lower = 0.0
+        for index, bucket_count in enumerate(series.bucket_counts):
+            upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+            if cumulative + bucket_count >= rank and bucket_count:
+                if index == len(self.buckets):
+                    return upper
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+            lower = upper
+        return self.buckets[-1]
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Сводка по каждому набору меток: количество, среднее, p50, p95"""
+        result = []
+        for label_values, series in self._series.items():
+            result.append({
+                "labels": dict(zip(self.label_names, label_values)),
+                "count": series.count,
+                "sum": series.sum,
+                "avg": series.sum / series.count if series.count else 0.0,
+                "p50": self.quantile(0.5, series),
+                "p95": self.quantile(0.95, series),
+            })
+        return result
+
+    def render(self) -> List[str]:
+        """Строки в текстовом формате Prometheus"""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for label_values, series in sorted(self._series.items()):
+            labels = [f'{name}="{_escape_label(value)}"' for name, value in zip(self.label_names, label_values)]
+            cumulative = 0
+            for index, bucket_count in enumerate(series.bucket_counts):
+                cumulative += bucket_count
+                le = _format_float(self.buckets[index]) if index < len(self.buckets) else "+Inf"
+                bucket_labels = ",".join(labels + [f'le="{le}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            suffix = "{" + ",".join(labels) + "}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {_format_float(series.sum)}")
+            lines.append(f"{self.name}_count{suffix} {series.count}")
+        return lines
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_float(value: float) -> str:
+    return repr(float(value))
+
+
+_registry: Dict[str, Histogram] = {}
+
+
+def histogram(name: str, documentation: str, label_names: Sequence[str] = ()) -> Histogram:
+    """Получить гистограмму из реестра, создав ее при первом обращении"""
+    existing = _registry.get(name)
+    if existing is None:
+        existing = _registry[name] = Histogram(name, documentation, label_names)
+    return existing
+
+
+def render_prometheus() -> str:
+    """Все метрики реестра в текстовом формате Prometheus"""
+    lines: List[str] = []
+    for name in sorted(_registry):
+        lines.extend(_registry[name].render())
+    return "\n".join(lines) + "\n"
+
+
+def get_histogram(name: str) -> Optional[Histogram]:
+    return _registry.get(name)
+
+
+UPDATE_DURATION = histogram(
+    "bot_update_duration_seconds",
+    "Полное время обработки обновления Telegram",
+    ("event_type",),
+)
+HANDLER_DURATION = histogram(
+    "bot_handler_duration_seconds",
+    "Время работы обработчика (по префиксу callback data или команде)",
+    ("route", "status"),
+)
+DB_DURATION = histogram(
+    "bot_db_method_duration_seconds",
+    "Время выполнения методов Database",
+    ("method",),
+)
+API_DURATION = histogram(
+    "bot_api_request_duration_seconds",
+    "Время запросов к Telegram Bot API",
+    ("method", "status"),
+)
+
+
+def event_route(event: TelegramObject, data: Dict[str, Any]) -> str:
+    """Метка маршрута: пространство имен callback data, команда или имя обработчика"""
+    if isinstance(event, CallbackQuery):
+        namespace = callback_namespace(event.data)
+        if namespace:
+            return namespace
+    command: Optional[CommandObject] = data.get("command")
+    if command is not None:
+        return f"/{command.command}"
+    handler = data.get("handler")
+    if handler is not None:
+        return getattr(handler.callback, "__name__", "handler")
+    return type(event).__name__
+
+
+class UpdateLatencyMiddleware(BaseMiddleware):
+    """Outer middleware на dp.update: полное время обработки обновления по типу события"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        with UPDATE_DURATION.time(getattr(event, "event_type", None) or "unknown"):
+            return await handler(event, data)
+
+
+class HandlerLatencyMiddleware(BaseMiddleware):
+    """Внутренний middleware: время работы выбранного обработчика
+
+    Регистрируется на наблюдателях диспетчера (dp.message, dp.callback_query)
+    и поэтому действует на обработчики всех вложенных роутеров.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        route = event_route(event, data)
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return await handler(event, data)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            HANDLER_DURATION.observe(time.perf_counter() - started, route, status)
+
+
+class ApiLatencyMiddleware(BaseRequestMiddleware):
+    """Middleware сессии Bot: время запросов к Bot API по имени метода"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[Any],
+        bot: Any,
+        method: TelegramMethod[Any],
+    ) -> Response[Any]:
+        api_method = getattr(method, "__api_method__", type(method).__name__)
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            API_DURATION.observe(time.perf_counter() - started, api_method, status)
+
+
+def timed_methods(target: Histogram) -> Callable[[type], type]:
+    """Декоратор класса: измерять время всех публичных async-методов"""
+    def decorate(cls: type) -> type:
+        for name, method in list(vars(cls).items()):
+            if name.startswith("_") or not inspect.iscoroutinefunction(method):
+                continue
+
+            def make_wrapper(method_name: str, func: Callable[..., Awaitable[Any]]):
+                @functools.wraps(func)
+                async def wrapper(*args: Any, **kwargs: Any) -> Any:
+                    started = time.perf_counter()
+                    try:
+                        return await func(*args, **kwargs)
+                    finally:
+                        target.observe(time.perf_counter() - started, method_name)
+                return wrapper
+
+            setattr(cls, name, make_wrapper(name, method))
+        return cls
+    return decorate
+
+
+async def _metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=render_prometheus(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Запустить HTTP-сервер с эндпоинтом /metrics"""
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
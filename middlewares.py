@@ -0,0 +1,276 @@
+"""
+Middleware диспетчера
+"""
+import bisect
+import operator
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware, Router
+from aiogram.dispatcher.event.bases import UNHANDLED, SkipHandler
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.dispatcher.flags import get_flag
+from aiogram.filters.callback_data import CallbackQueryFilter
+from aiogram.types import CallbackQuery, Message, TelegramObject, User
+from loguru import logger
+from magic_filter import MagicFilter
+from magic_filter.operations import CallOperation, ComparatorOperation, GetAttributeOperation
+
+import config
+
+
+# Разделитель пространства имен в callback data ("admin_view_from_user:42" -> "admin_view_from_user")
+CALLBACK_NAMESPACE_SEPARATOR = ":"
+
+# Роли пользователей, передаются обработчикам в data["role"]
+ROLE_ADMIN = "admin"
+ROLE_USER = "user"
+
+# Ответы на попытку доступа к админ-обработчикам (если у обработчика нет флага admin_denied)
+ADMIN_DENIED_CALLBACK_TEXT = "У вас нет доступа"
+ADMIN_DENIED_MESSAGE_TEXT = "У вас нет доступа к админ-панели."
+
+# (порядковый номер в дереве роутеров, роутер, обработчик)
+_Candidate = Tuple[int, Router, HandlerObject]
+
+
+def resolve_role(user_id: int) -> str:
+    """Роль пользователя по множеству config.ADMIN_IDS"""
+    return ROLE_ADMIN if user_id in config.ADMIN_IDS else ROLE_USER
+
+
+class RoleMiddleware(BaseMiddleware):
+    """Определяет роль пользователя один раз на обновление
+
+    Регистрируется как outer middleware на dp.update (после встроенного
+    UserContextMiddleware) и передает обработчикам role и is_admin.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        role = resolve_role(user.id) if user else ROLE_USER
+        data["role"] = role
+        data["is_admin"] = role == ROLE_ADMIN
+        return await handler(event, data)
+
+
+class AdminOnlyMiddleware(BaseMiddleware):
+    """Пропускает к обработчикам роутера только администраторов
+
+    Внутренний middleware: вызывается после фильтров, когда обработчик уже
+    выбран. Текст отказа берется из флага обработчика admin_denied (None —
+    без ответа). Если пользователь находится в состоянии FSM, оно сбрасывается.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if data.get("is_admin"):
+            return await handler(event, data)
+
+        user: Optional[User] = data.get("event_from_user")
+        logger.warning(f"Отказ в доступе к админ-обработчику пользователю {user.id if user else None}")
+
+        state = data.get("state")
+        in_state = data.get("raw_state") is not None
+        if in_state and state is not None:
+            await state.clear()
+
+        if isinstance(event, CallbackQuery):
+            text = get_flag(data, "admin_denied", default=ADMIN_DENIED_CALLBACK_TEXT)
+            if text:
+                await event.answer(text, show_alert=True)
+            else:
+                await event.answer()
+        elif isinstance(event, Message):
+            # В сценариях с состоянием по умолчанию отвечаем молча
+            text = get_flag(data, "admin_denied", default=None if in_state else ADMIN_DENIED_MESSAGE_TEXT)
+            if text:
+                await event.answer(text)
+        return None
+
+
+def callback_namespace(data: Optional[str]) -> Optional[str]:
+    """Пространство имен callback data — часть до первого ':'"""
+    if data is None:
+        return None
+    return data.partition(CALLBACK_NAMESPACE_SEPARATOR)[0]
+
+
+def _magic_filter_namespace(magic: MagicFilter) -> Optional[str]:
+    """Пространство имен для F.data == "x" и F.data.startswith("x:"), иначе None"""
+    operations = getattr(magic, "_operations", None)
+    if not operations or not isinstance(operations[0], GetAttributeOperation) or operations[0].name != "data":
+        return None
+
+    if len(operations) == 2 and isinstance(operations[1], ComparatorOperation):
+        comparison = operations[1]
+        if comparison.comparator is operator.eq and isinstance(comparison.right, str):
+            return callback_namespace(comparison.right)
+        return None
+
+    if (
+        len(operations) == 3
+        and isinstance(operations[1], GetAttributeOperation)
+        and operations[1].name == "startswith"
+        and isinstance(operations[2], CallOperation)
+        and len(operations[2].args) == 1
+        and not operations[2].kwargs
+        and isinstance(operations[2].args[0], str)
+    ):
+        prefix = operations[2].args[0]
+        # Без ':' в префиксе строка может продолжаться тем же словом ("abc" подходит и к "abcd")
+        if CALLBACK_NAMESPACE_SEPARATOR in prefix:
+            return callback_namespace(prefix)
+    return None
+
+
+def handler_namespace(handler: HandlerObject) -> Optional[str]:
+    """Пространство имен, которым ограничен обработчик, или None, если оно не определяется"""
+    for filter_object in handler.filters or ():
+        if isinstance(filter_object.callback, CallbackQueryFilter):
+            callback_data = filter_object.callback.callback_data
+            if callback_data.__separator__ == CALLBACK_NAMESPACE_SEPARATOR:
+                return callback_data.__prefix__
+        elif filter_object.magic is not None:
+            namespace = _magic_filter_namespace(filter_object.magic)
+            if namespace is not None:
+                return namespace
+    return None
+
+
+def dispatch_api_problem(root: Router) -> Optional[str]:
+    """Почему таблица диспетчеризации не может повторить обработку aiogram (None — может)
+
+    Таблица опирается на внутренние атрибуты aiogram (проверено на 3.13.1):
+    observer._handler.filters, observer._resolve_middlewares() и
+    outer_middleware.wrap_middlewares. Внутренние middleware роутеров (среди них
+    AdminOnlyMiddleware — проверка доступа) должны попадать в цепочку обработчика.
+    """
+    for name in ("check", "call"):
+        if not callable(getattr(HandlerObject, name, None)):
+            return f"нет HandlerObject.{name}"
+    for router in root.chain_tail:
+        observer = router.observers.get("callback_query")
+        if observer is None:
+            return f"у роутера {router.name} нет наблюдателя callback_query"
+        if not hasattr(getattr(observer, "_handler", None), "filters"):
+            return "нет TelegramEventObserver._handler.filters"
+        if not callable(getattr(observer, "_resolve_middlewares", None)):
+            return "нет TelegramEventObserver._resolve_middlewares"
+        if not callable(getattr(observer.outer_middleware, "wrap_middlewares", None)):
+            return "нет MiddlewareManager.wrap_middlewares"
+        resolved = observer._resolve_middlewares()
+        for parent in router.chain_head:
+            for middleware in parent.observers["callback_query"].middleware:
+                if not any(middleware is item for item in resolved):
+                    return f"внутренние middleware роутера {parent.name} не входят в цепочку роутера {router.name}"
+    return None
+
+
+class CallbackDispatchMiddleware(BaseMiddleware):
+    """Таблица диспетчеризации callback-запросов по пространству имен
+
+    Вместо последовательной проверки фильтров всех обработчиков дерева
+    роутеров проверяются только обработчики с тем же пространством имен
+    и обработчики, для которых его не удалось определить (в исходном
+    порядке регистрации). Фильтры и внутренние middleware кандидатов
+    выполняются как обычно, поэтому поведение совпадает с aiogram.
+
+    Регистрируется как outer middleware на dp.callback_query. Если в дереве
+    есть корневые фильтры callback_query или outer middleware вложенных
+    роутеров, таблица не строится и используется обычная обработка.
+    Outer middleware dp.callback_query, зарегистрированные после этого,
+    не вызываются, поэтому он должен быть последним. Если внутренние
+    атрибуты aiogram изменились (dispatch_api_problem), таблица тоже
+    отключается — при создании и еще раз при построении.
+    """
+
+    def __init__(self, root: Router):
+        self.root = root
+        self._table: Optional[Dict[str, List[_Candidate]]] = None
+        self._fallback: List[_Candidate] = []
+        self._enabled = self._check_api()
+
+    def _check_api(self) -> bool:
+        problem = dispatch_api_problem(self.root)
+        if problem is not None:
+            logger.warning(f"Таблица диспетчеризации callback отключена, обычная обработка aiogram: {problem}")
+            return False
+        return True
+
+    def _build(self) -> None:
+        """Построить таблицу по зарегистрированным обработчикам (один раз, при первом запросе)"""
+        # Роутеры могли быть добавлены после создания middleware
+        if not self._check_api():
+            self._enabled = False
+            return
+        table: Dict[str, List[_Candidate]] = {}
+        fallback: List[_Candidate] = []
+        order = 0
+        for router in self.root.chain_tail:
+            observer = router.observers["callback_query"]
+            if observer._handler.filters or (router is not self.root and observer.outer_middleware):
+                logger.warning(
+                    f"Роутер {router.name} использует outer middleware или корневые фильтры callback_query, "
+                    f"таблица диспетчеризации отключена"
+                )
+                self._enabled = False
+                return
+            for handler in observer.handlers:
+                candidate = (order, router, handler)
+                order += 1
+                namespace = handler_namespace(handler)
+                if namespace is None:
+                    fallback.append(candidate)
+                else:
+                    table.setdefault(namespace, []).append(candidate)
+
+        # Обработчики без пространства имен могут подойти к любому запросу:
+        # вставляем их в каждый список, сохраняя порядок регистрации
+        for candidates in table.values():
+            for candidate in fallback:
+                bisect.insort(candidates, candidate, key=lambda item: item[0])
+
+        self._table = table
+        self._fallback = fallback
+        logger.info(
+            f"Таблица диспетчеризации callback: пространств имен {len(table)}, "
+            f"обработчиков без пространства имен {len(fallback)}"
+        )
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if self._table is None and self._enabled:
+            self._build()
+        if not self._enabled or not isinstance(event, CallbackQuery):
+            return await handler(event, data)
+
+        candidates = self._table.get(callback_namespace(event.data), self._fallback)
+        for _, router, handler_object in candidates:
+            observer = router.observers["callback_query"]
+            kwargs = {**data, "event_router": router, "handler": handler_object}
+            result, filter_data = await handler_object.check(event, **kwargs)
+            if not result:
+                continue
+            kwargs.update(filter_data)
+            try:
+                wrapped_inner = observer.outer_middleware.wrap_middlewares(
+                    observer._resolve_middlewares(),
+                    handler_object.call,
+                )
+                return await wrapped_inner(event, kwargs)
+            except SkipHandler:
+                continue
+        return UNHANDLED
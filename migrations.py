@@ -0,0 +1,583 @@
+"""
+Версионированные миграции схемы базы данных
+
+Номер последней примененной миграции хранится в PRAGMA user_version.
+Каждая миграция выполняется один раз, в одной транзакции с записью нового
+номера; при актуальной схеме запуск ограничивается чтением user_version.
+
+Новая миграция добавляется в конец MIGRATIONS со следующим номером.
+Примененные миграции не изменяются.
+"""
+from typing import Awaitable, Callable, Dict, Sequence, Tuple
+
+import aiosqlite
+from loguru import logger
+
+
+Migration = Callable[[aiosqlite.Connection], Awaitable[None]]
+
+
+async def _table_columns(db: aiosqlite.Connection, table: str) -> set:
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in await cursor.fetchall()}
+
+
+async def _table_exists(db: aiosqlite.Connection, name: str) -> bool:
+    cursor = await db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    )
+    return await cursor.fetchone() is not None
+
+
+async def _add_missing_columns(db: aiosqlite.Connection, table: str, columns: Dict[str, str]) -> None:
+    """Добавить столбцы, которых нет в таблице (базы, созданные до появления полей)"""
+    existing = await _table_columns(db, table)
+    for name, definition in columns.items():
+        if name not in existing:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+            logger.info(f"Добавлено поле {name} в таблицу {table}")
+
+
+async def _autoincrement_sequence(db: aiosqlite.Connection, table: str) -> int:
+    """Последний выданный номер AUTOINCREMENT таблицы (sqlite_sequence), 0 — номеров не выдавалось"""
+    if not await _table_exists(db, "sqlite_sequence"):
+        return 0
+    cursor = await db.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,))
+    row = await cursor.fetchone()
+    return row[0] if row else 0
+
+
+async def _restore_autoincrement_sequence(db: aiosqlite.Connection, table: str, seq: int) -> None:
+    """Вернуть счетчик AUTOINCREMENT после пересоздания таблицы: номера удаленных строк не выдаются снова"""
+    # Пересозданная таблица начинает счетчик с наибольшего оставшегося id.
+    # В sqlite_sequence нет ограничения уникальности name, поэтому строка заменяется через DELETE
+    await db.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+    await db.execute(
+        f"INSERT INTO sqlite_sequence (name, seq) SELECT ?, MAX(?, COALESCE(MAX(id), 0)) FROM {table}",
+        (table, seq)
+    )
+
+
+async def _optional_step(db: aiosqlite.Connection, name: str, step: Migration) -> bool:
+    """Необязательный шаг миграции: при ошибке его изменения откатываются, миграция продолжается"""
+    await db.execute(f"SAVEPOINT {name}")
+    try:
+        await step(db)
+    except Exception as e:
+        await db.execute(f"ROLLBACK TO {name}")
+        await db.execute(f"RELEASE {name}")
+        logger.warning(f"Шаг миграции {name} пропущен: {e}")
+        return False
+    await db.execute(f"RELEASE {name}")
+    return True
+
+
+async def _merge_legacy_colors(db: aiosqlite.Connection) -> None:
+    """Перенос заказов со старой структуры (материал и цвет отдельно) на объединенные материалы"""
+    if 'color_id' in await _table_columns(db, "orders"):
+        cursor = await db.execute("""
+            SELECT DISTINCT o.material_id, o.color_id, m.name as material_name, c.name as color_name
+            FROM orders o
+            LEFT JOIN materials m ON o.material_id = m.id
+            LEFT JOIN colors c ON o.color_id = c.id
+            WHERE o.material_id IS NOT NULL AND o.color_id IS NOT NULL
+        """)
+        for material_id, color_id, material_name, color_name in await cursor.fetchall():
+            if not (material_name and color_name):
+                continue
+            combined_name = f"{color_name.lower()} {material_name.upper()}"
+            cursor = await db.execute("SELECT id FROM materials WHERE name = ?", (combined_name,))
+            existing = await cursor.fetchone()
+            if existing:
+                new_material_id = existing[0]
+            else:
+                cursor = await db.execute("INSERT INTO materials (name) VALUES (?)", (combined_name,))
+                new_material_id = cursor.lastrowid
+            await db.execute(
+                "UPDATE orders SET material_id = ?, color_id = NULL WHERE material_id = ? AND color_id = ?",
+                (new_material_id, material_id, color_id)
+            )
+
+        # SQLite не поддерживает DROP COLUMN напрямую: таблица пересоздается без color_id
+        await db.execute("""
+            CREATE TABLE orders_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                status_id INTEGER NOT NULL,
+                material_id INTEGER,
+                part_name TEXT,
+                photo_path TEXT,
+                model_path TEXT,
+                photo_caption TEXT,
+                original_filename TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(user_id),
+                FOREIGN KEY (status_id) REFERENCES statuses(id),
+                FOREIGN KEY (material_id) REFERENCES materials(id)
+            )
+        """)
+        await db.execute("""
+            INSERT INTO orders_new
+            (id, user_id, status_id, material_id, part_name, photo_path, model_path, photo_caption, original_filename, created_at)
+            SELECT id, user_id, status_id, material_id, part_name, photo_path, model_path, photo_caption, original_filename, created_at
+            FROM orders
+        """)
+        await db.execute("DROP TABLE orders")
+        await db.execute("ALTER TABLE orders_new RENAME TO orders")
+        logger.info("Заказы перенесены на объединенные материалы")
+
+    await db.execute("DROP TABLE IF EXISTS colors")
+
+
+async def _base_schema(db: aiosqlite.Connection) -> None:
+    """Таблицы, статусы и настройки по умолчанию; доводит до этой схемы и базы, созданные раньше"""
+    # Таблица пользователей
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            first_name TEXT NOT NULL,
+            last_name TEXT NOT NULL,
+            username TEXT,
+            registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Таблица статусов (предопределенные)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS statuses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL
+        )
+    """)
+
+    # Таблица материалов (объединенная: цвет + тип пластика)
+    # Пример: "зеленый PETG", "синий PLA"
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS materials (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            type TEXT NOT NULL DEFAULT '3d_print',
+            is_available INTEGER NOT NULL DEFAULT 1
+        )
+    """)
+
+    # Таблица настроек
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    """)
+
+    # Таблица шаблонных комментариев для отклонения заказов
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS rejection_templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_type TEXT NOT NULL,
+            text TEXT NOT NULL
+        )
+    """)
+
+    # Таблица заказов (порядок столбцов совпадает с базами, дополненными через ALTER TABLE)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            status_id INTEGER NOT NULL,
+            material_id INTEGER,
+            part_name TEXT,
+            photo_path TEXT,
+            model_path TEXT,
+            photo_caption TEXT,
+            original_filename TEXT,
+            rejection_reason TEXT,
+            last_reminder_time TIMESTAMP,
+            comment TEXT,
+            order_type TEXT NOT NULL DEFAULT '3d_print',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            quantity INTEGER NOT NULL DEFAULT 1,
+            model_hash TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(user_id),
+            FOREIGN KEY (status_id) REFERENCES statuses(id),
+            FOREIGN KEY (material_id) REFERENCES materials(id)
+        )
+    """)
+
+    # Метаданные файлов моделей (кеш разбора по хешу содержимого)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS model_metadata (
+            file_hash TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Старые базы: перенос цветов выполняется до добавления новых полей,
+    # так как таблица orders при этом пересоздается
+    await _optional_step(db, "legacy_colors", _merge_legacy_colors)
+
+    await _add_missing_columns(db, "users", {"username": "TEXT"})
+    await _add_missing_columns(db, "orders", {
+        "rejection_reason": "TEXT",
+        "last_reminder_time": "TIMESTAMP",
+        "comment": "TEXT",
+        "order_type": "TEXT NOT NULL DEFAULT '3d_print'",
+        "quantity": "INTEGER NOT NULL DEFAULT 1",
+        "model_hash": "TEXT",
+    })
+    await _add_missing_columns(db, "materials", {
+        "type": "TEXT NOT NULL DEFAULT '3d_print'",
+        "is_available": "INTEGER NOT NULL DEFAULT 1",
+    })
+
+    await db.executemany(
+        "INSERT OR IGNORE INTO statuses (code, name) VALUES (?, ?)",
+        [
+            ("pending", "В ожидании"),
+            ("in_progress", "В работе"),
+            ("ready", "Готов"),
+            ("rejected", "Отклонен"),
+            ("archived", "Архив"),
+        ]
+    )
+    await db.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('orders_enabled', '1')")
+
+
+async def _create_search_triggers(db: aiosqlite.Connection) -> None:
+    """Триггеры синхронизации orders_fts с orders и users"""
+    # rowid индекса совпадает с id заказа
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS orders_fts_insert AFTER INSERT ON orders
+        BEGIN
+            INSERT INTO orders_fts (rowid, part_name, comment, rejection_reason, original_filename,
+                                    first_name, last_name, username)
+            SELECT new.id, new.part_name, new.comment, new.rejection_reason, new.original_filename,
+                   u.first_name, u.last_name, u.username
+            FROM users u WHERE u.user_id = new.user_id;
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS orders_fts_update
+        AFTER UPDATE OF part_name, comment, rejection_reason, original_filename, user_id ON orders
+        BEGIN
+            DELETE FROM orders_fts WHERE rowid = old.id;
+            INSERT INTO orders_fts (rowid, part_name, comment, rejection_reason, original_filename,
+                                    first_name, last_name, username)
+            SELECT new.id, new.part_name, new.comment, new.rejection_reason, new.original_filename,
+                   u.first_name, u.last_name, u.username
+            FROM users u WHERE u.user_id = new.user_id;
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS orders_fts_delete AFTER DELETE ON orders
+        BEGIN
+            DELETE FROM orders_fts WHERE rowid = old.id;
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS users_fts_update
+        AFTER UPDATE OF first_name, last_name, username ON users
+        BEGIN
+            UPDATE orders_fts
+            SET first_name = new.first_name, last_name = new.last_name, username = new.username
+            WHERE rowid IN (SELECT id FROM orders WHERE user_id = new.user_id);
+        END
+    """)
+
+
+async def _create_search_index(db: aiosqlite.Connection) -> None:
+    index_exists = await _table_exists(db, "orders_fts")
+
+    await db.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts USING fts5(
+            part_name, comment, rejection_reason, original_filename,
+            first_name, last_name, username
+        )
+    """)
+
+    await _create_search_triggers(db)
+
+    if not index_exists:
+        await db.execute("""
+            INSERT INTO orders_fts (rowid, part_name, comment, rejection_reason, original_filename,
+                                    first_name, last_name, username)
+            SELECT o.id, o.part_name, o.comment, o.rejection_reason, o.original_filename,
+                   u.first_name, u.last_name, u.username
+            FROM orders o
+            JOIN users u ON o.user_id = u.user_id
+        """)
+        logger.info("Построен полнотекстовый индекс заказов")
+
+
+async def _search_index(db: aiosqlite.Connection) -> None:
+    """FTS5-индекс заказов (с данными заказчика) и триггеры синхронизации"""
+    # Без модуля fts5 в сборке SQLite бот работает, но поиск заказов по тексту недоступен;
+    # индекс строится при запуске, когда fts5 появится (ensure_search_index)
+    await _optional_step(db, "search_index", _create_search_index)
+
+
+async def _create_counter_triggers(db: aiosqlite.Connection) -> None:
+    """Триггеры обновления order_status_counters при изменении orders"""
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS orders_counters_insert AFTER INSERT ON orders
+        BEGIN
+            INSERT OR IGNORE INTO order_status_counters (order_type, status_id, count)
+            VALUES (new.order_type, new.status_id, 0);
+            UPDATE order_status_counters SET count = count + 1
+            WHERE order_type = new.order_type AND status_id = new.status_id;
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS orders_counters_delete AFTER DELETE ON orders
+        BEGIN
+            UPDATE order_status_counters SET count = count - 1
+            WHERE order_type = old.order_type AND status_id = old.status_id;
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS orders_counters_update
+        AFTER UPDATE OF status_id, order_type ON orders
+        WHEN old.status_id != new.status_id OR old.order_type != new.order_type
+        BEGIN
+            UPDATE order_status_counters SET count = count - 1
+            WHERE order_type = old.order_type AND status_id = old.status_id;
+            INSERT OR IGNORE INTO order_status_counters (order_type, status_id, count)
+            VALUES (new.order_type, new.status_id, 0);
+            UPDATE order_status_counters SET count = count + 1
+            WHERE order_type = new.order_type AND status_id = new.status_id;
+        END
+    """)
+
+
+async def _status_counters(db: aiosqlite.Connection) -> None:
+    """Таблица счетчиков заказов (тип, статус) и триггеры их обновления"""
+    counters_exist = await _table_exists(db, "order_status_counters")
+
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS order_status_counters (
+            order_type TEXT NOT NULL,
+            status_id INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (order_type, status_id)
+        )
+    """)
+    await _create_counter_triggers(db)
+
+    if not counters_exist:
+        await db.execute("""
+            INSERT INTO order_status_counters (order_type, status_id, count)
+            SELECT order_type, status_id, COUNT(*)
+            FROM orders
+            GROUP BY order_type, status_id
+        """)
+        logger.info("Построены счетчики заказов по статусам")
+
+
+def _epoch_expression(column: str) -> str:
+    """Значение столбца в секундах Unix: текст CURRENT_TIMESTAMP (UTC) переводится, число остается"""
+    return (
+        f"CASE typeof({column}) WHEN 'integer' THEN {column} "
+        f"ELSE CAST(strftime('%s', {column}) AS INTEGER) END"
+    )
+
+
+async def _epoch_timestamps(db: aiosqlite.Connection) -> None:
+    """created_at и last_reminder_time заказов в секундах Unix (UTC)"""
+    # Тип и значение по умолчанию столбца нельзя изменить через ALTER TABLE:
+    # таблица пересоздается, триггеры на orders удаляются вместе с ней и создаются заново.
+    # users_fts_update ссылается на orders, и без удаления переименование таблицы не проходит проверку схемы
+    await db.execute("DROP TRIGGER IF EXISTS users_fts_update")
+    orders_seq = await _autoincrement_sequence(db, "orders")
+    await db.execute("""
+        CREATE TABLE orders_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            status_id INTEGER NOT NULL,
+            material_id INTEGER,
+            part_name TEXT,
+            photo_path TEXT,
+            model_path TEXT,
+            photo_caption TEXT,
+            original_filename TEXT,
+            rejection_reason TEXT,
+            last_reminder_time INTEGER NOT NULL DEFAULT 0,
+            comment TEXT,
+            order_type TEXT NOT NULL DEFAULT '3d_print',
+            created_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+            quantity INTEGER NOT NULL DEFAULT 1,
+            model_hash TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(user_id),
+            FOREIGN KEY (status_id) REFERENCES statuses(id),
+            FOREIGN KEY (material_id) REFERENCES materials(id)
+        )
+    """)
+    # 0 в last_reminder_time — напоминание не отправлялось
+    await db.execute(f"""
+        INSERT INTO orders_new
+        (id, user_id, status_id, material_id, part_name, photo_path, model_path, photo_caption,
+         original_filename, rejection_reason, last_reminder_time, comment, order_type, created_at,
+         quantity, model_hash)
+        SELECT id, user_id, status_id, material_id, part_name, photo_path, model_path, photo_caption,
+               original_filename, rejection_reason,
+               COALESCE({_epoch_expression('last_reminder_time')}, 0),
+               comment, order_type,
+               COALESCE({_epoch_expression('created_at')}, 0),
+               quantity, model_hash
+        FROM orders
+    """)
+    await db.execute("DROP TABLE orders")
+    await db.execute("ALTER TABLE orders_new RENAME TO orders")
+    await _restore_autoincrement_sequence(db, "orders", orders_seq)
+
+    await _create_counter_triggers(db)
+    if await _table_exists(db, "orders_fts"):
+        await _create_search_triggers(db)
+
+    # Выбор заказов для напоминания — диапазон по индексу вместо вычисления для каждой строки
+    await db.execute("CREATE INDEX idx_orders_status_reminder ON orders (status_id, last_reminder_time)")
+
+
+async def _list_indexes(db: aiosqlite.Connection) -> None:
+    """Покрывающие индексы списков заказов (столбцы database._ORDER_LIST_COLUMNS)"""
+    # Условие, порядок created_at и part_name читаются из индекса, страница списка
+    # не обращается к строкам таблицы orders
+    await db.execute("CREATE INDEX idx_orders_user_list ON orders (user_id, status_id, created_at, part_name)")
+    await db.execute("CREATE INDEX idx_orders_status_list ON orders (status_id, order_type, created_at, part_name)")
+    await db.execute("CREATE INDEX idx_orders_type_list ON orders (order_type, created_at, status_id, part_name)")
+    await db.execute(
+        "CREATE INDEX idx_orders_material_list ON orders (material_id, order_type, created_at, status_id, part_name)"
+    )
+
+
+async def _order_events(db: aiosqlite.Connection) -> None:
+    """Журнал смены статусов заказов (только добавление) для аналитики (analytics.py, time_buckets.py)"""
+    # Тип и материал копируются в событие: история остается после удаления заказа
+    # из архива
+    await db.execute("""
+        CREATE TABLE order_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INTEGER NOT NULL,
+            status_id INTEGER NOT NULL,
+            order_type TEXT NOT NULL,
+            material_id INTEGER,
+            created_at INTEGER NOT NULL,
+            FOREIGN KEY (status_id) REFERENCES statuses(id)
+        )
+    """)
+    await db.execute("CREATE INDEX idx_order_events_time ON order_events (created_at)")
+    # Для существующих заказов известно только создание (в статусе pending) — оно и
+    # записывается, по возрастанию номера; прежние смены статусов неизвестны.
+    # Время начала журнала (order_events_started_at) отделяет записанные здесь события:
+    # интервал от такого события до следующего может включать незаписанные смены статусов
+    cursor = await db.execute("""
+        INSERT INTO order_events (order_id, status_id, order_type, material_id, created_at)
+        SELECT o.id, s.id, o.order_type, o.material_id, o.created_at
+        FROM orders o
+        JOIN statuses s ON s.code = 'pending'
+        ORDER BY o.id
+    """)
+    if cursor.rowcount > 0:
+        await db.execute(
+            "INSERT OR REPLACE INTO settings (key, value) "
+            "VALUES ('order_events_started_at', CAST(strftime('%s', 'now') AS INTEGER))"
+        )
+        logger.info(f"В журнал смены статусов записано создание {cursor.rowcount} заказов")
+    # Событие пишется триггером в той же транзакции, что и изменение заказа
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS orders_events_insert AFTER INSERT ON orders
+        BEGIN
+            INSERT INTO order_events (order_id, status_id, order_type, material_id, created_at)
+            VALUES (new.id, new.status_id, new.order_type, new.material_id, new.created_at);
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS orders_events_update AFTER UPDATE OF status_id ON orders
+        WHEN old.status_id != new.status_id
+        BEGIN
+            INSERT INTO order_events (order_id, status_id, order_type, material_id, created_at)
+            VALUES (new.id, new.status_id, new.order_type, new.material_id,
+                    CAST(strftime('%s', 'now') AS INTEGER));
+        END
+    """)
+
+
+async def _order_events_by_order(db: aiosqlite.Connection) -> None:
+    """Индекс журнала по заказу: первое событие заказа (его создание) находится без просмотра журнала"""
+    await db.execute("CREATE INDEX idx_order_events_order ON order_events (order_id, id)")
+
+
+# (номер, описание, функция); номер записывается в PRAGMA user_version
+MIGRATIONS: Sequence[Tuple[int, str, Migration]] = (
+    (1, "базовая схема", _base_schema),
+    (2, "полнотекстовый индекс заказов", _search_index),
+    (3, "счетчики заказов по статусам", _status_counters),
+    (4, "время заказов в секундах Unix", _epoch_timestamps),
+    (5, "покрывающие индексы списков заказов", _list_indexes),
+    (6, "журнал смены статусов заказов", _order_events),
+    (7, "индекс журнала смены статусов по заказам", _order_events_by_order),
+)
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+async def get_version(db: aiosqlite.Connection) -> int:
+    cursor = await db.execute("PRAGMA user_version")
+    return (await cursor.fetchone())[0]
+
+
+async def ensure_search_index(db: aiosqlite.Connection) -> bool:
+    """Построить полнотекстовый индекс, если его нет (миграция 2 пропускает шаг без fts5), вернуть его наличие"""
+    if await _table_exists(db, "orders_fts"):
+        return True
+    await db.execute("BEGIN IMMEDIATE")
+    try:
+        built = await _optional_step(db, "search_index", _create_search_index)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return built
+
+
+async def ensure_wal(db: aiosqlite.Connection) -> str:
+    """Журнал WAL: долгое чтение (выгрузка, отчеты) не блокирует запись, вернуть режим журнала
+
+    Режим меняется только вне транзакции, поэтому это не нумерованная миграция. Он
+    хранится в файле базы: после первого запуска запрос лишь подтверждает режим.
+    """
+    cursor = await db.execute("PRAGMA journal_mode = WAL")
+    mode = (await cursor.fetchone())[0]
+    if mode != "wal":
+        logger.warning(f"Не удалось включить журнал WAL (режим {mode}): чтение будет задерживать запись")
+    return mode
+
+
+async def migrate(db: aiosqlite.Connection) -> int:
+    """Применить недостающие миграции, вернуть версию схемы"""
+    version = await get_version(db)
+    if version >= SCHEMA_VERSION:
+        if version > SCHEMA_VERSION:
+            logger.warning(f"Версия схемы базы ({version}) новее известной коду ({SCHEMA_VERSION})")
+        return version
+
+    for number, description, migration in MIGRATIONS:
+        if number <= version:
+            continue
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            # Другой процесс мог применить миграцию, пока ожидалась блокировка
+            version = await get_version(db)
+            if number <= version:
+                await db.rollback()
+                continue
+            await migration(db)
+            await db.execute(f"PRAGMA user_version = {number:d}")
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            logger.error(f"Миграция {number} ({description}) не применена")
+            raise
+        version = number
+        logger.info(f"Применена миграция {number}: {description}")
+    return version
@@ -0,0 +1,179 @@
+"""
+Запись входящих обновлений в сжатый JSONL для воспроизведения нагрузки (bench/replay.py)
+
+Включается настройкой RECORD_UPDATES. Персональные данные удаляются до записи:
+идентификаторы пользователей и чатов заменяются псевдонимами (HMAC со случайным
+ключом, который нигде не сохраняется), имена и свободный текст — заполнителями
+той же длины. Команды, кнопки меню и короткие числа сохраняются как есть.
+"""
+import gzip
+import hashlib
+import hmac
+import json
+import re
+import secrets
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from loguru import logger
+
+import keyboards
+
+
+# Сбрасывать сжатый поток на диск каждые N записей (запись читается и после аварийной остановки)
+FLUSH_EVERY = 50
+
+# Объекты с данными пользователя или чата: остаются только id (псевдоним), is_bot и type
+_PERSON_KEYS = {"from", "from_user", "chat", "user", "sender_chat", "forward_from", "forward_from_chat"}
+# Поля, которые не записываются совсем
+_DROP_KEYS = {
+    "entities", "caption_entities", "contact", "location", "venue", "phone_number", "email",
+    "username", "last_name", "language_code", "bio", "title", "invite_link",
+}
+_TEXT_KEYS = {"text", "caption", "query"}
+
+# Числа такой длины (номер заказа, количество) не считаются персональными данными
+_MAX_KEPT_NUMBER_LENGTH = 6
+_WORD_CHARACTERS = re.compile(r"\w")
+
+
+def _menu_texts() -> frozenset:
+    """Подписи кнопок главного меню (обработчики сравнивают текст сообщения с ними)"""
+    markups = (keyboards.get_main_menu_keyboard(), keyboards.get_admin_menu_keyboard())
+    return frozenset(button.text for markup in markups for row in markup.keyboard for button in row)
+
+
+class UpdateScrubber:
+    """Удаление персональных данных из обновления (словарь в формате Bot API)"""
+
+    def __init__(self, key: Optional[bytes] = None):
+        self._key = key or secrets.token_bytes(32)
+        self._menu_texts = _menu_texts()
+
+    def pseudonym(self, value: int) -> int:
+        """Стабильный в пределах записи псевдоним идентификатора (знак сохраняется)"""
+        digest = hmac.new(self._key, str(abs(value)).encode(), hashlib.sha256).digest()
+        pseudonym = 10**10 + int.from_bytes(digest[:5], "big")
+        return -pseudonym if value < 0 else pseudonym
+
+    def text(self, value: str) -> str:
+        if value in self._menu_texts:
+            return value
+        if value.isdigit() and len(value) <= _MAX_KEPT_NUMBER_LENGTH:
+            return value
+        if value.startswith("/"):
+            command, separator, arguments = value.partition(" ")
+            return command + separator + _WORD_CHARACTERS.sub("x", arguments)
+        return _WORD_CHARACTERS.sub("x", value)
+
+    def _person(self, value: Dict[str, Any]) -> Dict[str, Any]:
+        result = {"id": self.pseudonym(value["id"])}
+        for key in ("is_bot", "type"):
+            if key in value:
+                result[key] = value[key]
+        if "first_name" in value:
+            result["first_name"] = "User"
+        return result
+
+    def scrub(self, value: Any, key: Optional[str] = None) -> Any:
+        if isinstance(value, dict):
+            if key in _PERSON_KEYS and "id" in value:
+                return self._person(value)
+            return {
+                item_key: self.scrub(item, item_key)
+                for item_key, item in value.items()
+                if item_key not in _DROP_KEYS
+            }
+        if isinstance(value, list):
+            return [self.scrub(item, key) for item in value]
+        if key in _TEXT_KEYS and isinstance(value, str):
+            return self.text(value)
+        if key == "file_name" and isinstance(value, str):
+            return "file" + Path(value).suffix
+        if key in ("user_id", "chat_id") and isinstance(value, int):
+            return self.pseudonym(value)
+        if key == "chat_instance" and isinstance(value, str):
+            return hmac.new(self._key, value.encode(), hashlib.sha256).hexdigest()[:20]
+        return value
+
+
+class UpdateRecorderMiddleware(BaseMiddleware):
+    """Outer middleware на dp.update: пишет каждое обновление со временем поступления и обработки
+
+    Регистрируется после RoleMiddleware, чтобы сохранить роль отправителя
+    (при воспроизведении псевдонимы администраторов попадают в ADMIN_IDS).
+    """
+
+    def __init__(self, directory: Path):
+        directory.mkdir(parents=True, exist_ok=True)
+        self.path = directory / f"updates_{datetime.now():%Y%m%d_%H%M%S}.jsonl.gz"
+        self._file = gzip.open(self.path, "wt", encoding="utf-8")
+        self._scrubber = UpdateScrubber()
+        self._started = time.perf_counter()
+        self._pending = 0
+        self.recorded = 0
+        logger.info(f"Запись обновлений в {self.path}")
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        received = time.perf_counter()
+        # Состояние FSM до обработки: при воспроизведении с середины диалога оно восстанавливается
+        raw_state = data.get("raw_state")
+        try:
+            return await handler(event, data)
+        finally:
+            self._write(event, data, raw_state, received, time.perf_counter() - received)
+
+    def _write(self, event: TelegramObject, data: Dict[str, Any], raw_state: Optional[str],
+               received: float, duration: float) -> None:
+        if self._file is None or not isinstance(event, Update):
+            return
+        user = data.get("event_from_user")
+        chat = data.get("event_chat")
+        entry = {
+            "offset": round(received - self._started, 6),
+            "duration": round(duration, 6),
+            "event_type": event.event_type,
+            "user_id": self._scrubber.pseudonym(user.id) if user else None,
+            "chat_id": self._scrubber.pseudonym(chat.id) if chat else None,
+            "admin": bool(data.get("is_admin")),
+            "state": raw_state,
+            "update": self._scrubber.scrub(event.model_dump(mode="json", exclude_none=True, by_alias=True)),
+        }
+        try:
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.recorded += 1
+            self._pending += 1
+            if self._pending >= FLUSH_EVERY:
+                self._file.flush()
+                self._pending = 0
+        except OSError as e:
+            logger.error(f"Запись обновлений остановлена: {e}")
+            self.close()
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        logger.info(f"Записано обновлений: {self.recorded} ({self.path})")
+
+
+def read_recording(path: Path) -> Iterator[Dict[str, Any]]:
+    """Записи файла в порядке завершения обработки; обрезанный хвост файла пропускается"""
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        try:
+            for line in file:
+                if line.endswith("\n"):
+                    yield json.loads(line)
+        except (EOFError, zlib.error):
+            logger.warning(f"Запись {path} обрезана, прочитаны только полные строки")
@@ -0,0 +1,142 @@
+"""
+Записи заказов: компактные объекты со __slots__ вместо словарей строк
+
+Объекты создаются прямо при чтении курсора (row factory). Поля находятся по
+именам столбцов из cursor.description; план сопоставления строится один раз
+на запрос, а не для каждой строки. Поля, которых нет в запросе, получают
+значения по умолчанию.
+"""
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+import config
+
+
+# Смещение местного времени для отображения дат (время в базе — секунды Unix, UTC)
+_UTC_OFFSET_SECONDS = round(config.TIMEZONE_OFFSET_HOURS * 3600)
+_EPOCH_DATE = date(1970, 1, 1)
+
+# Сколько планов сопоставления столбцов хранить (по одному на выполненный запрос)
+_PLAN_CACHE_SIZE = 64
+
+# (класс, id(cursor.description)) -> (description, план)
+_plans: Dict[Tuple[type, int], Tuple[Any, Tuple[Tuple[str, Optional[int], Any], ...]]] = {}
+
+
+@lru_cache(maxsize=4096)
+def _format_day(day: int) -> str:
+    """Дата 'ГГГГ-ММ-ДД' по номеру дня от 1970-01-01 (заказы в списках приходятся на немногие дни)"""
+    return (_EPOCH_DATE + timedelta(days=day)).isoformat()
+
+
+def format_timestamp(timestamp: Optional[int]) -> Optional[str]:
+    """Время в секундах Unix как 'ГГГГ-ММ-ДД ЧЧ:ММ:СС' с учетом TIMEZONE_OFFSET_HOURS"""
+    if not timestamp:
+        return None
+    day, seconds = divmod(timestamp + _UTC_OFFSET_SECONDS, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{_format_day(day)} {hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def day_start_timestamp(day: date) -> int:
+    """Начало дня day по местному времени (TIMEZONE_OFFSET_HOURS) в секундах Unix"""
+    return (day - _EPOCH_DATE).days * 86400 - _UTC_OFFSET_SECONDS
+
+
+def _column_plan(cls: type, description: Any) -> Tuple[Tuple[str, Optional[int], Any], ...]:
+    """(поле, номер столбца или None, значение по умолчанию) для каждого поля записи"""
+    key = (cls, id(description))
+    cached = _plans.get(key)
+    if cached is not None and cached[0] is description:
+        return cached[1]
+    columns: Dict[str, int] = {}
+    for index, column in enumerate(description):
+        # o.* и JOIN users дают user_id дважды, значения совпадают
+        columns.setdefault(column[0], index)
+    plan = tuple((name, columns.get(name), cls._DEFAULTS.get(name)) for name in cls.__slots__)
+    if len(_plans) >= _PLAN_CACHE_SIZE:
+        _plans.clear()
+    # description хранится вместе с планом, чтобы id не был переиспользован другим запросом
+    _plans[key] = (description, plan)
+    return plan
+
+
+class _Record:
+    """Основа записей: поля перечислены в __slots__, умолчания — в _DEFAULTS"""
+
+    __slots__ = ()
+    _DEFAULTS: Dict[str, Any] = {}
+
+    def __init__(self, **fields: Any):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name, self._DEFAULTS.get(name)))
+
+    @classmethod
+    def row_factory(cls, cursor: Any, row: Tuple[Any, ...]) -> "_Record":
+        """Row factory для aiosqlite: db.row_factory = OrderRecord.row_factory"""
+        record = cls.__new__(cls)
+        for name, index, default in _column_plan(cls, cursor.description):
+            setattr(record, name, default if index is None else row[index])
+        return record
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class OrderListItem(_Record):
+    """Заказ в списке: только то, что нужно кнопке списка"""
+
+    __slots__ = ("id", "status_code", "status_name", "part_name")
+    _DEFAULTS = {"status_name": "Без статуса"}
+
+    id: int
+    status_code: Optional[str]
+    status_name: str
+    part_name: Optional[str]
+
+
+class OrderRecord(_Record):
+    """Заказ со всеми полями, данными заказчика, статуса и материала"""
+
+    __slots__ = (
+        "id", "user_id", "status_id", "material_id", "part_name", "photo_path", "model_path",
+        "photo_caption", "original_filename", "rejection_reason", "last_reminder_time", "comment",
+        "order_type", "created_at", "quantity", "model_hash",
+        "first_name", "last_name", "username",
+        "status_code", "status_name", "material_name", "model_metadata",
+    )
+    _DEFAULTS = {"order_type": "3d_print", "quantity": 1, "last_reminder_time": 0, "created_at": 0}
+
+    id: int
+    user_id: int
+    status_id: int
+    material_id: Optional[int]
+    part_name: Optional[str]
+    photo_path: Optional[str]
+    model_path: Optional[str]
+    photo_caption: Optional[str]
+    original_filename: Optional[str]
+    rejection_reason: Optional[str]
+    last_reminder_time: int
+    comment: Optional[str]
+    order_type: str
+    created_at: int
+    quantity: int
+    model_hash: Optional[str]
+    first_name: Optional[str]
+    last_name: Optional[str]
+    username: Optional[str]
+    status_code: Optional[str]
+    status_name: Optional[str]
+    material_name: Optional[str]
+    # Разобранные метаданные STEP (только в get_order)
+    model_metadata: Optional[Dict[str, Any]]
+
+    @property
+    def created_at_text(self) -> Optional[str]:
+        """Дата создания в местном времени"""
+        return format_timestamp(self.created_at)
+
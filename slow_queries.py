@@ -0,0 +1,213 @@
+"""
+Трассировка SQL-запросов: журнал медленных запросов с планом выполнения и агрегаты по операторам
+
+Включается настройкой SLOW_QUERY_MS (порог в миллисекундах). Время
+запроса — выполнение оператора плюс чтение строк через курсор.
+"""
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import aiosqlite
+from aiosqlite.context import contextmanager
+from loguru import logger
+
+
+# Файл журнала медленных запросов (sink подключается в main.py)
+SLOW_QUERY_LOG_PATH = Path("logs/slow_queries.log")
+
+# Сколько символов значения параметра выводить в журнал
+PARAMETER_MAX_LENGTH = 80
+
+# Операторы, для которых имеет смысл EXPLAIN QUERY PLAN
+_EXPLAINABLE_KEYWORDS = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT", "REPLACE")
+
+# Записи с этой меткой пишутся только в отдельный sink
+slow_query_logger = logger.bind(slow_query=True)
+
+
+class _StatementStats:
+    """Агрегаты по одному оператору SQL"""
+
+    __slots__ = ("count", "total", "max", "slow")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.slow = 0
+
+
+_statement_stats: Dict[str, _StatementStats] = {}
+_query_plans: Dict[str, str] = {}
+
+
+def normalize_sql(sql: str) -> str:
+    """Оператор в одну строку (ключ агрегатов)"""
+    return " ".join(sql.split())
+
+
+def _format_parameters(parameters: Optional[Iterable[Any]]) -> str:
+    if not parameters:
+        return "()"
+    values = []
+    for value in parameters:
+        text = repr(value)
+        if len(text) > PARAMETER_MAX_LENGTH:
+            text = text[:PARAMETER_MAX_LENGTH] + "..."
+        values.append(text)
+    return "(" + ", ".join(values) + ")"
+
+
+def _format_plan(rows: Iterable[Any]) -> str:
+    """Дерево EXPLAIN QUERY PLAN: строки (id, parent, notused, detail)"""
+    depth: Dict[int, int] = {0: 0}
+    lines = []
+    for row in rows:
+        node_id, parent_id, detail = row[0], row[1], row[3]
+        level = depth.get(parent_id, 0) + 1
+        depth[node_id] = level
+        lines.append("  " * level + str(detail))
+    return "\n".join(lines)
+
+
+class _Execution:
+    """Одно выполнение оператора: накапливает время до чтения всех строк"""
+
+    __slots__ = ("sql", "key", "parameters", "elapsed", "logged")
+
+    def __init__(self, sql: str, parameters: Optional[Iterable[Any]]):
+        self.sql = sql
+        self.key = normalize_sql(sql)
+        self.parameters = parameters
+        self.elapsed = 0.0
+        self.logged = False
+
+
+class TracedCursor(aiosqlite.Cursor):
+    """Курсор, добавляющий время чтения строк к выполнению оператора"""
+
+    def __init__(self, conn: "TracedConnection", cursor: sqlite3.Cursor, execution: _Execution):
+        super().__init__(conn, cursor)
+        self._execution = execution
+
+    async def _timed_fetch(self, fetch, *args: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return await fetch(*args)
+        finally:
+            await self._conn._account(self._execution, time.perf_counter() - started, new_execution=False)
+
+    async def fetchone(self) -> Optional[sqlite3.Row]:
+        return await self._timed_fetch(super().fetchone)
+
+    async def fetchmany(self, size: Optional[int] = None) -> Iterable[sqlite3.Row]:
+        return await self._timed_fetch(super().fetchmany, size)
+
+    async def fetchall(self) -> Iterable[sqlite3.Row]:
+        return await self._timed_fetch(super().fetchall)
+
+
+class TracedConnection(aiosqlite.Connection):
+    """Соединение aiosqlite с замером времени операторов execute/executemany"""
+
+    def __init__(self, connector, iter_chunk_size: int, threshold_ms: float):
+        super().__init__(connector, iter_chunk_size)
+        self.threshold = threshold_ms / 1000.0
+
+    async def _traced(self, method, sql: str, parameters: Any, log_parameters: Optional[Iterable[Any]]):
+        execution = _Execution(sql, log_parameters)
+        started = time.perf_counter()
+        try:
+            cursor = await method(sql, parameters)
+        finally:
+            await self._account(execution, time.perf_counter() - started, new_execution=True)
+        return TracedCursor(self, cursor._cursor, execution)
+
+    @contextmanager
+    async def execute(self, sql: str, parameters: Optional[Iterable[Any]] = None) -> aiosqlite.Cursor:
+        return await self._traced(super().execute, sql, parameters, parameters)
+
+    @contextmanager
+    async def executemany(self, sql: str, parameters: Iterable[Iterable[Any]]) -> aiosqlite.Cursor:
+        parameters = list(parameters)
+        return await self._traced(super().executemany, sql, parameters, parameters[0] if parameters else None)
+
+    async def _account(self, execution: _Execution, elapsed: float, new_execution: bool) -> None:
+        """Учесть время в агрегатах и записать медленный запрос в журнал (один раз)"""
+        execution.elapsed += elapsed
+        stats = _statement_stats.get(execution.key)
+        if stats is None:
+            stats = _statement_stats[execution.key] = _StatementStats()
+        if new_execution:
+            stats.count += 1
+        stats.total += elapsed
+        stats.max = max(stats.max, execution.elapsed)
+
+        if execution.logged or execution.elapsed < self.threshold:
+            return
+        execution.logged = True
+        stats.slow += 1
+        plan = await self._query_plan(execution)
+        slow_query_logger.warning(
+            f"Медленный запрос {execution.elapsed * 1000:.1f} мс: {execution.key}\n"
+            f"Параметры: {_format_parameters(execution.parameters)}"
+            + (f"\nПлан:\n{plan}" if plan else "")
+        )
+
+    async def _query_plan(self, execution: _Execution) -> Optional[str]:
+        """EXPLAIN QUERY PLAN оператора (считается один раз для каждого оператора)"""
+        if execution.key in _query_plans:
+            return _query_plans[execution.key]
+        if not execution.key.upper().startswith(_EXPLAINABLE_KEYWORDS):
+            return None
+        try:
+            # Базовый execute: сам EXPLAIN не трассируется
+            cursor = await super().execute("EXPLAIN QUERY PLAN " + execution.sql, execution.parameters or [])
+            # Строки плана читаются кортежами, а не через row_factory запроса (OrderRecord и т.п.)
+            cursor.row_factory = None
+            rows = await cursor.fetchall()
+            await cursor.close()
+        except sqlite3.Error as e:
+            return f"(план недоступен: {e})"
+        plan = _format_plan(rows)
+        _query_plans[execution.key] = plan
+        return plan
+
+
+def connect(database: Path, threshold_ms: float) -> TracedConnection:
+    """Аналог aiosqlite.connect с трассировкой запросов"""
+    def connector() -> sqlite3.Connection:
+        return sqlite3.connect(str(database))
+
+    return TracedConnection(connector, 64, threshold_ms)
+
+
+def get_statement_stats(limit: int = 10) -> List[Dict[str, Any]]:
+    """Операторы с наибольшим суммарным временем"""
+    items = sorted(_statement_stats.items(), key=lambda item: item[1].total, reverse=True)[:limit]
+    return [
+        {
+            "sql": sql,
+            "count": stats.count,
+            "total": stats.total,
+            "avg": stats.total / stats.count if stats.count else 0.0,
+            "max": stats.max,
+            "slow": stats.slow,
+        }
+        for sql, stats in items
+    ]
+
+
+def log_statement_stats(limit: int = 20) -> None:
+    """Записать агрегаты в журнал медленных запросов (при остановке бота)"""
+    stats = get_statement_stats(limit)
+    if not stats:
+        return
+    lines = [
+        f"{item['count']:>7} раз, всего {item['total'] * 1000:.0f} мс, ср. {item['avg'] * 1000:.2f} мс, "
+        f"макс. {item['max'] * 1000:.1f} мс, медленных {item['slow']}: {item['sql'][:200]}"
+        for item in stats
+    ]
+    slow_query_logger.info("Агрегаты запросов за время работы:\n" + "\n".join(lines))
@@ -0,0 +1,316 @@
+"""
+Потоковый разбор STEP-файлов (ISO 10303-21): заголовок, единицы, сущности, габариты
+
+Файл читается блоками и разбивается на операторы по ';' с учетом строк
+и комментариев, поэтому память не зависит от размера модели.
+"""
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+# Размер блока чтения в байтах
+STEP_READ_BYTES = 4 * 1024 * 1024
+
+# Сколько самых частых типов сущностей сохранять в метаданных
+STEP_TOP_ENTITY_TYPES = 8
+
+# Сколько названий изделий (PRODUCT) сохранять
+STEP_MAX_PRODUCTS = 5
+
+# Сколько ошибок разбора сохранять
+STEP_MAX_ERRORS = 5
+
+# Масштаб единиц длины к миллиметрам
+_SI_PREFIX_TO_MM = {
+    None: 1000.0,
+    "KILO": 1_000_000.0,
+    "CENTI": 10.0,
+    "MILLI": 1.0,
+    "MICRO": 0.001,
+    "NANO": 0.000001,
+}
+_CONVERSION_UNIT_TO_MM = {
+    "INCH": 25.4,
+    "FOOT": 304.8,
+    "MILLIMETRE": 1.0,
+    "CENTIMETRE": 10.0,
+    "METRE": 1000.0,
+}
+_UNIT_NAMES = {
+    None: "м",
+    "KILO": "км",
+    "CENTI": "см",
+    "MILLI": "мм",
+    "MICRO": "мкм",
+    "NANO": "нм",
+}
+
+# Разделители оператора: строка (возможно незакрытая), комментарий или ';'
+_DELIMITER_RE = re.compile(r"'[^']*'?|/\*.*?(?:\*/|\Z)|;", re.S)
+_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+_ENTITY_RE = re.compile(r"#(\d+)\s*=\s*([A-Za-z0-9_]*)\s*\(")
+_COMPLEX_PART_RE = re.compile(r"([A-Za-z][A-Za-z0-9_]*)\s*\(")
+_POINT_COORDS_RE = re.compile(r"\(\s*([^()]*)\)\s*\)\s*$")
+_SI_UNIT_RE = re.compile(r"SI_UNIT\s*\(\s*(?:\.(\w+)\.|\$)\s*,\s*\.(\w+)\.\s*\)")
+_CONVERSION_UNIT_RE = re.compile(r"CONVERSION_BASED_UNIT\s*\(\s*'([^']*)'")
+_STRING_RE = re.compile(r"'((?:[^']|'')*)'")
+_X2_RE = re.compile(r"\\X2\\([0-9A-Fa-f]*)\\X0\\")
+_X_RE = re.compile(r"\\X\\([0-9A-Fa-f]{2})")
+
+
+class StepFormatError(ValueError):
+    """Файл не является корректным STEP"""
+
+
+def decode_step_string(value: str) -> str:
+    """Раскодировать строку STEP ('' и последовательности \\X2\\...\\X0\\, \\X\\hh)"""
+    value = value.replace("''", "'")
+    if "\\X" not in value:
+        return value
+
+    def decode_x2(match: re.Match) -> str:
+        hex_digits = match.group(1)
+        return "".join(chr(int(hex_digits[i:i + 4], 16)) for i in range(0, len(hex_digits) - 3, 4))
+
+    value = _X2_RE.sub(decode_x2, value)
+    return _X_RE.sub(lambda match: chr(int(match.group(1), 16)), value)
+
+
+def _split_arguments(text: str) -> List[str]:
+    """Разбить список параметров верхнего уровня (без внешних скобок) по запятым"""
+    args = []
+    depth = 0
+    in_string = False
+    start = 0
+    for index, char in enumerate(text):
+        if char == "'":
+            in_string = not in_string
+        elif in_string:
+            continue
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            args.append(text[start:index].strip())
+            start = index + 1
+    args.append(text[start:].strip())
+    return args
+
+
+def _string_argument(arg: str) -> Optional[str]:
+    """Значение строкового параметра или None для $ / пустой строки"""
+    match = _STRING_RE.fullmatch(arg.strip())
+    if not match:
+        return None
+    return decode_step_string(match.group(1)).strip() or None
+
+
+def iter_statements(path: Path, read_bytes: int = STEP_READ_BYTES) -> Iterator[str]:
+    """Потоково выдать операторы файла (текст до ';' без самого разделителя)
+
+    Если файл оборван внутри строки или комментария, в конце выдается
+    StepFormatError.
+    """
+    tail = ""
+    with open(path, "rb") as file:
+        while True:
+            block = file.read(read_bytes)
+            data = tail + block.decode("latin-1")
+            start = 0
+            incomplete = False
+            for match in _DELIMITER_RE.finditer(data):
+                token = match.group()
+                if token == ";":
+                    yield data[start:match.start()]
+                    start = match.end()
+                elif (token[0] == "'" and (len(token) == 1 or token[-1] != "'")) or (
+                    token.startswith("/*") and not token.endswith("*/")
+                ):
+                    # Строка или комментарий продолжаются в следующем блоке
+                    incomplete = True
+                    break
+            tail = data[start:]
+            if not block:
+                if incomplete:
+                    raise StepFormatError("Файл оборван внутри строки или комментария")
+                if tail.strip():
+                    raise StepFormatError("Последний оператор не завершен ';'")
+                return
+
+
+def _length_unit(statement: str) -> Optional[Tuple[str, Optional[float]]]:
+    """Единица длины из оператора с LENGTH_UNIT: (название, масштаб к мм)"""
+    conversion = _CONVERSION_UNIT_RE.search(statement)
+    if conversion:
+        name = conversion.group(1).strip().upper()
+        return name.lower(), _CONVERSION_UNIT_TO_MM.get(name)
+    si_unit = _SI_UNIT_RE.search(statement)
+    if si_unit and si_unit.group(2).upper() == "METRE":
+        prefix = si_unit.group(1).upper() if si_unit.group(1) else None
+        return _UNIT_NAMES.get(prefix, f"{prefix} METRE"), _SI_PREFIX_TO_MM.get(prefix)
+    return None
+
+
+def scan_step(path: Path) -> Dict[str, Any]:
+    """Просканировать STEP-файл и вернуть метаданные и список найденных ошибок
+
+    Габариты считаются по всем CARTESIAN_POINT (включая управляющие точки
+    кривых), поэтому это оценка сверху.
+    """
+    path = Path(path)
+    errors: List[str] = []
+    section: Optional[str] = None
+    seen_start = seen_header = seen_data = seen_end = False
+    open_sections = 0
+
+    schema = originating_system = preprocessor = None
+    products: List[str] = []
+    product_count = 0
+    unit_name: Optional[str] = None
+    unit_scale: Optional[float] = None
+    entity_types: Counter = Counter()
+    entity_count = 0
+    point_count = 0
+    lo = [float("inf")] * 3
+    hi = [float("-inf")] * 3
+
+    try:
+        for raw_statement in iter_statements(path):
+            statement = raw_statement
+            if "/*" in statement:
+                statement = _COMMENT_RE.sub("", statement)
+            statement = statement.strip()
+            if not statement:
+                continue
+
+            if not seen_start:
+                if statement != "ISO-10303-21":
+                    break
+                seen_start = True
+                continue
+
+            if seen_end:
+                errors.append("Данные после END-ISO-10303-21")
+                break
+
+            keyword = statement.upper()
+            if keyword == "HEADER":
+                seen_header = True
+                section = "header"
+                open_sections += 1
+                continue
+            if keyword == "DATA" or keyword.startswith("DATA("):
+                seen_data = True
+                section = "data"
+                open_sections += 1
+                continue
+            if keyword == "ENDSEC":
+                section = None
+                open_sections -= 1
+                continue
+            if keyword == "END-ISO-10303-21":
+                seen_end = True
+                continue
+
+            if section == "header":
+                name, _, rest = statement.partition("(")
+                name = name.strip().upper()
+                args = _split_arguments(rest.rsplit(")", 1)[0])
+                if name == "FILE_NAME" and len(args) >= 6:
+                    preprocessor = _string_argument(args[4])
+                    originating_system = _string_argument(args[5])
+                elif name == "FILE_SCHEMA" and args:
+                    schema_match = _STRING_RE.search(args[0])
+                    if schema_match:
+                        schema = decode_step_string(schema_match.group(1)).split()[0] or None
+                continue
+
+            if section != "data":
+                if len(errors) < STEP_MAX_ERRORS:
+                    errors.append("Оператор вне секций HEADER/DATA")
+                continue
+
+            match = _ENTITY_RE.match(statement)
+            if not match:
+                if len(errors) < STEP_MAX_ERRORS:
+                    errors.append(f"Некорректная сущность: {statement[:40]}")
+                continue
+
+            entity_count += 1
+            entity_name = match.group(2).upper()
+            if not entity_name:
+                # Составная сущность: #1=(A()B()C());
+                entity_name = " ".join(
+                    part.upper() for part in _COMPLEX_PART_RE.findall(statement[match.end():])
+                )
+            entity_types[entity_name] += 1
+
+            if entity_name == "CARTESIAN_POINT":
+                coords_match = _POINT_COORDS_RE.search(statement)
+                if coords_match:
+                    try:
+                        coords = [float(value) for value in coords_match.group(1).split(",")]
+                    except ValueError:
+                        coords = []
+                    if len(coords) == 3:
+                        point_count += 1
+                        for axis in range(3):
+                            if coords[axis] < lo[axis]:
+                                lo[axis] = coords[axis]
+                            if coords[axis] > hi[axis]:
+                                hi[axis] = coords[axis]
+            elif entity_name == "PRODUCT":
+                product_count += 1
+                if len(products) < STEP_MAX_PRODUCTS:
+                    args = _split_arguments(statement[match.end():].rsplit(")", 1)[0])
+                    product_name = None
+                    if len(args) >= 2:
+                        product_name = _string_argument(args[1]) or _string_argument(args[0])
+                    if product_name and product_name not in products:
+                        products.append(product_name)
+            elif unit_name is None and "LENGTH_UNIT" in entity_name:
+                unit = _length_unit(statement)
+                if unit:
+                    unit_name, unit_scale = unit
+    except StepFormatError as e:
+        errors.append(str(e))
+
+    if not seen_start:
+        errors.insert(0, "Нет сигнатуры ISO-10303-21 в начале файла")
+    else:
+        if not seen_header:
+            errors.append("Нет секции HEADER")
+        if not seen_data:
+            errors.append("Нет секции DATA")
+        elif entity_count == 0:
+            errors.append("Секция DATA пуста")
+        if open_sections != 0:
+            errors.append("Секции не закрыты ENDSEC")
+        if not seen_end:
+            errors.append("Файл обрезан: нет END-ISO-10303-21")
+
+    size = None
+    size_mm = None
+    if point_count:
+        size = [hi[axis] - lo[axis] for axis in range(3)]
+        if unit_scale is not None:
+            size_mm = [value * unit_scale for value in size]
+
+    return {
+        "valid": not errors,
+        "errors": errors[:STEP_MAX_ERRORS],
+        "schema": schema,
+        "originating_system": originating_system,
+        "preprocessor": preprocessor,
+        "products": products,
+        "product_count": product_count,
+        "length_unit": unit_name,
+        "entity_count": entity_count,
+        "entity_types": entity_types.most_common(STEP_TOP_ENTITY_TYPES),
+        "cartesian_points": point_count,
+        "size": size,
+        "size_mm": size_mm,
+    }
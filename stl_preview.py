@@ -0,0 +1,227 @@
+"""
+Программный рендер превью STL-моделей (изометрия, z-буфер на NumPy, без GPU)
+"""
+import struct
+import zlib
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+import mesh_processing
+import stl_reader
+
+
+# Размер превью в пикселях (квадрат)
+PREVIEW_SIZE = 512
+
+# Отступ от края изображения (доля от размера)
+PREVIEW_MARGIN = 0.06
+
+# Цвета фона и модели (RGB)
+BACKGROUND_COLOR = np.array([255, 255, 255], dtype=np.float32)
+MODEL_COLOR = np.array([88, 140, 205], dtype=np.float32)
+
+# Освещение: фоновая и диффузная составляющие
+AMBIENT_LIGHT = 0.25
+DIFFUSE_LIGHT = 0.75
+LIGHT_DIRECTION = np.array([0.35, 0.55, 0.76], dtype=np.float32)
+
+# Сетки крупнее этого порога рендерятся по упрощенной копии
+PREVIEW_MAX_TRIANGLES = 200_000
+
+# Максимальное количество пикселей-кандидатов, обрабатываемых за один проход
+RASTER_BATCH_SAMPLES = 4_000_000
+
+
+def _isometric_rotation() -> np.ndarray:
+    """Матрица поворота для изометрической проекции (ось Z модели смотрит вверх)"""
+    yaw = np.radians(45.0)
+    pitch = np.arctan(1.0 / np.sqrt(2.0))
+
+    rotate_z = np.array([
+        [np.cos(yaw), -np.sin(yaw), 0.0],
+        [np.sin(yaw), np.cos(yaw), 0.0],
+        [0.0, 0.0, 1.0],
+    ])
+    # Переводим Z-вверх в экранную Y и наклоняем камеру
+    z_up_to_screen = np.array([
+        [1.0, 0.0, 0.0],
+        [0.0, 0.0, 1.0],
+        [0.0, -1.0, 0.0],
+    ])
+    tilt = np.array([
+        [1.0, 0.0, 0.0],
+        [0.0, np.cos(pitch), -np.sin(pitch)],
+        [0.0, np.sin(pitch), np.cos(pitch)],
+    ])
+    return (tilt @ z_up_to_screen @ rotate_z).astype(np.float32)
+
+
+def _shade(triangles: np.ndarray) -> np.ndarray:
+    """Интенсивность освещения каждой грани (двустороннее ламбертово освещение)"""
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    lengths[lengths == 0] = 1.0
+    normals /= lengths[:, None]
+    light = LIGHT_DIRECTION / np.linalg.norm(LIGHT_DIRECTION)
+    return AMBIENT_LIGHT + DIFFUSE_LIGHT * np.abs(normals @ light)
+
+
+def render_isometric(triangles: np.ndarray, size: int = PREVIEW_SIZE) -> np.ndarray:
+    """Отрендерить треугольники в RGB-изображение (size x size) с z-буфером"""
+    image = np.empty((size * size, 3), dtype=np.float32)
+    image[:] = BACKGROUND_COLOR
+    if len(triangles) == 0:
+        return image.reshape(size, size, 3).astype(np.uint8)
+
+    view = (triangles.reshape(-1, 3) @ _isometric_rotation().T).reshape(-1, 3, 3)
+    intensity = _shade(view)
+
+    # Масштабируем модель в кадр с сохранением пропорций
+    lo = view[:, :, :2].reshape(-1, 2).min(axis=0)
+    hi = view[:, :, :2].reshape(-1, 2).max(axis=0)
+    extent = float(max(hi[0] - lo[0], hi[1] - lo[1])) or 1.0
+    usable = size * (1.0 - 2.0 * PREVIEW_MARGIN)
+    scale = usable / extent
+    offset = (size - (hi[:2] - lo[:2]) * scale) / 2.0
+
+    screen = np.empty_like(view)
+    screen[:, :, 0] = (view[:, :, 0] - lo[0]) * scale + offset[0]
+    # Экранная ось Y направлена вниз
+    screen[:, :, 1] = size - ((view[:, :, 1] - lo[1]) * scale + offset[1])
+    screen[:, :, 2] = view[:, :, 2]
+
+    zbuffer = np.full(size * size, -np.inf, dtype=np.float32)
+    colors = (MODEL_COLOR[None, :] * intensity[:, None]).clip(0, 255).astype(np.float32)
+
+    x0 = np.floor(screen[:, :, 0].min(axis=1)).astype(np.int64).clip(0, size - 1)
+    x1 = np.ceil(screen[:, :, 0].max(axis=1)).astype(np.int64).clip(0, size - 1)
+    y0 = np.floor(screen[:, :, 1].min(axis=1)).astype(np.int64).clip(0, size - 1)
+    y1 = np.ceil(screen[:, :, 1].max(axis=1)).astype(np.int64).clip(0, size - 1)
+    box = np.maximum(x1 - x0, y1 - y0) + 1
+
+    # Группируем треугольники по размеру охватывающего квадрата (степени двойки),
+    # чтобы растеризовать каждую группу одним векторизованным проходом
+    buckets = np.ceil(np.log2(box)).astype(np.int64)
+    for bucket in np.unique(buckets):
+        side = int(2 ** bucket)
+        indices = np.nonzero(buckets == bucket)[0]
+        per_batch = max(1, RASTER_BATCH_SAMPLES // (side * side))
+        for start in range(0, len(indices), per_batch):
+            batch = indices[start:start + per_batch]
+            _rasterize_batch(
+                screen[batch], colors[batch], x0[batch], y0[batch],
+                side, size, zbuffer, image
+            )
+
+    return image.reshape(size, size, 3).astype(np.uint8)
+
+
+def _rasterize_batch(
+    tris: np.ndarray,
+    colors: np.ndarray,
+    x0: np.ndarray,
+    y0: np.ndarray,
+    side: int,
+    size: int,
+    zbuffer: np.ndarray,
+    image: np.ndarray
+) -> None:
+    """Растеризовать группу треугольников с квадратом-кандидатом side x side"""
+    steps = np.arange(side, dtype=np.float32)
+    px = (x0[:, None, None] + steps[None, None, :] + 0.5).astype(np.float32)
+    py = (y0[:, None, None] + steps[None, :, None] + 0.5).astype(np.float32)
+
+    ax, ay, az = (tris[:, 0, i][:, None, None] for i in range(3))
+    bx, by, bz = (tris[:, 1, i][:, None, None] for i in range(3))
+    cx, cy, cz = (tris[:, 2, i][:, None, None] for i in range(3))
+
+    area = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+    valid = np.abs(area) > 1e-12
+    area = np.where(valid, area, 1.0)
+
+    w0 = ((bx - px) * (cy - py) - (by - py) * (cx - px)) / area
+    w1 = ((cx - px) * (ay - py) - (cy - py) * (ax - px)) / area
+    w2 = 1.0 - w0 - w1
+
+    inside = (w0 >= 0) & (w1 >= 0) & (w2 >= 0) & valid
+    inside &= (px < size) & (py < size)
+    if not inside.any():
+        return
+
+    depth = w0 * az + w1 * bz + w2 * cz
+    pixel = (py.astype(np.int64) * size + px.astype(np.int64))
+
+    tri_index = np.broadcast_to(np.arange(len(tris))[:, None, None], inside.shape)[inside]
+    pixel = np.broadcast_to(pixel, inside.shape)[inside]
+    depth = depth[inside]
+
+    # Для каждого пикселя оставляем ближайший к камере фрагмент
+    order = np.lexsort((-depth, pixel))
+    pixel = pixel[order]
+    depth = depth[order]
+    tri_index = tri_index[order]
+    _, first = np.unique(pixel, return_index=True)
+    pixel = pixel[first]
+    depth = depth[first]
+    tri_index = tri_index[first]
+
+    closer = depth > zbuffer[pixel]
+    pixel = pixel[closer]
+    zbuffer[pixel] = depth[closer]
+    image[pixel] = colors[tri_index[closer]]
+
+
+def encode_png(image: np.ndarray) -> bytes:
+    """Закодировать RGB-изображение (uint8, H x W x 3) в PNG без сторонних библиотек"""
+    height, width, _ = image.shape
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = image.reshape(height, width * 3)
+
+    def chunk(tag: bytes, payload: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(payload))
+            + tag
+            + payload
+            + struct.pack(">I", zlib.crc32(tag + payload) & 0xFFFFFFFF)
+        )
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def render_stl_to_png(
+    model_path: str,
+    output_path: str,
+    size: int = PREVIEW_SIZE,
+    content_hash: Optional[str] = None
+) -> dict:
+    """Отрендерить STL-файл в PNG и посчитать точные метрики (точка входа для пула процессов)
+
+    Метрики считаются потоковым проходом по полной сетке, а превью крупных
+    моделей рендерится по упрощенной сетке из кеша.
+    """
+    model_path = Path(model_path)
+    metrics = mesh_processing.compute_mesh_metrics(stl_reader.iter_stl_chunks(model_path))
+
+    if metrics["triangles"] <= PREVIEW_MAX_TRIANGLES:
+        triangles = stl_reader.load_triangles(model_path)
+    else:
+        chunk_source = lambda: stl_reader.iter_stl_chunks(model_path)
+        if content_hash:
+            triangles = mesh_processing.get_decimated_mesh(chunk_source, content_hash, PREVIEW_MAX_TRIANGLES)
+        else:
+            triangles = mesh_processing.decimate(chunk_source, PREVIEW_MAX_TRIANGLES)
+    image = render_isometric(triangles, size=size)
+
+    output = Path(output_path)
+    tmp_output = output.with_suffix(".tmp")
+    tmp_output.write_bytes(encode_png(image))
+    tmp_output.replace(output)
+    return metrics
@@ -0,0 +1,203 @@
+"""
+Потоковое чтение STL-файлов с ограниченным расходом памяти
+
+Бинарный STL отображается в память (mmap) и читается как структурированный
+массив NumPy без копирования; ASCII STL разбирается блоками фиксированного размера.
+"""
+import mmap
+import re
+import struct
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+
+
+# Запись треугольника бинарного STL: нормаль, три вершины, атрибут (50 байт)
+STL_RECORD_DTYPE = np.dtype([
+    ("normal", "<f4", (3,)),
+    ("vertices", "<f4", (3, 3)),
+    ("attr", "<u2"),
+])
+
+STL_HEADER_SIZE = 84
+
+# Размер блока по умолчанию (в треугольниках) для потоковых проходов
+DEFAULT_CHUNK_TRIANGLES = 262_144
+
+# Размер блока чтения ASCII STL в байтах
+ASCII_READ_BYTES = 4 * 1024 * 1024
+
+_ASCII_VERTEX_RE = re.compile(
+    rb"vertex\s+([-+0-9.eE]+)\s+([-+0-9.eE]+)\s+([-+0-9.eE]+)"
+)
+
+
+class StlFormatError(ValueError):
+    """Файл не является корректным STL"""
+
+
+def is_binary_stl(path: Path) -> bool:
+    """Проверить, что файл — бинарный STL (размер совпадает с числом треугольников в заголовке)"""
+    path = Path(path)
+    size = path.stat().st_size
+    if size < STL_HEADER_SIZE:
+        return False
+    with open(path, "rb") as file:
+        file.seek(80)
+        (triangle_count,) = struct.unpack("<I", file.read(4))
+    return size == STL_HEADER_SIZE + triangle_count * STL_RECORD_DTYPE.itemsize
+
+
+class BinaryStl:
+    """Бинарный STL, отображенный в память
+
+    records — структурированный массив-представление над mmap (без копирования).
+    Представления, полученные из records, не должны переживать закрытие файла.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self.records: Optional[np.ndarray] = None
+
+    def open(self) -> "BinaryStl":
+        self._file = open(self.path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Пустой файл нельзя отобразить в память
+            self._file.close()
+            raise StlFormatError(f"Пустой файл: {self.path.name}")
+
+        (triangle_count,) = struct.unpack_from("<I", self._mmap, 80)
+        if len(self._mmap) != STL_HEADER_SIZE + triangle_count * STL_RECORD_DTYPE.itemsize:
+            self.close()
+            raise StlFormatError(f"Некорректный бинарный STL: {self.path.name}")
+
+        self.records = np.frombuffer(
+            self._mmap, dtype=STL_RECORD_DTYPE, count=triangle_count, offset=STL_HEADER_SIZE
+        )
+        return self
+
+    def close(self):
+        self.records = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Кто-то еще держит представление — mmap закроется сборщиком мусора
+                pass
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "BinaryStl":
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self) -> int:
+        return 0 if self.records is None else len(self.records)
+
+    @property
+    def vertices(self) -> np.ndarray:
+        """Вершины всех треугольников (n, 3, 3) — представление без копирования"""
+        return self.records["vertices"]
+
+
+def iter_ascii_triangles(
+    path: Path,
+    chunk_triangles: int = DEFAULT_CHUNK_TRIANGLES,
+    read_bytes: int = ASCII_READ_BYTES
+) -> Iterator[np.ndarray]:
+    """Потоково разобрать ASCII STL, выдавая блоки треугольников (k, 3, 3)
+
+    Файл читается кусками по read_bytes; незавершенная строка переносится
+    в следующий кусок, поэтому память ограничена размером блока.
+    """
+    pending: list[np.ndarray] = []
+    pending_vertices = 0
+    tail = b""
+    chunk_vertices = chunk_triangles * 3
+    seen_vertices = 0
+
+    with open(path, "rb") as file:
+        while True:
+            block = file.read(read_bytes)
+            data = tail + block
+            if block:
+                # Последняя строка может быть оборвана на границе блока
+                cut = data.rfind(b"\n")
+                if cut == -1:
+                    tail = data
+                    continue
+                tail = data[cut + 1:]
+                data = data[:cut + 1]
+            else:
+                tail = b""
+
+            coords = _ASCII_VERTEX_RE.findall(data)
+            if coords:
+                try:
+                    values = np.array(coords, dtype=np.float32)
+                except ValueError as e:
+                    raise StlFormatError(f"Некорректные координаты в {Path(path).name}: {e}")
+                pending.append(values)
+                pending_vertices += len(values)
+                seen_vertices += len(values)
+
+            while pending_vertices >= chunk_vertices:
+                merged = np.concatenate(pending)
+                yield merged[:chunk_vertices].reshape(-1, 3, 3)
+                rest = merged[chunk_vertices:]
+                pending = [rest] if len(rest) else []
+                pending_vertices = len(rest)
+
+            if not block:
+                break
+
+    if seen_vertices == 0 or seen_vertices % 3:
+        raise StlFormatError(f"Не удалось прочитать STL: {Path(path).name}")
+    if pending_vertices:
+        yield np.concatenate(pending).reshape(-1, 3, 3)
+
+
+def iter_stl_chunks(path: Path, chunk_triangles: int = DEFAULT_CHUNK_TRIANGLES) -> Iterator[np.ndarray]:
+    """Потоково выдать треугольники STL (бинарного или ASCII) блоками (k, 3, 3)
+
+    Для бинарного STL блоки — представления над mmap и действительны
+    только до перехода к следующему блоку.
+    """
+    path = Path(path)
+    if is_binary_stl(path):
+        with BinaryStl(path) as stl:
+            vertices = stl.vertices
+            for start in range(0, len(vertices), chunk_triangles):
+                yield vertices[start:start + chunk_triangles]
+            del vertices
+    else:
+        yield from iter_ascii_triangles(path, chunk_triangles)
+
+
+def count_triangles(path: Path) -> int:
+    """Количество треугольников в STL (для бинарного — из заголовка, без чтения данных)"""
+    path = Path(path)
+    if is_binary_stl(path):
+        with open(path, "rb") as file:
+            file.seek(80)
+            return struct.unpack("<I", file.read(4))[0]
+    return sum(len(chunk) for chunk in iter_ascii_triangles(path))
+
+
+def load_triangles(path: Path) -> np.ndarray:
+    """Загрузить все треугольники STL в память одним массивом float32 (n, 3, 3)"""
+    path = Path(path)
+    if is_binary_stl(path):
+        with BinaryStl(path) as stl:
+            return np.array(stl.vertices, dtype=np.float32)
+    chunks = list(iter_ascii_triangles(path))
+    return np.concatenate(chunks).astype(np.float32, copy=False)
@@ -0,0 +1,329 @@
+"""
+Индекс количества заказов по дням и часам на накопленных суммах (NumPy)
+
+Для каждого ряда (тип заказа, материал) и вида события (создан, готов,
+отклонен) хранится массив накопленных сумм по корзинам времени, поэтому
+количество за любой интервал и скользящее среднее — разность двух
+элементов, O(1). Перед запросом индекс дочитывает только новые строки
+order_events (по id) и сохраняется в .npz между запусками; полностью
+пересобирается, если файла нет или он не соответствует базе.
+"""
+import asyncio
+import os
+import time
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+import config
+import database
+
+
+# Виды событий: создание заказа, переход в "Готов", переход в "Отклонен"
+KINDS = ("created", "completed", "rejected")
+
+# Виды, которые учитываются один раз на заказ — первый переход в статус, как в /admin_report
+# (заказ, возвращенный из "Готов" в работу и снова готовый, выполнен один раз)
+_ONCE_PER_ORDER = {"completed": "ready", "rejected": "rejected"}
+
+_DAY = 86400
+_HOUR = 3600
+
+# Корзины считаются в местном времени (TIMEZONE_OFFSET_HOURS)
+_UTC_OFFSET_SECONDS = round(config.TIMEZONE_OFFSET_HOURS * 3600)
+_EPOCH_DATE = date(1970, 1, 1)
+
+# Ряды по всем типам и/или всем материалам
+_ANY_TYPE = ""
+_ANY_MATERIAL = -1
+
+# Формат файла индекса; файл другой версии не загружается, индекс пересобирается
+_FORMAT_VERSION = 2
+
+# Не чаще одного сохранения файла за столько секунд (и при остановке бота)
+_SAVE_INTERVAL = 60
+
+
+class _Buckets:
+    """Накопленные суммы по корзинам одной ширины
+
+    cumulative[вид, ряд, i] — количество событий в корзинах origin .. origin + i - 1.
+    """
+
+    __slots__ = ("width", "keep", "origin", "cumulative")
+
+    def __init__(self, width: int, series: int, keep: Optional[int] = None):
+        self.width = width
+        # Сколько последних корзин хранить (None — всю историю)
+        self.keep = keep
+        # Номер первой корзины от начала эпохи; None, пока событий не было
+        self.origin: Optional[int] = None
+        self.cumulative = np.zeros((len(KINDS), series, 1), dtype=np.int64)
+
+    def bucket(self, timestamps):
+        """Номер корзины по времени в секундах Unix (число или массив)"""
+        return (timestamps + _UTC_OFFSET_SECONDS) // self.width
+
+    def add_series(self, count: int) -> None:
+        padding = np.zeros((len(KINDS), count, self.cumulative.shape[2]), dtype=np.int64)
+        self.cumulative = np.concatenate([self.cumulative, padding], axis=1)
+
+    def extend(self, last_bucket: int) -> None:
+        """Продлить массив до корзины last_bucket, старые корзины сверх keep отбросить"""
+        if self.origin is None:
+            self.origin = last_bucket if self.keep is None else last_bucket - self.keep + 1
+        size = last_bucket - self.origin + 1
+        current = self.cumulative.shape[2] - 1
+        if size > current:
+            tail = np.repeat(self.cumulative[:, :, -1:], size - current, axis=2)
+            self.cumulative = np.concatenate([self.cumulative, tail], axis=2)
+        # Окно сдвигается с запасом в 1/8, чтобы не копировать массив каждый час
+        if self.keep is not None and size > self.keep + self.keep // 8:
+            shift = size - self.keep
+            self.cumulative = self.cumulative[:, :, shift:] - self.cumulative[:, :, shift:shift + 1]
+            self.origin += shift
+
+    def add(self, kinds: np.ndarray, series: np.ndarray, buckets: np.ndarray) -> None:
+        """Учесть события: вид, ряд и корзина каждого"""
+        if self.origin is None:
+            first = int(buckets.min())
+            self.origin = first if self.keep is None else max(first, int(buckets.max()) - self.keep + 1)
+        self.extend(int(buckets.max()))
+        positions = buckets - self.origin
+        if self.keep is None:
+            # События раньше начала дневного индекса (часы сервера) — в первую корзину
+            positions = np.maximum(positions, 0)
+        else:
+            inside = positions >= 0
+            kinds, series, positions = kinds[inside], series[inside], positions[inside]
+        if not len(positions):
+            return
+        # Меняются только накопленные суммы после самой ранней корзины (новые события — в конце)
+        start = int(positions.min()) + 1
+        delta = np.zeros(self.cumulative.shape[:2] + (self.cumulative.shape[2] - start,), dtype=np.int64)
+        np.add.at(delta, (kinds, series, positions + 1 - start), 1)
+        self.cumulative[:, :, start:] += np.cumsum(delta, axis=2)
+
+    def counts(self, row: int, first: int, last: int) -> np.ndarray:
+        """Количество событий каждого вида в корзинах first .. last включительно"""
+        if self.origin is None:
+            return np.zeros(len(KINDS), dtype=np.int64)
+        size = self.cumulative.shape[2] - 1
+        lo = min(max(first - self.origin, 0), size)
+        hi = min(max(last - self.origin + 1, lo), size)
+        return self.cumulative[:, row, hi] - self.cumulative[:, row, lo]
+
+
+class TimeBucketIndex:
+    """Количество созданных, готовых и отклоненных заказов за интервалы дат и часов"""
+
+    def __init__(self, path: Path, hourly_days: int):
+        self.path = path
+        self.hourly_days = hourly_days
+        self._lock = asyncio.Lock()
+        self._loaded = False
+        self._status_ids: Dict[str, int] = {}
+        self._reset()
+
+    def _reset(self) -> None:
+        # (тип заказа, material_id) -> номер ряда; ряд 0 — все заказы
+        self._series: Dict[Tuple[str, int], int] = {(_ANY_TYPE, _ANY_MATERIAL): 0}
+        self._days = _Buckets(_DAY, 1)
+        self._hours = _Buckets(_HOUR, 1, keep=self.hourly_days * 24)
+        self._last_event_id = 0
+        # Наибольший order_id в прочитанных событиях: первое событие нового заказа — его создание
+        self._max_order_id = 0
+        # Вид из _ONCE_PER_ORDER -> отсортированные номера заказов, уже учтенных этим видом
+        self._counted_orders = {kind: np.empty(0, dtype=np.int64) for kind in _ONCE_PER_ORDER}
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def _series_row(self, order_type: str, material_id: int) -> int:
+        key = (order_type, material_id)
+        row = self._series.get(key)
+        if row is None:
+            row = self._series[key] = len(self._series)
+            self._days.add_series(1)
+            self._hours.add_series(1)
+        return row
+
+    def _append(self, rows: List[Tuple[int, int, int, int, int, str]]) -> None:
+        """Учесть пачку строк Database.iter_order_event_log"""
+        numbers = np.array([row[:5] for row in rows], dtype=np.int64)
+        event_ids, order_ids, statuses, materials, times = numbers.T
+        kinds = np.full(len(rows), -1)
+        previous_max = np.maximum.accumulate(np.r_[self._max_order_id, order_ids[:-1]])
+        kinds[(statuses == self._status_ids["pending"]) & (order_ids > previous_max)] = KINDS.index("created")
+        for kind, status in _ONCE_PER_ORDER.items():
+            positions = np.flatnonzero(statuses == self._status_ids[status])
+            if not len(positions):
+                continue
+            # Первое событие каждого заказа в пачке (события идут по id), если заказ еще не учтен
+            orders, first = np.unique(order_ids[positions], return_index=True)
+            new = ~np.isin(orders, self._counted_orders[kind], assume_unique=True)
+            kinds[positions[first[new]]] = KINDS.index(kind)
+            self._counted_orders[kind] = np.union1d(self._counted_orders[kind], orders)
+        self._last_event_id = int(event_ids[-1])
+        self._max_order_id = max(self._max_order_id, int(order_ids.max()))
+        self._dirty = True
+
+        selected = np.flatnonzero(kinds >= 0)
+        if not len(selected):
+            return
+        kinds, materials, times = kinds[selected], materials[selected], times[selected]
+        type_names, type_index = np.unique(np.array([rows[i][5] for i in selected]), return_inverse=True)
+        type_index = type_index.reshape(-1)
+        pairs, pair_index = np.unique(np.stack([type_index, materials]), axis=1, return_inverse=True)
+        pair_rows = np.array([self._series_row(str(type_names[t]), int(m)) for t, m in pairs.T])
+        type_rows = np.array([self._series_row(str(name), _ANY_MATERIAL) for name in type_names])
+
+        # Каждое событие попадает в ряды (тип, материал), (тип, все материалы) и "все заказы"
+        all_kinds = np.tile(kinds, 3)
+        all_series = np.concatenate([pair_rows[pair_index.reshape(-1)], type_rows[type_index], np.zeros_like(kinds)])
+        all_times = np.tile(times, 3)
+        for buckets in (self._days, self._hours):
+            buckets.add(all_kinds, all_series, buckets.bucket(all_times))
+
+    async def refresh(self) -> None:
+        """Дочитать новые события журнала; при первом вызове — загрузить файл индекса"""
+        async with self._lock:
+            if not self._loaded:
+                self._loaded = True
+                self._status_ids = await database.db.get_status_ids()
+                self._load()
+            last_event_id = await database.db.get_last_order_event_id()
+            if last_event_id < self._last_event_id:
+                logger.warning("Журнал order_events короче индекса количества заказов, индекс пересобирается")
+                self._reset()
+            if last_event_id > self._last_event_id:
+                started = time.perf_counter()
+                async for rows in database.db.iter_order_event_log(self._last_event_id):
+                    self._append(rows)
+                if time.perf_counter() - started > 1:
+                    logger.info(f"Индекс количества заказов обновлен за {time.perf_counter() - started:.1f} с")
+            now = int(time.time())
+            self._days.extend(int(self._days.bucket(now)))
+            self._hours.extend(int(self._hours.bucket(now)))
+            if self._dirty and time.monotonic() - self._saved_at >= _SAVE_INTERVAL:
+                self.save()
+
+    def _row(self, order_type: Optional[str], material_id: Optional[int]) -> Optional[int]:
+        material = _ANY_MATERIAL if material_id is None else material_id
+        return self._series.get((order_type or _ANY_TYPE, material))
+
+    def _result(self, counts: Optional[np.ndarray]) -> Dict[str, int]:
+        if counts is None:
+            return dict.fromkeys(KINDS, 0)
+        return {kind: int(count) for kind, count in zip(KINDS, counts)}
+
+    async def count_days(
+        self,
+        first: date,
+        last: date,
+        order_type: Optional[str] = None,
+        material_id: Optional[int] = None
+    ) -> Dict[str, int]:
+        """Количество событий каждого вида с даты first по last включительно (местное время)"""
+        await self.refresh()
+        row = self._row(order_type, material_id)
+        if row is None:
+            return self._result(None)
+        return self._result(self._days.counts(row, (first - _EPOCH_DATE).days, (last - _EPOCH_DATE).days))
+
+    async def count_hours(
+        self,
+        start: int,
+        end: int,
+        order_type: Optional[str] = None,
+        material_id: Optional[int] = None
+    ) -> Dict[str, int]:
+        """Количество событий каждого вида в часах, накрывающих [start, end) (секунды Unix)
+
+        Часовые корзины хранятся за последние TIME_BUCKETS_HOURLY_DAYS дней.
+        """
+        await self.refresh()
+        row = self._row(order_type, material_id)
+        if row is None or end <= start:
+            return self._result(None)
+        return self._result(self._hours.counts(row, int(self._hours.bucket(start)), int(self._hours.bucket(end - 1))))
+
+    async def count_last_days(
+        self,
+        days: int,
+        order_type: Optional[str] = None,
+        material_id: Optional[int] = None
+    ) -> Dict[str, int]:
+        """Количество событий каждого вида за последние days дней, включая сегодня"""
+        await self.refresh()
+        row = self._row(order_type, material_id)
+        if row is None:
+            return self._result(None)
+        today = int(self._days.bucket(int(time.time())))
+        return self._result(self._days.counts(row, today - days + 1, today))
+
+    async def moving_average(
+        self,
+        days: int,
+        order_type: Optional[str] = None,
+        material_id: Optional[int] = None
+    ) -> Dict[str, float]:
+        """Среднее количество событий в день за последние days дней, включая сегодня"""
+        counts = await self.count_last_days(days, order_type, material_id)
+        return {kind: count / days for kind, count in counts.items()}
+
+    def save(self) -> None:
+        """Записать индекс в файл, если он изменился (через временный файл, чтобы не оставить поврежденный)"""
+        if not self._dirty:
+            return
+        keys = list(self._series)
+        temporary = self.path.with_name(self.path.name + ".tmp")
+        try:
+            with open(temporary, "wb") as file:
+                np.savez(
+                    file,
+                    state=np.array([_FORMAT_VERSION, self._last_event_id, self._max_order_id,
+                                    self._days.origin if self._days.origin is not None else -1,
+                                    self._hours.origin if self._hours.origin is not None else -1,
+                                    self._hours.keep], dtype=np.int64),
+                    series_types=np.array([key[0] for key in keys], dtype=str),
+                    series_materials=np.array([key[1] for key in keys], dtype=np.int64),
+                    days=self._days.cumulative,
+                    hours=self._hours.cumulative,
+                    **{f"{kind}_orders": orders for kind, orders in self._counted_orders.items()},
+                )
+            os.replace(temporary, self.path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить индекс количества заказов {self.path}: {e}")
+            return
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                state = data["state"]
+                days, hours = data["days"], data["hours"]
+                keys = list(zip(data["series_types"].tolist(), data["series_materials"].tolist()))
+                counted_orders = {kind: data[f"{kind}_orders"] for kind in _ONCE_PER_ORDER}
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Индекс количества заказов {self.path} не прочитан, будет пересобран: {e}")
+            return
+        version, last_event_id, max_order_id, days_origin, hours_origin, hours_keep = state.tolist()
+        if (version != _FORMAT_VERSION or hours_keep != self._hours.keep or days.shape[1] != len(keys)
+                or hours.shape[1] != len(keys)):
+            logger.info("Формат или настройки индекса количества заказов изменились, индекс пересобирается")
+            return
+        self._series = {key: row for row, key in enumerate(keys)}
+        self._days.cumulative, self._hours.cumulative = days, hours
+        self._days.origin = None if days_origin < 0 else days_origin
+        self._hours.origin = None if hours_origin < 0 else hours_origin
+        self._last_event_id, self._max_order_id = last_event_id, max_order_id
+        self._counted_orders = counted_orders
+
+
+index = TimeBucketIndex(config.TIME_BUCKETS_PATH, config.TIME_BUCKETS_HOURLY_DAYS)
@@ -1,6 +1,13 @@
 """
 Вспомогательные функции
 """
+import asyncio
+import hashlib
+import html
+import json
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
 from aiogram import Bot
 from aiogram.types import FSInputFile
 from pathlib import Path
@@ -8,13 +15,175 @@ from loguru import logger
 import keyboards
 import database
 import config
+import stl_preview
+import step_reader
+from records import OrderRecord
+
+
+_preview_executor: Optional[ProcessPoolExecutor] = None
+_preview_tasks: dict[str, asyncio.Task] = {}
+
+
+def file_sha256(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """Посчитать SHA-256 содержимого файла (читается блоками)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _get_preview_executor() -> ProcessPoolExecutor:
+    """Ленивая инициализация пула процессов для рендера превью"""
+    global _preview_executor
+    if _preview_executor is None:
+        _preview_executor = ProcessPoolExecutor(max_workers=config.PREVIEW_WORKERS)
+    return _preview_executor
+
+
+def shutdown_preview_executor():
+    """Остановить пул процессов рендера превью"""
+    global _preview_executor
+    if _preview_executor is not None:
+        _preview_executor.shutdown(wait=False, cancel_futures=True)
+        _preview_executor = None
+
+
+async def _render_model_preview(model_path: Path, preview_path: Path, content_hash: str) -> Optional[Path]:
+    """Отрендерить превью модели в пуле процессов и сохранить ее метрики"""
+    loop = asyncio.get_running_loop()
+    try:
+        metrics = await loop.run_in_executor(
+            _get_preview_executor(),
+            stl_preview.render_stl_to_png,
+            str(model_path),
+            str(preview_path),
+            stl_preview.PREVIEW_SIZE,
+            content_hash
+        )
+        preview_path.with_suffix(".json").write_text(json.dumps(metrics), encoding="utf-8")
+        return preview_path
+    except Exception as e:
+        logger.warning(f"Не удалось отрендерить превью модели {model_path}: {e}")
+        return None
+
+
+def schedule_model_preview(model_path: Path, content_hash: str) -> Optional[asyncio.Task]:
+    """Запустить рендер превью модели в фоне (результат кешируется по хешу содержимого)"""
+    model_path = Path(model_path)
+    if model_path.suffix.lower() not in config.PREVIEW_MODEL_EXTENSIONS:
+        return None
+
+    preview_path = config.PREVIEWS_DIR / f"{content_hash}.png"
+    if preview_path.exists():
+        return None
+
+    task = _preview_tasks.get(content_hash)
+    if task is None:
+        task = asyncio.create_task(_render_model_preview(model_path, preview_path, content_hash))
+        _preview_tasks[content_hash] = task
+        task.add_done_callback(lambda _: _preview_tasks.pop(content_hash, None))
+    return task
+
+
+async def get_model_preview(model_path: Path, content_hash: Optional[str] = None) -> Optional[Path]:
+    """Получить PNG-превью модели: из кеша, из уже запущенного рендера или отрендерить"""
+    model_path = Path(model_path)
+    if model_path.suffix.lower() not in config.PREVIEW_MODEL_EXTENSIONS or not model_path.exists():
+        return None
+
+    if not content_hash:
+        content_hash = await asyncio.to_thread(file_sha256, model_path)
+
+    preview_path = config.PREVIEWS_DIR / f"{content_hash}.png"
+    if preview_path.exists():
+        return preview_path
+
+    task = schedule_model_preview(model_path, content_hash)
+    if task is None:
+        return preview_path if preview_path.exists() else None
+    return await asyncio.shield(task)
+
+
+def get_model_metrics(content_hash: Optional[str]) -> Optional[dict]:
+    """Получить метрики модели, посчитанные вместе с превью"""
+    if not content_hash:
+        return None
+    metrics_path = config.PREVIEWS_DIR / f"{content_hash}.json"
+    try:
+        return json.loads(metrics_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def format_model_metrics(metrics: dict) -> str:
+    """Краткое описание габаритов и объема модели (единицы STL считаются миллиметрами)"""
+    size = f"{metrics['size_x']:.1f} × {metrics['size_y']:.1f} × {metrics['size_z']:.1f} мм"
+    volume_cm3 = metrics['volume'] / 1000.0
+    return (
+        f"📐 Габариты: {size}\n"
+        f"🧊 Объём: {volume_cm3:.1f} см³, треугольников: {metrics['triangles']}\n"
+    )
+
+
+async def get_step_metadata(model_path: Path, content_hash: str) -> Optional[dict]:
+    """Получить метаданные STEP-файла: из кеша в БД или просканировать в пуле процессов"""
+    model_path = Path(model_path)
+    if model_path.suffix.lower() not in config.STEP_MODEL_EXTENSIONS:
+        return None
+
+    metadata = await database.db.get_model_metadata(content_hash)
+    if metadata is not None:
+        return metadata
+
+    loop = asyncio.get_running_loop()
+    try:
+        metadata = await loop.run_in_executor(
+            _get_preview_executor(), step_reader.scan_step, str(model_path)
+        )
+    except OSError as e:
+        logger.warning(f"Не удалось прочитать STEP-файл {model_path}: {e}")
+        return None
+
+    await database.db.save_model_metadata(content_hash, metadata)
+    return metadata
+
+
+def format_step_metadata(metadata: dict) -> str:
+    """Описание STEP-файла для карточки заказа (HTML)"""
+    lines = []
+    if metadata.get('products'):
+        products = ", ".join(metadata['products'])
+        if metadata.get('product_count', 0) > len(metadata['products']):
+            products += f" и ещё {metadata['product_count'] - len(metadata['products'])}"
+        lines.append(f"Изделие: {html.escape(products)}")
+    if metadata.get('originating_system'):
+        lines.append(f"CAD: {html.escape(metadata['originating_system'])}")
+    if metadata.get('schema'):
+        lines.append(f"Схема: {html.escape(metadata['schema'])}")
+
+    unit = metadata.get('length_unit')
+    if metadata.get('size_mm'):
+        size = " × ".join(f"{value:.1f}" for value in metadata['size_mm'])
+        lines.append(f"Габариты (оценка): {size} мм")
+    elif metadata.get('size'):
+        size = " × ".join(f"{value:.3g}" for value in metadata['size'])
+        lines.append(f"Габариты (оценка): {size} {html.escape(unit or 'ед.')}")
+    elif unit:
+        lines.append(f"Единицы: {html.escape(unit)}")
+
+    lines.append(f"Сущностей: {metadata.get('entity_count', 0)}")
+    if not metadata.get('valid', True):
+        errors = "; ".join(metadata.get('errors') or [])
+        lines.append(f"⚠️ Файл повреждён: {html.escape(errors)}")
+    return "\n".join(lines)
 
 
-async def notify_user_order_status_changed(bot: Bot, order: dict, status_name: str):
+async def notify_user_order_status_changed(bot: Bot, order: OrderRecord, status_name: str):
     """Отправить уведомление пользователю об изменении статуса заказа"""
     try:
-        user_id = order['user_id']
-        order_id = order['id']
+        user_id = order.user_id
+        order_id = order.id
         
         # Формируем сообщение в зависимости от статуса
         if status_name == "Готов":
@@ -29,13 +198,13 @@ async def notify_user_order_status_changed(bot: Bot, order: dict, status_name: s
                 reply_markup=keyboards.get_order_detail_keyboard(order_id, "ready", is_admin=False)
             )
         elif status_name == "Отклонен":
-            rejection_reason = order.get('rejection_reason', 'Не указана')
-            order_type_code = order.get('order_type', '3d_print')
+            rejection_reason = order.rejection_reason or 'Не указана'
+            order_type_code = order.order_type
             order_type_name = config.ORDER_TYPES.get(order_type_code, order_type_code)
-            material_name = order.get('material_name') or "Не указан"
-            part_name = order.get('part_name') or "Не указано"
-            quantity = order.get('quantity', 1)
-            comment = order.get('comment')
+            material_name = order.material_name or "Не указан"
+            part_name = order.part_name or "Не указано"
+            quantity = order.quantity
+            comment = order.comment
             
             # Формируем сообщение с минимальными данными о заказе
             message = (
@@ -55,7 +224,7 @@ async def notify_user_order_status_changed(bot: Bot, order: dict, status_name: s
             keyboard = keyboards.get_rejected_order_notification_keyboard()
             
             # Проверяем наличие фото
-            photo_path = order.get('photo_path')
+            photo_path = order.photo_path
             if photo_path and Path(photo_path).exists():
                 try:
                     photo_file = FSInputFile(photo_path)
@@ -82,11 +251,11 @@ async def notify_user_order_status_changed(bot: Bot, order: dict, status_name: s
         logger.error(f"Ошибка при отправке уведомления: {e}")
 
 
-async def send_reminder_about_ready_order(bot: Bot, order: dict):
+async def send_reminder_about_ready_order(bot: Bot, order: OrderRecord):
     """Отправить напоминание пользователю о готовом заказе"""
     try:
-        user_id = order['user_id']
-        order_id = order['id']
+        user_id = order.user_id
+        order_id = order.id
         
         message = (
             f"🔔 Напоминание: Ваш заказ №{order_id} готов к выдаче!\n\n"